@@ -2,6 +2,8 @@ from setuptools import find_packages, setup
 
 setup(name="transifex_api",
       version="0.0.1",
-      install_requires=["requests", "six"],
+      install_requires=["requests", "six",
+                        'futures; python_version < "3"'],
+      extras_require={'async': ["aiohttp"], 'orjson': ["orjson"]},
       packages=find_packages('src'),
       package_dir={'': 'src'})
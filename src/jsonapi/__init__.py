@@ -1,4 +1,9 @@
 from .apis import JsonApi  # noqa
-from .exceptions import (DoesNotExist, JsonApiException,  # noqa
+from .cache import ResponseCache, ValidatorStore  # noqa
+from .coalescing import RequestCoalescer  # noqa
+from .exceptions import (BulkError, DoesNotExist, JsonApiException,  # noqa
                          MultipleObjectsReturned, NotSingleItem)
+from .ratelimit import RateLimiter  # noqa
+from .records import Record  # noqa
 from .resources import Resource  # noqa
+from .retries import RetryPolicy  # noqa
@@ -0,0 +1,560 @@
+""" asyncio counterpart of the `jsonapi` package. Requires python 3.6+ and
+    the `aiohttp` package:
+
+        >>> import jsonapi
+        >>> from jsonapi.aio import AsyncJsonApi
+
+        >>> class FamilyApi(jsonapi.JsonApi):
+        ...     HOST = "https://api.families.com"
+
+        >>> @FamilyApi.register
+        ... class Parent(jsonapi.Resource):
+        ...     TYPE = "parents"
+
+        >>> class AsyncFamilyApi(AsyncJsonApi, FamilyApi):
+        ...     pass
+
+        >>> async def main():
+        ...     async with AsyncFamilyApi(auth=..., concurrency=10) as api:
+        ...         parent = await api.Parent.get("1")
+        ...         async for child in api.Child.filter(parent=parent).all():
+        ...             print(child.name)
+
+    The async API connection type shares the registry of the sync one. The
+    resource classes bound to it have awaitable versions of the methods that
+    talk to the server; everything else (attribute access, relationships,
+    payloads) works exactly like in the sync version.
+"""
+
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import os
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from .apis import JsonApi
+from .collections import Collection
+from .exceptions import DoesNotExist, MultipleObjectsReturned
+from .retries import parse_retry_after
+from .utils import is_list
+
+
+class AsyncCollection(Collection):
+    """ A Collection that must be fetched with `await` before it can be
+        used like a list:
+
+            >>> children = await api.Child.list()
+            >>> children[0]
+
+            >>> async for child in api.Child.list():  # First page only
+            ...     ...
+
+            >>> async for child in api.Child.list().all():  # All pages
+            ...     ...
+    """
+
+    def _evaluate(self, response_body=None):
+        if self._data is None and response_body is None:
+            raise RuntimeError("Collection has not been fetched yet, use "
+                               "`await collection.fetch()` first")
+        super(AsyncCollection, self)._evaluate(response_body)
+
+    async def fetch(self):
+        if self._data is None:
+            response_body = await self.API.request('get', self._url,
+                                                   params=self._params)
+            self._evaluate(response_body)
+            if self._prefetch_related is not None:
+                relationship_names, kwargs = self._prefetch_related
+                await self.API.fetch_many(self, *relationship_names, **kwargs)
+        return self
+
+    def _fetch_related(self):
+        # Done asynchronously by `fetch`
+        pass
+
+    def __await__(self):
+        return self.fetch().__await__()
+
+    def __aiter__(self):
+        return self._iter_page()
+
+    async def _iter_page(self):
+        await self.fetch()
+        for item in self:
+            yield item
+
+    async def all_pages(self):
+        await self.fetch()
+        if len(self):
+            yield self
+        page = self
+        while page.has_next():
+            page = await page.next().fetch()
+            yield page
+
+    async def all(self):
+        async for page in self.all_pages():
+            for item in page:
+                yield item
+
+    def iterator(self, *args, **kwargs):
+        """ Not supported by the asyncio client, since it cannot decode
+            responses while they are being downloaded. Use
+            `async for item in collection.all()` instead; it keeps one page
+            in memory at a time.
+        """
+
+        raise TypeError("`.iterator()` is not supported by the asyncio "
+                        "client, use `async for item in collection.all()` "
+                        "instead")
+
+    async def get(self, **filters):
+        if filters:
+            qs = self.filter(**filters)
+        else:
+            qs = self
+        await qs.fetch()
+
+        if len(qs) == 0:
+            raise DoesNotExist()
+        if len(qs) > 1:
+            raise MultipleObjectsReturned(len(qs))
+        return qs[0]
+
+
+class AsyncResourceMixin(object):
+    """ Mixed into every resource class bound to an `AsyncJsonApi` instance.
+        Overrides the methods that talk to the server with awaitable
+        versions.
+    """
+
+    # Fetching
+    async def reload(self, include=None):
+        params = None
+        if include is not None:
+            params = {'include': ','.join(include)}
+        url = self.links.get('self', self.get_item_url())
+        response_body = await self.API.request('get', url, params=params)
+        self._post_reload(response_body)
+
+    @classmethod
+    async def get(cls, id=None, include=None, **filters):
+        if id is not None:
+            instance = cls(id=id)
+            await instance.reload(include=include)
+            return instance
+        else:
+            result = cls.list()
+            if include is not None:
+                result = result.include(*include)
+            return await result.get(**filters)
+
+    async def fetch(self, *relationship_names, **kwargs):
+        force = kwargs.pop('force', False)
+
+        to_reload = self._prepare_fetch(relationship_names, force)
+        await asyncio.gather(*(related.reload() for related in to_reload))
+
+        if len(relationship_names) == 1:
+            return self.related[relationship_names[0]]
+
+    # Editing
+    async def save(self, *fields, **kwargs):
+        fields = set(fields)
+
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+            fields.add(key)
+
+        if self.id is not None:
+            await self._save_existing(*fields)
+        else:
+            await self._save_new(*fields)
+
+    async def _save_existing(self, *fields):
+        payload = self.as_resource_identifier()
+        payload.update(self._generate_data_for_saving(*fields))
+        response_body = await self.API.request('patch',
+                                               self.get_item_url(),
+                                               json={'data': payload})
+        self._post_save(response_body)
+
+    async def _save_new(self, *fields):
+        payload = {'type': self.TYPE}
+        if self.id is not None:
+            payload['id'] = self.id
+        payload.update(self._generate_data_for_saving(*fields))
+        response_body = await self.API.request('post',
+                                               self.get_collection_url(),
+                                               json={'data': payload})
+        self._post_save(response_body)
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        instance = cls(*args, **kwargs)
+        await instance._save_new()
+        return instance
+
+    @classmethod
+    async def create_with_form(cls, type=None, **kwargs):
+        response_body = await cls.API.request('post',
+                                              cls.get_collection_url(),
+                                              **kwargs)
+        return cls.API.new(response_body)
+
+    async def follow(self):
+        if self.redirect is None:
+            raise ValueError("Cannot follow a non-redirect response")
+        response_body = await self.API.request('get', self.redirect)
+        return self._process_followed(response_body)
+
+    async def delete(self):
+        await self.API.request('delete', self.get_item_url())
+        self.id = None
+
+    # Editing relationships
+    async def change(self, field, value):
+        value = self.API.as_resource(value)
+        await self._edit_relationship('patch', field,
+                                      value.as_resource_identifier())
+        self.relationships[field]['data'] = value.as_resource_identifier()
+        if self.related[field] != value:
+            self.related[field] = value
+
+    async def add(self, field, values):
+        await self._edit_plural_relationship('post', field, values)
+
+    async def remove(self, field, values):
+        await self._edit_plural_relationship('delete', field, values)
+
+    async def reset(self, field, values):
+        await self._edit_plural_relationship('patch', field, values)
+
+    async def _edit_relationship(self, method, field, value):
+        url = self.relationships[field].\
+            get('links', {}).\
+            get('self',
+                "/{}/{}/relationships/{}".format(self.TYPE, self.id, field))
+        await self.API.request(method, url, json={'data': value})
+
+    async def _edit_plural_relationship(self, method, field, values):
+        payload = [self.API.as_resource(item).as_resource_identifier()
+                   for item in values]
+        await self._edit_relationship(method, field, payload)
+
+    # Bulk actions
+    @classmethod
+    async def bulk_delete(cls, items, chunk_size=None, concurrency=1):
+        payload = cls._bulk_delete_payload(items)
+        chunks = cls._bulk_chunks(payload, chunk_size)
+        if chunks is None:
+            await cls._bulk_request('delete', payload)
+            return len(payload)
+
+        results, errors = await cls._bulk_dispatch('delete', chunks,
+                                                   concurrency)
+        return cls._bulk_delete_result(chunks, results, errors)
+
+    @classmethod
+    async def bulk_create(cls, items, chunk_size=None, concurrency=1):
+        payload = cls._bulk_create_payload(items)
+        return await cls._bulk_save('post', payload, chunk_size, concurrency)
+
+    @classmethod
+    async def bulk_update(cls, items, fields=None, chunk_size=None,
+                          concurrency=1):
+        payload = cls._bulk_update_payload(items, fields)
+        return await cls._bulk_save('patch', payload, chunk_size,
+                                    concurrency)
+
+    @classmethod
+    async def _bulk_save(cls, method, payload, chunk_size=None,
+                         concurrency=1):
+        chunks = cls._bulk_chunks(payload, chunk_size)
+        if chunks is None:
+            response_body = await cls._bulk_request(method, payload)
+            return cls.API.collection_class.from_data(cls.API, response_body)
+
+        results, errors = await cls._bulk_dispatch(method, chunks,
+                                                   concurrency)
+        return cls._bulk_save_result(results, errors)
+
+    @classmethod
+    async def _bulk_dispatch(cls, method, chunks, concurrency=1):
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def send(chunk):
+            async with semaphore:
+                try:
+                    return await cls._bulk_request(method, chunk), None
+                except Exception as exc:
+                    return None, exc
+
+        outcomes = await asyncio.gather(*(send(chunk)
+                                          for _, chunk in chunks))
+        return cls._bulk_outcomes(chunks, outcomes)
+
+
+class AsyncJsonApi(JsonApi):
+    """ asyncio-based API connection. Accepts the same arguments as `JsonApi`
+        plus:
+
+        - concurrency: The maximum number of requests that can be in flight at
+                       the same time. If not set, only the connection pool
+                       limits apply
+
+        The `rate_limit` and `retry` options work the same way as in
+        `JsonApi`, except that waiting does not block the event loop.
+
+        The underlying `aiohttp.ClientSession` is created on the first request
+        and must be released with `await api.close()` or by using the API
+        connection instance as an async context manager.
+    """
+
+    collection_class = AsyncCollection
+    resource_mixins = (AsyncResourceMixin, )
+
+    def __init__(self, **kwargs):
+        self.concurrency = None
+        self._semaphore = None
+        self._in_flight = {}
+        super(AsyncJsonApi, self).__init__(**kwargs)
+
+    def setup(self, concurrency=None, **kwargs):
+        if concurrency is not None:
+            self.concurrency = concurrency
+            self._semaphore = None
+        super(AsyncJsonApi, self).setup(**kwargs)
+
+    # Session lifecycle
+    def _make_session(self):
+        import aiohttp  # Optional requirement, don't require at top level
+
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_connections * self.pool_maxsize,
+            limit_per_host=self.pool_maxsize,
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    def _reset_session(self):
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            try:
+                asyncio.ensure_future(session.close())
+            except RuntimeError:  # pragma: no cover
+                pass  # No event loop; connections will be dropped
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' instead")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _get_semaphore(self):
+        if self.concurrency is not None and self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    # Requests
+    async def request(self, method, url, bulk=False, retry=None,
+                      cache=True, headers=None, data=None, files=None,
+                      allow_redirects=False, params=None, json=None,
+                      **kwargs):
+        url, actual_headers = self._prepare_request(url, bulk, headers, data,
+                                                    files)
+        cache_key, cached = self._get_cached(method, url, actual_headers,
+                                             params, cache)
+        if cached is not None:
+            return cached
+        validators_key, validators = self._get_validators(
+            method, url, actual_headers, params, cache
+        )
+        if validators is not None:
+            actual_headers.update(
+                self.conditional.get_conditional_headers(validators)
+            )
+        if json is not None:
+            data = self._encode_json(json)
+        send = self._send(
+            method, url, retry, headers=actual_headers, data=data,
+            files=files, allow_redirects=allow_redirects,
+            params=self._encode_params(params), **kwargs
+        )
+        coalesce_key = self._get_coalesce_key(method, url, actual_headers,
+                                              params, data, files)
+        if coalesce_key is None:
+            response, retries = await send
+        else:
+            response, retries = await self._send_coalesced(coalesce_key,
+                                                           send)
+        if validators_key is not None:
+            not_modified = self._update_validators(validators_key, validators,
+                                                   response)
+            if not_modified is not None:
+                return not_modified
+        self._update_cache(method, url, cache_key, response)
+        return self._process_response(response, retries)
+
+    async def _send_coalesced(self, key, send):
+        """ Await the `send` coroutine, unless an identical request is
+            already in flight, in which case share its outcome. The shared
+            task is shielded, so that cancelling one of the callers doesn't
+            cancel the request for the others.
+        """
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            send.close()
+            self.coalesce.record(True)
+        else:
+            task = asyncio.ensure_future(send)
+            self._in_flight[key] = task
+            task.add_done_callback(
+                lambda _: self._in_flight.pop(key, None)
+            )
+            self.coalesce.record(False)
+        return await asyncio.shield(task)
+
+    async def fetch_many(self, items, *relationship_names, **kwargs):
+        to_load, batch_size, id_filter = self._prepare_fetch_many(
+            items, relationship_names, **kwargs
+        )
+
+        async def load(by_id, url, params):
+            while url:
+                response_body = await self.request('get', url, params=params)
+                url = self._process_batch(response_body, by_id)
+                params = None
+
+        await asyncio.gather(*(
+            load(by_id, url, params)
+            for type, by_id in to_load.items()
+            for url, params in self._get_batch_urls(type, by_id, batch_size,
+                                                    id_filter)
+        ))
+        await asyncio.gather(*(related.reload()
+                               for by_id in to_load.values()
+                               for related_objects in by_id.values()
+                               for related in related_objects))
+
+    def stream(self, *args, **kwargs):
+        """ Not supported by the asyncio client; `request` reads the whole
+            response body before returning
+        """
+
+        raise TypeError("Streaming responses is not supported by the "
+                        "asyncio client, use `await api.request(...)` "
+                        "instead")
+
+    async def _send(self, method, url, retry=None, **kwargs):
+        import aiohttp
+
+        policy = self.retry
+        if policy is None or not policy.is_retryable(method, retry):
+            return await self._send_once(method, url, **kwargs), 0
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self._send_once(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not policy.should_retry(attempt):
+                    policy.record(attempt - 1, gave_up=True)
+                    raise
+                response = None
+            else:
+                if response.ok or response.status_code not in policy.statuses:
+                    policy.record(attempt - 1)
+                    return response, attempt - 1
+                if not policy.should_retry(attempt, response):
+                    policy.record(attempt - 1, gave_up=True)
+                    return response, attempt - 1
+            await asyncio.sleep(policy.get_delay(attempt, response))
+
+    async def _send_once(self, method, url, data=None, files=None, **kwargs):
+        if files is not None:
+            # Rebuilt for every attempt since aiohttp consumes it
+            data = self._make_form_data(data, files)
+
+        rate_limit = self.rate_limit
+        if rate_limit is not None:
+            delay = rate_limit.reserve()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        semaphore = self._get_semaphore()
+        if semaphore is not None:
+            await semaphore.acquire()
+        try:
+            async with self.session.request(method, url, data=data,
+                                            **kwargs) as aio_response:
+                content = await aio_response.read()
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+        response = self._make_response(aio_response, content)
+
+        if rate_limit is not None:
+            if response.status_code == 429:
+                rate_limit.throttled(
+                    parse_retry_after(response.headers.get('Retry-After'))
+                )
+            elif response.ok:
+                rate_limit.succeeded()
+        return response
+
+    def _make_response(self, aio_response, content):
+        """ Convert to a `requests.Response` so that the rest of the code can
+            treat responses from both API connection types the same way
+        """
+
+        response = requests.Response()
+        response.status_code = aio_response.status
+        response.reason = aio_response.reason
+        response.headers = CaseInsensitiveDict(aio_response.headers)
+        response.url = str(aio_response.url)
+        response.encoding = aio_response.charset
+        response._content = content
+        return response
+
+    def _encode_params(self, params):
+        if not params:
+            return None
+        result = []
+        for key, value in params.items():
+            values = value if is_list(value) else [value]
+            result.extend((key, str(item)) for item in values)
+        return result
+
+    def _make_form_data(self, data, files):
+        import aiohttp
+
+        form = aiohttp.FormData()
+        for key, value in (data or {}).items():
+            form.add_field(key, str(value))
+        for key, value in files.items():
+            content_type = None
+            if isinstance(value, tuple):
+                if len(value) > 2:
+                    filename, value, content_type = value[:3]
+                else:
+                    filename, value = value
+            else:
+                filename = os.path.basename(getattr(value, 'name', key))
+            form.add_field(key, value, filename=filename,
+                           content_type=content_type)
+        return form
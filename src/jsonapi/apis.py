@@ -1,12 +1,24 @@
 from __future__ import absolute_import, unicode_literals
 
+import contextlib
+import functools
+import threading
+
 import requests
 import six
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE, HTTPAdapter
 
 from .auth import BearerAuthentication
-from .compat import JSONDecodeError
+from .cache import ResponseCache, ValidatorStore, make_request_key
+from .coalescing import RequestCoalescer
+from .codecs import get_codec
+from .collections import Collection
+from .compat import urlparse
 from .exceptions import JsonApiException
+from .ratelimit import RateLimiter
 from .resources import Resource
+from .retries import RetryPolicy, parse_retry_after
+from .streaming import iter_object
 
 
 type_ = type  # alias to avoid naming conflicts
@@ -53,8 +65,14 @@ class _JsonApiMetaclass(type_):
     def __new__(cls, *args, **kwargs):
         result = super(_JsonApiMetaclass, cls).__new__(cls, *args, **kwargs)
 
-        # Use a copy, not reference to parent's registry
-        result.registry = list(getattr(result, 'registry', []))
+        # Use a copy, not reference to parent's registry. If there are
+        # multiple parents, merge their registries
+        registry = []
+        for base in reversed(result.__mro__):
+            for klass in base.__dict__.get('registry', []):
+                if klass not in registry:
+                    registry.append(klass)
+        result.registry = registry
 
         return result
 
@@ -77,11 +95,34 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
             ...     HOST = "..."
             >>> api = API(host=..., auth=...)
 
+        - pool_connections: The number of hosts to keep connection pools for
+        - pool_maxsize: The maximum number of keep-alive connections to keep
+                        open towards each host
+        - pool_block: If True, requests will wait for a connection to become
+                      available instead of opening a connection beyond
+                      `pool_maxsize`, effectively capping the number of
+                      concurrent connections per host
+        - retry: A `RetryPolicy` instance, or an integer in which case it will
+                 be used as the `max_attempts` of a default `RetryPolicy`. If
+                 not set, failed requests will not be retried
+        - rate_limit: A `RateLimiter` instance, or a number in which case it
+                      will be used as the `rate` (requests per second) of a
+                      default `RateLimiter`. If not set, requests will not be
+                      throttled on the client side
+
         The arguments are optional and can be edited later with `.setup()`
 
             >>> api = API()
             >>> api.setup(host=..., auth=...)
 
+        Requests are sent using a `requests.Session` which is created lazily
+        and reuses connections between requests. It can be released with
+        `.close()` or by using the API connection instance as a context
+        manager:
+
+            >>> with API(host=..., auth=...) as api:
+            ...     api.Foo.list()
+
         All Resource classes that use this API should be registered to this API
         class:
 
@@ -92,6 +133,11 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
 
     HOST = None
 
+    # Used by resource classes for their collections and relationships
+    collection_class = Collection
+    # Mixed into every resource class bound to an API connection instance
+    resource_mixins = ()
+
     def __init__(self, **kwargs):
         """ Create a new API connection instance. It will use the class's
             registry to build the instance's registries in order to be able to
@@ -104,20 +150,37 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
         self.class_registry = {}
 
         for base_class in self.__class__.registry:
-            # Dynamically create a subclass adding 'self' (the API connection
-            # instance) as a class variable to it
-            child_class = type_(base_class.__name__,
-                                (base_class, ),
-                                {'API': self})
+            child_class = self._bind_resource_class(base_class)
             # Lookup the new class by it's name or its TYPE class attribute
             self.type_registry[base_class.TYPE] = child_class
             self.class_registry[base_class.__name__] = child_class
 
         self.host = self.HOST
         self.headers = {}
+
+        self.pool_connections = DEFAULT_POOLSIZE
+        self.pool_maxsize = DEFAULT_POOLSIZE
+        self.pool_block = DEFAULT_POOLBLOCK
+        self._session = None
+        self._session_lock = threading.Lock()
+
+        self.retry = None
+        self.rate_limit = None
+        self.codec = get_codec()
+        self.cache = None
+        self.conditional = None
+        self.coalesce = None
+
+        # Per thread, so that threads that didn't ask for an identity map
+        # don't get their objects shared
+        self._identity_map_local = threading.local()
+
         self.setup(**kwargs)
 
-    def setup(self, host=None, auth=None, headers=None):
+    def setup(self, host=None, auth=None, headers=None,
+              pool_connections=None, pool_maxsize=None, pool_block=None,
+              retry=None, rate_limit=None, codec=None, cache=None,
+              conditional=None, coalesce=None):
         if host is not None:
             self.host = host
 
@@ -130,6 +193,106 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
         if headers is not None:
             self.headers = headers
 
+        if retry is not None:
+            if isinstance(retry, RetryPolicy):
+                self.retry = retry
+            else:
+                self.retry = RetryPolicy(max_attempts=retry)
+
+        if rate_limit is not None:
+            if isinstance(rate_limit, RateLimiter):
+                self.rate_limit = rate_limit
+            else:
+                self.rate_limit = RateLimiter(rate=rate_limit)
+
+        if codec is not None:
+            self.codec = get_codec(codec)
+
+        if cache is not None:
+            if isinstance(cache, ResponseCache):
+                self.cache = cache
+            else:
+                self.cache = ResponseCache(ttl=cache)
+
+        if conditional is not None:
+            if isinstance(conditional, ValidatorStore):
+                self.conditional = conditional
+            elif conditional:
+                self.conditional = ValidatorStore()
+            else:
+                self.conditional = None
+
+        if coalesce is not None:
+            if isinstance(coalesce, RequestCoalescer):
+                self.coalesce = coalesce
+            elif coalesce:
+                self.coalesce = RequestCoalescer()
+            else:
+                self.coalesce = None
+
+        pool_kwargs = {'pool_connections': pool_connections,
+                       'pool_maxsize': pool_maxsize,
+                       'pool_block': pool_block}
+        pool_kwargs = {key: value for key, value in pool_kwargs.items()
+                       if value is not None}
+        if pool_kwargs:
+            for key, value in pool_kwargs.items():
+                setattr(self, key, value)
+            # Connection pools cannot be resized in-place; the session will
+            # be recreated with the new settings during the next request
+            self._reset_session()
+
+    # Session lifecycle
+    @property
+    def session(self):
+        """ The `requests.Session` used for all requests to the API. Created
+            on first access and kept around so that connections to the API
+            server can be reused.
+        """
+
+        with self._session_lock:
+            if self._session is None:
+                self._session = self._make_session()
+            return self._session
+
+    def _make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_connections,
+                              pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def close(self):
+        """ Close all pooled connections. The API connection instance can
+            still be used afterwards; a new session will be created on demand.
+        """
+
+        with self._session_lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    def _reset_session(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _bind_resource_class(self, base_class, name=None, **attrs):
+        """ Dynamically create a subclass adding 'self' (the API connection
+            instance) as a class variable to it
+        """
+
+        if name is None:
+            name = base_class.__name__
+        attrs['API'] = self
+        return type_(name, tuple(self.resource_mixins) + (base_class, ), attrs)
+
     @classmethod
     def register(cls, klass):
         """ Register a API resource type with this API connection *type* (since
@@ -172,10 +335,75 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
     def request(self, method, url,
                 # Not passed to requests, used to determine Content-Type
                 bulk=False,
+                # Not passed to requests, overrides whether the retry policy
+                # considers this request safe to retry
+                retry=None,
+                # Not passed to requests, if False the response cache and the
+                # stored validators are neither used nor updated
+                cache=True,
                 # Forwarded to requests
-                headers=None, data=None, files=None,
+                headers=None, data=None, files=None, json=None,
                 allow_redirects=False,
                 **kwargs):
+        url, actual_headers = self._prepare_request(url, bulk, headers, data,
+                                                    files)
+        cache_key, cached = self._get_cached(method, url, actual_headers,
+                                             kwargs.get('params'), cache)
+        if cached is not None:
+            return cached
+        validators_key, validators = self._get_validators(
+            method, url, actual_headers, kwargs.get('params'), cache
+        )
+        if validators is not None:
+            actual_headers.update(
+                self.conditional.get_conditional_headers(validators)
+            )
+        if json is not None:
+            data = self._encode_json(json)
+        send = functools.partial(self._send, method, url, retry,
+                                 headers=actual_headers, data=data,
+                                 files=files, allow_redirects=allow_redirects,
+                                 **kwargs)
+        coalesce_key = self._get_coalesce_key(method, url, actual_headers,
+                                              kwargs.get('params'), data,
+                                              files)
+        if coalesce_key is None:
+            response, retries = send()
+        else:
+            response, retries = self.coalesce.do(coalesce_key, send)
+        if validators_key is not None:
+            not_modified = self._update_validators(validators_key, validators,
+                                                   response)
+            if not_modified is not None:
+                return not_modified
+        self._update_cache(method, url, cache_key, response)
+        return self._process_response(response, retries)
+
+    def stream(self, method, url, chunk_size=64 * 1024, retry=None,
+               headers=None, **kwargs):
+        """ Like `request`, but decode the response body while it is being
+            downloaded, yielding its top-level members as `(key, value)`
+            pairs. The items of the 'data' and 'included' arrays are yielded
+            one by one (see `jsonapi.streaming.iter_object`), so memory usage
+            is bounded by the size of one item rather than the whole
+            response. Error responses raise the same exceptions as `request`.
+        """
+
+        url, actual_headers = self._prepare_request(url, headers=headers)
+        response, retries = self._send(method, url, retry,
+                                       headers=actual_headers,
+                                       allow_redirects=False, stream=True,
+                                       **kwargs)
+        with contextlib.closing(response):
+            if not response.ok:
+                self._process_response(response, retries)
+            for key, value in iter_object(response.iter_content(chunk_size)):
+                yield key, value
+
+    def _prepare_request(self, url, bulk=False, headers=None, data=None,
+                         files=None):
+        """ Return the absolute URL and the headers of a request """
+
         if url.startswith('/'):
             url = "{}{}".format(self.host, url)
 
@@ -196,25 +424,166 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
         if content_type is not None:
             actual_headers.setdefault('Content-Type', content_type)
 
-        response = requests.request(method, url, headers=actual_headers,
-                                    data=data, files=files,
-                                    allow_redirects=allow_redirects,
-                                    **kwargs)
+        return url, actual_headers
+
+    def _process_response(self, response, retries=0):
+        """ Raise an exception for error responses; return the parsed body
+            otherwise, or the response itself if it has no JSON body
+        """
 
         if not response.ok:
             try:
                 exc = JsonApiException(response.status_code,
-                                       response.json()['errors'])
+                                       self._decode_json(response)['errors'])
             except Exception:
-                response.raise_for_status()
+                exc = None
+            if exc is None:
+                try:
+                    response.raise_for_status()
+                except requests.HTTPError as e:
+                    e.retries = retries
+                    raise
             else:
+                exc.retries = retries
                 raise exc
         try:
-            return response.json()
-        except JSONDecodeError:
+            return self._decode_json(response)
+        except ValueError:
             # Most likely empty response when deleting
             return response
 
+    # Caching
+    def _get_cache_type(self, url):
+        if url.startswith(self.host):
+            url = url[len(self.host):]
+        return self.cache.get_type(urlparse(url).path)
+
+    def _get_cached(self, method, url, headers, params=None, use_cache=True):
+        """ Return `(key, body)`: `key` is where the response should be
+            cached (None if it shouldn't be) and `body` is the parsed cached
+            response body, if there is one.
+        """
+
+        cache = self.cache
+        if cache is None or not use_cache or method.lower() != 'get':
+            return None, None
+        api_type = self._get_cache_type(url)
+        if not cache.get_ttl(api_type):
+            return None, None
+        key = cache.make_key(api_type, method, url, params, headers)
+        content = cache.get(key)
+        if content is None:
+            return key, None
+        return key, self.codec.loads(content)
+
+    def _update_cache(self, method, url, key, response):
+        cache = self.cache
+        if cache is None:
+            return
+        if method.lower() != 'get':
+            cache.invalidate(self._get_cache_type(url))
+        elif (key is not None and response.status_code == 200 and
+              'json' in response.headers.get('Content-Type', '')):
+            cache.set(key, response.content, self._get_cache_type(url))
+
+    def _get_validators(self, method, url, headers, params=None,
+                        use_cache=True):
+        """ Return `(key, validators)`: `key` is where the validators of the
+            response should be stored (None if they shouldn't be) and
+            `validators` are the stored ones for a conditional request, if
+            any
+        """
+
+        store = self.conditional
+        if store is None or not use_cache or method.lower() != 'get':
+            return None, None
+        key = store.make_key(method, url, params, headers)
+        return key, store.get(key)
+
+    def _update_validators(self, key, validators, response):
+        """ Store the validators of `response`. If the server responded with
+            `304 Not Modified`, return the parsed stored body, None otherwise
+        """
+
+        store = self.conditional
+        if response.status_code == 304 and validators is not None:
+            content = validators[2]
+            store.record(True, content)
+            return self.codec.loads(content)
+        if validators is not None:
+            store.record(False)
+        if response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                store.set(key, etag, last_modified, response.content)
+        return None
+
+    def _get_coalesce_key(self, method, url, headers, params=None,
+                          data=None, files=None):
+        """ Return the key under which identical in-flight requests are
+            coalesced, or None if this request shouldn't be coalesced
+        """
+
+        if (self.coalesce is None or method.lower() != 'get' or
+                (data, files) != (None, None)):
+            return None
+        return make_request_key(method, url, params, headers)
+
+    def _encode_json(self, payload):
+        body = self.codec.dumps(payload)
+        if isinstance(body, six.text_type):
+            body = body.encode('utf-8')
+        return body
+
+    def _decode_json(self, response):
+        return self.codec.loads(response.content)
+
+    def _send(self, method, url, retry=None, **kwargs):
+        """ Send the request, retrying according to `self.retry`. Returns the
+            final response and the number of retries that were performed.
+        """
+
+        policy = self.retry
+        if policy is None or not policy.is_retryable(method, retry):
+            return self._send_once(method, url, **kwargs), 0
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._send_once(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if not policy.should_retry(attempt):
+                    policy.record(attempt - 1, gave_up=True)
+                    raise
+                response = None
+            else:
+                if response.ok or response.status_code not in policy.statuses:
+                    policy.record(attempt - 1)
+                    return response, attempt - 1
+                if not policy.should_retry(attempt, response):
+                    policy.record(attempt - 1, gave_up=True)
+                    return response, attempt - 1
+                # Release the connection of the response we are discarding
+                response.close()
+            policy.sleep(policy.get_delay(attempt, response))
+
+    def _send_once(self, method, url, **kwargs):
+        rate_limit = self.rate_limit
+        if rate_limit is None:
+            return self.session.request(method, url, **kwargs)
+
+        rate_limit.acquire()
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code == 429:
+            rate_limit.throttled(
+                parse_retry_after(response.headers.get('Retry-After'))
+            )
+        elif response.ok:
+            rate_limit.succeeded()
+        return response
+
     def new(self, data=None, type=None, **kwargs):
         """ Return a new resource instance, using the appropriate Resource
             subclass, provided that it has been registered with this API
@@ -235,14 +604,157 @@ class JsonApi(six.with_metaclass(_JsonApiMetaclass, object)):
                 data = data['data']
             return self.new(**data)
         else:
-            if type in self.type_registry:
-                klass = self.type_registry[type]
-            else:
-                # Lets make a new class on the fly
-                klass = type_(type.capitalize(),
-                              (Resource, ),
-                              {'API': self, 'TYPE': type})
-            return klass(**kwargs)
+            return self._get_resource_class(type)(**kwargs)
+
+    def from_response(self, data, included=None):
+        """ Like `new`, but for items of freshly parsed API responses; see
+            `Resource.from_response`.
+        """
+
+        return self._get_resource_class(data['type']).\
+            from_response(data, included=included)
+
+    def fetch_many(self, items, *relationship_names, **kwargs):
+        """ Like calling `item.fetch(*relationship_names)` on each of `items`,
+            but instead of reloading each related object on its own, the
+            distinct related objects of each type are loaded with as few list
+            requests as possible, `batch_size` IDs at a time:
+
+                >>> strings = list(api.ResourceString.filter(...).all())
+                >>> api.fetch_many(strings, 'resource')
+                >>> # GET /resources?filter[id]=<id1>,<id2>,...
+                >>> strings[0].resource.name
+
+            - force: Reload related objects even if they have been fetched
+                     already
+            - batch_size: Maximum number of IDs per request
+            - id_filter: The filter used to select by ID; with the default
+                         'id', the requests use `filter[id]=<id1>,<id2>,...`
+
+            Related objects that are missing from the responses are reloaded
+            one by one. Plural relationships are set up as (lazy) collections,
+            like with `fetch`.
+        """
+
+        to_load, batch_size, id_filter = self._prepare_fetch_many(
+            items, relationship_names, **kwargs
+        )
+        for type, by_id in to_load.items():
+            for url, params in self._get_batch_urls(type, by_id, batch_size,
+                                                    id_filter):
+                while url:
+                    response_body = self.request('get', url, params=params)
+                    url = self._process_batch(response_body, by_id)
+                    params = None
+            for related_objects in by_id.values():
+                for related in related_objects:
+                    related.reload()
+
+    def _prepare_fetch_many(self, items, relationship_names, force=False,
+                            batch_size=100, id_filter='id'):
+        """ Return the related objects that need to be loaded, as
+            `{type: {id: [related objects]}}`, along with the batching options
+        """
+
+        to_load = {}
+        for item in items:
+            for related in item._prepare_fetch(relationship_names, force):
+                to_load.setdefault(related.TYPE, {}).\
+                    setdefault(related.id, []).\
+                    append(related)
+        return to_load, batch_size, id_filter
+
+    @staticmethod
+    def _get_batch_urls(type, by_id, batch_size, id_filter):
+        ids = list(by_id)
+        for start in range(0, len(ids), batch_size):
+            yield ("/{}".format(type),
+                   {'filter[{}]'.format(id_filter):
+                    ','.join(ids[start:start + batch_size])})
+
+    @staticmethod
+    def _process_batch(response_body, by_id):
+        """ Write the data of a batch response to the related objects in
+            `by_id`, popping them. Return the URL of the next page, if any
+            (it carries all the query parameters)
+        """
+
+        for data in response_body['data']:
+            related_objects = by_id.pop(data['id'], [])
+            for related in related_objects[1:]:
+                related._overwrite(**data)
+            if related_objects:
+                # Copies have been made, the first related object can take
+                # ownership of the response data
+                related_objects[0]._overwrite(_copy=False, **data)
+        return response_body.get('links', {}).get('next')
+
+    def _get_resource_class(self, type):
+        if type in self.type_registry:
+            return self.type_registry[type]
+        else:
+            # Lets make a new class on the fly
+            return self._bind_resource_class(Resource,
+                                             name=type.capitalize(),
+                                             TYPE=type)
+
+    @contextlib.contextmanager
+    def identity_map(self):
+        """ While active, related resource objects built from the 'included'
+            section of responses are shared: every reference to the same
+            `(type, id)` resolves to the same Resource instance, saving memory
+            and construction time on large pages.
+
+                >>> with api.identity_map():
+                ...     strings = list(api.ResourceString.
+                ...                    filter(resource=resource).
+                ...                    include('resource').
+                ...                    all())
+                >>> strings[0].resource is strings[1].resource
+                <<< True
+
+            Since the instances are shared, changes to one of them will be
+            visible through all references. The map only applies to the
+            thread that entered it; nested uses share the same map, which is
+            discarded when the outermost one exits.
+        """
+
+        local = self._identity_map_local
+        if getattr(local, 'depth', 0) == 0:
+            local.map = {}
+            local.depth = 0
+        local.depth += 1
+        try:
+            yield local.map
+        finally:
+            local.depth -= 1
+            if local.depth == 0:
+                local.map = None
+
+    @property
+    def _identity_map(self):
+        """ The identity map of the current thread, or None """
+
+        return getattr(self._identity_map_local, 'map', None)
+
+    def resolve_included(self, data):
+        """ Return a resource instance for an item of a response's 'included'
+            section, reusing the one in the identity map if it is active.
+        """
+
+        identity_map = self._identity_map
+        if identity_map is None:
+            return self.new(data)
+
+        key = (data['type'], data['id'])
+        try:
+            return identity_map[key]
+        except KeyError:
+            pass
+        # The instance will be shared by all references anyway, so there is
+        # no need to copy the response's data
+        instance = identity_map[key] = self.from_response(data)
+        return instance
 
     def as_resource(self, data):
         """ Little convenience function when we don't know if we are dealing
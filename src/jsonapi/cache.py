@@ -0,0 +1,254 @@
+from __future__ import absolute_import, unicode_literals
+
+import abc
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import six
+
+
+def make_request_key(method, url, params=None, headers=None):
+    """ Hash of everything that identifies a request (except its body),
+        including the authentication headers
+    """
+
+    identity = json.dumps(
+        [method.lower(), url,
+         sorted((str(key), str(value))
+                for key, value in (params or {}).items()),
+         sorted((headers or {}).items())],
+    ).encode('utf-8')
+    return hashlib.sha256(identity).hexdigest()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class CacheBackend(object):
+    """ Interface for the storage of a `ResponseCache`. Values are the raw
+        bytes of response bodies, so they can be stored anywhere. To share a
+        cache between processes (eg with Redis or memcached), subclass this
+        and pass an instance to `ResponseCache(backend=...)`.
+
+        Every entry is tagged with the API type of the URL it was fetched
+        from, so that all entries of a type can be dropped with `invalidate`
+        (backends without a way to enumerate keys can, for example, keep a
+        per-type version number and make it part of their keys).
+    """
+
+    @abc.abstractmethod
+    def get(self, key):
+        """ Return the stored value or None if it is missing or expired """
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl, type=None):
+        """ Store `value` for `ttl` seconds """
+
+    @abc.abstractmethod
+    def invalidate(self, type):
+        """ Drop all entries tagged with `type` """
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """ Thread-safe in-process backend that evicts expired entries and,
+        once it holds `max_size` entries, the least recently used ones.
+    """
+
+    def __init__(self, max_size=1024, get_now=None):
+        self.max_size = max_size
+
+        # Dependency injection for getting the current timestamp, mostly
+        # useful for testing
+        if get_now is None:
+            get_now = time.time
+        self.get_now = get_now
+
+        # key => (expires_at, type, value), least recently used first
+        self._entries = OrderedDict()
+        # type => set of keys
+        self._types = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires_at, type, value = self._entries[key]
+            except KeyError:
+                return None
+            if expires_at <= self.get_now():
+                self._remove(key)
+                return None
+            # Mark as recently used
+            del self._entries[key]
+            self._entries[key] = (expires_at, type, value)
+            return value
+
+    def set(self, key, value, ttl, type=None):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self.get_now() + ttl, type, value)
+            self._types.setdefault(type, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, type):
+        with self._lock:
+            for key in list(self._types.get(type, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._types.clear()
+
+    def _remove(self, key):
+        _, type, _ = self._entries.pop(key)
+        keys = self._types[type]
+        keys.discard(key)
+        if not keys:
+            del self._types[type]
+
+
+class ResponseCache(object):
+    """ Caches the responses of GET requests sent by an API connection
+        instance. Usage:
+
+            >>> api.setup(cache=ResponseCache(ttls={'languages': 3600,
+            ...                                     'projects': 60}))
+
+        - ttl: For how many seconds responses are cached, for API types not
+               mentioned in `ttls`. If None, only the types in `ttls` are
+               cached
+        - ttls: Per API type TTLs. The type of a request is the first segment
+                of its URL's path, eg 'projects' for '/projects/o:org:p:proj'
+                or for '/projects?filter[organization]=o:org'
+        - max_size: Size limit of the default in-memory backend
+        - backend: A `CacheBackend` instance, `MemoryCache(max_size)` by
+                   default
+
+        Responses are keyed by method, URL, query parameters and request
+        headers (and thus the authentication identity). Any other request
+        (POST, PATCH, DELETE) to a URL of some type, eg via `save`, `delete`
+        or `bulk_*`, invalidates all cached responses of that type.
+
+        Cached responses are decoded again on every hit, so that callers never
+        share objects. The `stats` attribute keeps count of hits, misses and
+        invalidations:
+
+            >>> cache.stats
+            <<< {'hits': 1830, 'misses': 12, 'invalidations': 3}
+    """
+
+    def __init__(self, ttl=None, ttls=None, max_size=1024, backend=None):
+        if ttls is None:
+            ttls = {}
+        if backend is None:
+            backend = MemoryCache(max_size=max_size)
+
+        self.ttl = ttl
+        self.ttls = dict(ttls)
+        self.backend = backend
+
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_type(path):
+        return path.lstrip('/').split('/', 1)[0].split('?', 1)[0]
+
+    def get_ttl(self, type):
+        return self.ttls.get(type, self.ttl)
+
+    def make_key(self, type, method, url, params=None, headers=None):
+        return "{}:{}".format(type,
+                              make_request_key(method, url, params, headers))
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.stats['misses'] += 1
+            else:
+                self.stats['hits'] += 1
+        return value
+
+    def set(self, key, value, type):
+        ttl = self.get_ttl(type)
+        if ttl:
+            self.backend.set(key, value, ttl, type)
+
+    def invalidate(self, type):
+        self.backend.invalidate(type)
+        with self._lock:
+            self.stats['invalidations'] += 1
+
+    def clear(self):
+        self.backend.clear()
+
+
+class ValidatorStore(object):
+    """ Remembers the `ETag` and `Last-Modified` validators of GET responses
+        along with their bodies, so that the same requests can be sent again
+        as conditional requests. If the server responds with
+        `304 Not Modified`, the stored body is used and nothing is
+        downloaded. Usage:
+
+            >>> api.setup(conditional=ValidatorStore(max_size=1024))
+            >>> # or
+            >>> api.setup(conditional=True)
+
+        Useful when polling resources that rarely change. Only the
+        `max_size` most recently used responses are kept. The `stats`
+        attribute counts the responses that were (not) modified and the
+        bytes that didn't have to be downloaded thanks to a 304:
+
+            >>> store.stats
+            <<< {'not_modified': 118, 'modified': 3, 'bytes_saved': 245120}
+    """
+
+    def __init__(self, max_size=1024):
+        self._entries = MemoryCache(max_size=max_size)
+        self.stats = {'not_modified': 0, 'modified': 0, 'bytes_saved': 0}
+        self._lock = threading.Lock()
+
+    def make_key(self, method, url, params=None, headers=None):
+        return make_request_key(method, url, params, headers)
+
+    def get(self, key):
+        """ Return `(etag, last_modified, content)` or None """
+
+        return self._entries.get(key)
+
+    def set(self, key, etag, last_modified, content):
+        self._entries.set(key, (etag, last_modified, content),
+                          float('inf'))
+
+    @staticmethod
+    def get_conditional_headers(entry):
+        etag, last_modified, _ = entry
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def record(self, not_modified, content=b""):
+        with self._lock:
+            if not_modified:
+                self.stats['not_modified'] += 1
+                self.stats['bytes_saved'] += len(content)
+            else:
+                self.stats['modified'] += 1
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,79 @@
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'exception')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class RequestCoalescer(object):
+    """ Lets identical GET requests that are in flight at the same time share
+        one network call ("single-flight"). Usage:
+
+            >>> api.setup(coalesce=RequestCoalescer())
+            >>> # or
+            >>> api.setup(coalesce=True)
+
+        Requests are identical if they have the same URL, query parameters
+        and headers (and thus the same authentication identity). The first
+        request is sent; the others wait for its response. Each caller still
+        gets its own parsed copy of the response body, since resource objects
+        take ownership of the data they are built from.
+
+        The `stats` attribute counts the requests that went through the
+        coalescer and how many of them were served by another request's
+        network call:
+
+            >>> coalescer.stats
+            <<< {'requests': 50, 'coalesced': 42}
+    """
+
+    def __init__(self):
+        self.stats = {'requests': 0, 'coalesced': 0}
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, coalesced):
+        with self._lock:
+            self._record(coalesced)
+
+    def _record(self, coalesced):
+        self.stats['requests'] += 1
+        if coalesced:
+            self.stats['coalesced'] += 1
+
+    def do(self, key, func):
+        """ Call `func` and return its result, unless a call with the same
+            `key` is already in progress, in which case wait for it and
+            return (or raise) its outcome instead.
+        """
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            self._record(not leader)
+
+        if not leader:
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as exc:
+            call.exception = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
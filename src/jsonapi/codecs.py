@@ -0,0 +1,87 @@
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import six
+
+
+class JsonCodec(object):
+    """ Encodes request bodies and decodes response bodies using the standard
+        library's `json` module.
+
+        Any object with `dumps` and `loads` methods can be passed as a codec
+        to `JsonApi.setup`. `dumps` may return bytes or text (which will be
+        encoded as UTF-8) and `loads` will receive the raw bytes of the
+        response body. Decoding errors must be (subclasses of) `ValueError`.
+    """
+
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(self, content):
+        if isinstance(content, six.binary_type):
+            content = content.decode('utf-8')
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    """ Uses `orjson` (https://github.com/ijl/orjson), which is several times
+        faster than `json`. Requires `pip install orjson`.
+    """
+
+    name = 'orjson'
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj):
+        return self._orjson.dumps(obj)
+
+    def loads(self, content):
+        return self._orjson.loads(content)
+
+
+class UjsonCodec(JsonCodec):
+    """ Uses `ujson`. Requires `pip install ujson`. """
+
+    name = 'ujson'
+
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+
+    def dumps(self, obj):
+        return self._ujson.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    def loads(self, content):
+        return self._ujson.loads(content)
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec, OrjsonCodec, UjsonCodec)}
+
+
+def get_codec(codec=None):
+    """ Return a codec instance:
+
+        - None: `orjson` if it is installed, `json` otherwise
+        - A string: the codec with this name ('json', 'orjson' or 'ujson')
+        - Anything else is considered to be a codec already and is returned
+          as-is
+    """
+
+    if codec is None:
+        try:
+            return OrjsonCodec()
+        except ImportError:
+            return JsonCodec()
+    elif isinstance(codec, six.string_types):
+        try:
+            codec_class = CODECS[codec]
+        except KeyError:
+            raise ValueError("Unknown JSON codec '{}', choose one of: {}".
+                             format(codec, ', '.join(sorted(CODECS))))
+        return codec_class()
+    return codec
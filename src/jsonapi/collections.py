@@ -1,10 +1,20 @@
 from __future__ import absolute_import, unicode_literals
 
+import math
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 from .compat import abc, parse_qs, urlparse
 from .exceptions import DoesNotExist, MultipleObjectsReturned
+from .records import Record
 
 
 class Collection(abc.MutableSequence):
+    # Keys of a response's 'meta' object that may hold the total number of
+    # items, used for parallel pagination if there is no 'last' link
+    TOTAL_COUNT_META_KEYS = ('total_count', 'count', 'total')
+
     def __init__(self, API, url, params=None):
         if params is None:
             params = {}
@@ -25,9 +35,20 @@ class Collection(abc.MutableSequence):
         self._data = None
         self._next_url = None
         self._previous_url = None
+        self._last_url = None
+        self._meta = None
+        self._included = {}
+
+        self._compact = False
+        self._prefetch_related = None
 
     @classmethod
     def from_data(cls, API, response_body):
+        """ Build an evaluated collection out of a parsed API response. The
+            items of `response_body` are used as-is, without copying, so they
+            should not be modified afterwards.
+        """
+
         result = cls(API, '')
         result._evaluate(response_body)
         return result
@@ -36,6 +57,8 @@ class Collection(abc.MutableSequence):
     @property
     def data(self):
         self._evaluate()
+        for index in range(len(self._data)):
+            self._hydrate(index)
         return self._data
 
     @property
@@ -48,51 +71,104 @@ class Collection(abc.MutableSequence):
         self._evaluate()
         return self._previous_url
 
+    @property
+    def last_url(self):
+        self._evaluate()
+        return self._last_url
+
+    @property
+    def meta(self):
+        self._evaluate()
+        return self._meta
+
     def _evaluate(self, response_body=None):
+        """ Items are kept as raw JSON and only turned into Resource instances
+            (or records) when they are accessed; counting or skimming a large
+            page will not pay for the items that are never looked at. If an
+            identity map is active, the items are hydrated right away, so that
+            they can share their included resources.
+        """
+
         if self._data is not None:
             return
 
         if response_body is None:
             response_body = self.API.request('get', self._url,
                                              params=self._params)
-        included = {}
-        if 'included' in response_body:
-            included = {(item['type'], item['id']): item
-                        for item in response_body['included']}
-
-        self._data = []
-        for item in response_body['data']:
-            related = {}
-            for (name, relationship) in item.get('relationships', {}).items():
-                if relationship is None or 'data' not in relationship:
-                    continue
-                key = (relationship['data']['type'],
-                       relationship['data']['id'])
-                if key in included:
-                    related[name] = self.API.new(included[key])
-            relationships = item.pop('relationships', {})
-            relationships.update(related)
-            self._data.append(self.API.new(relationships=relationships,
-                                           **item))
+        if 'included' in response_body and not self._compact:
+            self._included = {(item['type'], item['id']): item
+                              for item in response_body['included']}
+
+        self._data = [_Raw(item) for item in response_body['data']]
+        if self.API._identity_map is not None:
+            for index in range(len(self._data)):
+                self._hydrate(index)
 
         self._next_url = response_body.get('links', {}).get('next')
         self._previous_url = response_body.get('links', {}).get('previous')
+        self._last_url = response_body.get('links', {}).get('last')
+        self._meta = response_body.get('meta', {})
+
+        if self._prefetch_related is not None:
+            self._fetch_related()
+
+    def _fetch_related(self):
+        relationship_names, kwargs = self._prefetch_related
+        self.API.fetch_many(self, *relationship_names, **kwargs)
+
+    def _hydrate(self, index):
+        value = self._data[index]
+        if isinstance(value, _Raw):
+            value = self._data[index] = self._build(value.item)
+        return value
+
+    def _build(self, item):
+        if self._compact:
+            return Record(self.API, item)
+
+        related = {}
+        for (name, relationship) in item.get('relationships', {}).items():
+            if relationship is None or 'data' not in relationship:
+                continue
+            key = (relationship['data']['type'], relationship['data']['id'])
+            if key in self._included:
+                related[name] = self.API.resolve_included(self._included[key])
+        relationships = item.pop('relationships', {})
+        relationships.update(related)
+        item['relationships'] = relationships
+        return self.API.from_response(item)
+
+    def is_evaluated(self):
+        return self._data is not None
 
     # Make it look like a list
     def __getitem__(self, index):
-        return self.data[index]
+        self._evaluate()
+        if isinstance(index, slice):
+            return [self._hydrate(i)
+                    for i in range(*index.indices(len(self._data)))]
+        return self._hydrate(index)
+
+    def __iter__(self):
+        self._evaluate()
+        for index in range(len(self._data)):
+            yield self._hydrate(index)
 
     def __len__(self):
-        return len(self.data)
+        self._evaluate()
+        return len(self._data)
 
     def __setitem__(self, index, value):
-        self.data[index] = value
+        self._evaluate()
+        self._data[index] = value
 
     def __delitem__(self, index):
-        del self.data[index]
+        self._evaluate()
+        del self._data[index]
 
     def insert(self, index, value):
-        self.data.insert(index, value)
+        self._evaluate()
+        self._data.insert(index, value)
 
     def __repr__(self):
         return repr(self.data)
@@ -114,35 +190,236 @@ class Collection(abc.MutableSequence):
         else:
             links['previous'] = None
 
-        return {'data': [item.to_dict() for item in self.data], 'links': links}
+        return {'data': [item.to_dict() for item in self], 'links': links}
 
     # Pagination
     def has_next(self):
         return bool(self.next_url)
 
     def next(self):
-        return self.__class__(self.API, self.next_url, self._params)
+        return self._clone(self.next_url, self._params)
 
     def has_previous(self):
         return bool(self.previous_url)
 
     def previous(self):
-        return self.__class__(self.API, self.previous_url, self._params)
-
-    def all_pages(self):
-        if self.data:
-            yield self
-        page = self
-        while page.has_next():
-            page = page.next()
-            yield page
-
-    def all(self):
-        for page in self.all_pages():
+        return self._clone(self.previous_url, self._params)
+
+    def all_pages(self, prefetch=0, prefetch_max_items=None, parallel=None,
+                  ordered=True):
+        """ Iterate over this and all following pages.
+
+            If `prefetch` is set, up to that many of the following pages will
+            be fetched in a background thread while the caller processes the
+            current one. `prefetch_max_items` caps the memory used by the
+            pages waiting to be consumed: no new page will be requested while
+            that many items are buffered.
+
+            If `parallel` is set and the server's response reveals the total
+            number of pages (with a 'last' link or a total count in 'meta'),
+            the remaining pages will be fetched by `parallel` worker threads
+            at the same time, with at most `parallel` pages buffered. They
+            will be yielded in order, unless `ordered=False`, in which case
+            they will be yielded as soon as they arrive. If the total number
+            of pages is unknown, this falls back to `prefetch=parallel`.
+        """
+
+        if parallel:
+            remaining = self._get_remaining_pages()
+            if remaining is not None:
+                if len(self):
+                    yield self
+                for page in _evaluate_in_parallel(remaining, parallel,
+                                                  ordered):
+                    yield page
+                return
+            prefetch = prefetch or parallel
+
+        if prefetch:
+            # Start fetching the next pages before handing out the first one
+            self._evaluate()
+            pages = _PagePrefetcher(self, prefetch, prefetch_max_items)
+            try:
+                if len(self):
+                    yield self
+                for page in pages:
+                    yield page
+            finally:
+                pages.close()
+        else:
+            if len(self):
+                yield self
+            page = self
+            while page.has_next():
+                page = page.next()
+                yield page
+
+    def all(self, prefetch=0, prefetch_max_items=None, parallel=None,
+            ordered=True):
+        for page in self.all_pages(prefetch=prefetch,
+                                   prefetch_max_items=prefetch_max_items,
+                                   parallel=parallel,
+                                   ordered=ordered):
             for item in page:
                 yield item
 
+    def iterator(self, chunk_size=64 * 1024):
+        """ Yield the items of this and all following pages like `.all()`,
+            but decode each page while it is being downloaded and don't keep
+            the items around after yielding them, so that memory usage is
+            bounded by roughly one item instead of one page:
+
+                >>> for string in (api.ResourceString.
+                ...                filter(resource=resource).
+                ...                page(size=1000).
+                ...                iterator()):
+                ...     ...
+
+            If you used `.include()` and the server sends the 'included'
+            section after 'data', each page's items are held back until
+            'included' has been read.
+        """
+
+        page = self
+        while True:
+            if page.is_evaluated():
+                for item in page:
+                    yield item
+                next_url = page._next_url
+            else:
+                links = {}
+                for item in page._stream(links, chunk_size):
+                    yield item
+                next_url = links.get('next')
+            if not next_url:
+                return
+            page = page._clone(next_url, page._params)
+
+    def _stream(self, links, chunk_size):
+        """ Stream the items of this page; fill in `links` at the end """
+
+        pending = []
+        included_done = False
+        previous_key = None
+        for key, value in self.API.stream('get', self._url,
+                                          chunk_size=chunk_size,
+                                          params=self._params):
+            if previous_key == 'included' and key != 'included':
+                included_done = True
+                for item in pending:
+                    yield self._build(item)
+                pending = []
+            previous_key = key
+
+            if key == 'data':
+                if (included_done or self._compact or
+                        'include' not in self._params):
+                    yield self._build(value)
+                else:
+                    pending.append(value)
+            elif key == 'included':
+                if not self._compact:
+                    self._included[(value['type'], value['id'])] = value
+            elif key == 'links':
+                links.update(value or {})
+        for item in pending:
+            yield self._build(item)
+
+    def _get_remaining_pages(self):
+        """ Return (unevaluated) collections for all the pages following this
+            one, if the total number of pages can be determined from the
+            response; None otherwise.
+        """
+
+        if not self.has_next():
+            return []
+
+        if self.last_url:
+            last_page = self._clone(self.last_url)
+            url, params = last_page._url, last_page._params
+            for key in ('page[number]', 'page'):
+                if key in params:
+                    break
+            else:
+                return None
+            try:
+                last_number = int(params[key])
+            except (TypeError, ValueError):
+                return None
+        else:
+            for count_key in self.TOTAL_COUNT_META_KEYS:
+                if count_key in self.meta:
+                    total_count = self.meta[count_key]
+                    break
+            else:
+                return None
+            # Only numbered pages can be requested up front; eg with cursor
+            # pagination, 'page[number]' would be ignored by the server
+            next_params = self._clone(self.next_url)._params
+            for key in ('page[number]', 'page'):
+                if key in self._params or key in next_params:
+                    break
+            else:
+                return None
+            url, params = self._url, dict(self._params)
+            size = int(params.get('page[size]', len(self)))
+            if not size:
+                return None
+            params['page[size]'] = size
+            last_number = int(math.ceil(float(total_count) / size))
+
+        try:
+            current_number = int(self._params.get(key, 1))
+        except (TypeError, ValueError):
+            return None
+
+        result = []
+        for number in range(current_number + 1, last_number + 1):
+            page_params = dict(params)
+            page_params[key] = number
+            result.append(self._clone(url, page_params))
+        return result
+
     # Filters etc
+    def _clone(self, url, params=None):
+        result = self.__class__(self.API, url, params)
+        result._compact = self._compact
+        result._prefetch_related = self._prefetch_related
+        return result
+
+    def compact(self):
+        """ Return a copy of the collection whose items will be compact,
+            read-only `Record` objects instead of Resource instances. Useful
+            when reading large amounts of data, eg with `.all()`.
+            `included` objects are ignored.
+        """
+
+        result = self._clone(self._url, dict(self._params))
+        result._compact = True
+        return result
+
+    def prefetch_related(self, *relationship_names, **kwargs):
+        """ Return a copy of the collection that, whenever a page is fetched,
+            also loads the related objects of `relationship_names` for all of
+            its items with `JsonApi.fetch_many` (with `kwargs`), using a few
+            batched requests instead of one per item:
+
+                >>> for string in (api.ResourceString.filter(...).
+                ...                prefetch_related('resource').
+                ...                all()):
+                ...     print(string.resource.name)  # No request here
+
+            Prefer `.include()` if the server supports it for the
+            relationships you need. Has no effect on `.iterator()`.
+        """
+
+        if self._compact:
+            raise ValueError("Cannot prefetch relationships of compact "
+                             "records")
+        result = self._clone(self._url, dict(self._params))
+        result._prefetch_related = (relationship_names, kwargs)
+        return result
+
     def filter(self, **filters):
         from .resources import Resource
 
@@ -156,7 +433,7 @@ class Collection(abc.MutableSequence):
 
             params[key] = value
 
-        return self.__class__(self.API, self._url, params)
+        return self._clone(self._url, params)
 
     def page(self, *args, **kwargs):
         params = dict(self._params)
@@ -170,13 +447,13 @@ class Collection(abc.MutableSequence):
             raise ValueError("Either one positional or keyword arguments "
                              "accepted for pagination")
 
-        return self.__class__(self.API, self._url, params)
+        return self._clone(self._url, params)
 
     def _param_method(param_name):
         def _method(self, *fields):
             params = dict(self._params)
             params[param_name] = ','.join(fields)
-            return self.__class__(self.API, self._url, params)
+            return self._clone(self._url, params)
         return _method
 
     include = _param_method('include')
@@ -186,7 +463,7 @@ class Collection(abc.MutableSequence):
     def extra(self, **kwargs):
         params = dict(self._params)
         params.update(kwargs)
-        return self.__class__(self.API, self._url, params)
+        return self._clone(self._url, params)
 
     def get(self, **filters):
         if filters:
@@ -199,3 +476,123 @@ class Collection(abc.MutableSequence):
         if len(qs) > 1:
             raise MultipleObjectsReturned(len(qs))
         return qs[0]
+
+
+class _Raw(object):
+    """ An item of a response's 'data' that has not been turned into a
+        resource instance yet
+    """
+
+    __slots__ = ('item',)
+
+    def __init__(self, item):
+        self.item = item
+
+
+class _PagePrefetcher(object):
+    """ Follows the 'next' links of `page` in a background thread, keeping at
+        most `depth` evaluated pages (and, optionally, `max_items` items)
+        ready for the consumer.
+    """
+
+    def __init__(self, page, depth, max_items=None):
+        self._depth = depth
+        self._max_items = max_items
+
+        self._pages = deque()
+        self._buffered_items = 0
+        self._done = False
+        self._closed = False
+        self._error = None
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(target=self._run, args=(page, ))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _is_full(self):
+        return (len(self._pages) >= self._depth or
+                (self._max_items is not None and
+                 self._buffered_items >= self._max_items))
+
+    def _run(self, page):
+        try:
+            while page.has_next():
+                with self._condition:
+                    while self._is_full() and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                page = page.next()
+                page._evaluate()
+                with self._condition:
+                    self._pages.append(page)
+                    self._buffered_items += len(page._data)
+                    self._condition.notify_all()
+        except Exception as exc:
+            with self._condition:
+                self._error = exc
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    def __iter__(self):
+        while True:
+            with self._condition:
+                while not self._pages and not self._done:
+                    self._condition.wait()
+                if self._pages:
+                    page = self._pages.popleft()
+                    self._buffered_items -= len(page._data)
+                    self._condition.notify_all()
+                elif self._error is not None:
+                    raise self._error
+                else:
+                    return
+            yield page
+
+    def close(self):
+        """ Stop fetching pages, eg if the consumer stopped iterating early """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+def _evaluate_page(page):
+    page._evaluate()
+    return page
+
+
+def _evaluate_in_parallel(pages, workers, ordered=True):
+    """ Evaluate `pages` using a pool of `workers` threads, keeping at most
+        `workers` pages in flight or waiting to be consumed.
+    """
+
+    pages = iter(pages)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def submit():
+        for page in pages:
+            pending.append(executor.submit(_evaluate_page, page))
+            break
+
+    try:
+        for _ in range(workers):
+            submit()
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            page = future.result()
+            submit()
+            yield page
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
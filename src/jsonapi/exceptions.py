@@ -34,6 +34,10 @@ class JsonApiException(Exception):
             <<< 'Invalid JSON'
     """
 
+    # How many times the request was retried before giving up, see
+    # `jsonapi.RetryPolicy`
+    retries = 0
+
     def __init__(self, status_code, errors):
         errors = [JsonApiError(**error) for error in errors]
         super(JsonApiException, self).__init__(status_code, errors)
@@ -76,6 +80,28 @@ class JsonApiError(object):
         return result
 
 
+class BulkError(Exception):
+    """ Raised by bulk operations that were split into chunks, if some of the
+        chunks failed. The other chunks have been sent successfully:
+
+            >>> exc.result  # Merged result of the successful chunks
+            <<< [<Foo: 1>, <Foo: 2>, ...]
+            >>> exc.errors  # Index range of the items of each failed chunk
+            ...             # and what went wrong
+            <<< [(150, 300, JsonApiException(400, [...]))]
+    """
+
+    result = property(lambda self: self.args[0])
+    errors = property(lambda self: self.args[1])
+
+    def __str__(self):
+        return "{} chunk(s) failed, items: {}".format(
+            len(self.errors),
+            ', '.join("{}-{} ({!r})".format(start, stop, exc)
+                      for start, stop, exc in self.errors),
+        )
+
+
 class NotSingleItem(Exception):
     pass
 
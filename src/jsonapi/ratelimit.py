@@ -0,0 +1,114 @@
+from __future__ import absolute_import, unicode_literals
+
+import threading
+import time
+
+
+class RateLimiter(object):
+    """ Thread-safe token bucket that limits the rate of requests sent by an
+        API connection instance. Usage:
+
+            >>> api.setup(rate_limit=RateLimiter(rate=10, burst=20))
+
+        - rate: Requests per second
+        - burst: How many requests can be sent back-to-back after a period of
+                 inactivity. Defaults to `rate`
+        - min_rate: The limiter will never slow down below this rate
+        - decrease_factor: When the server responds with a 429, the rate will
+                           be multiplied by this factor
+        - cooldown: The rate is decreased at most once every this many
+                    seconds, so that a burst of concurrent requests rejected
+                    for the same reason only counts once
+        - increase: After each successful request, the rate will be increased
+                    by this many requests per second, until it reaches its
+                    original value again. Defaults to 1% of `rate`
+
+        Since the limiter is stored on the API connection instance, all
+        resource classes bound to it and all threads using it share the same
+        budget. Every call to `acquire` reserves a token, so waiting threads
+        are served in the order they arrived.
+    """
+
+    def __init__(self, rate, burst=None, min_rate=None, decrease_factor=0.5,
+                 increase=None, cooldown=1, sleep=None, get_now=None):
+        if burst is None:
+            burst = rate
+        if min_rate is None:
+            min_rate = rate / 20.0
+        if increase is None:
+            increase = rate / 100.0
+
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst
+        self.min_rate = min_rate
+        self.decrease_factor = decrease_factor
+        self.increase = increase
+        self.cooldown = cooldown
+
+        # Dependency injection for sleeping and getting the current timestamp,
+        # mostly useful for testing
+        if sleep is None:
+            sleep = time.sleep
+        self.sleep = sleep
+        if get_now is None:
+            get_now = time.time
+        self.get_now = get_now
+
+        self.tokens = float(burst)
+        self._last = self.get_now()
+        self._last_decrease = None
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self.get_now()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def reserve(self):
+        """ Reserve a token and return how long the caller must wait before
+            sending its request, without waiting.
+        """
+
+        with self._lock:
+            self._refill()
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0
+            else:
+                return -self.tokens / self.rate
+
+    def acquire(self):
+        """ Block until a request can be sent. Returns the time spent waiting.
+        """
+
+        delay = self.reserve()
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    def throttled(self, retry_after=None):
+        """ Called when the server rejected a request because of rate
+            limiting. Slows down and, if the server told us how long to wait,
+            holds back all requests for that long.
+        """
+
+        with self._lock:
+            self._refill()
+            if (self._last_decrease is None or
+                    self._last - self._last_decrease >= self.cooldown):
+                self.rate = max(self.min_rate,
+                                self.rate * self.decrease_factor)
+                self._last_decrease = self._last
+            # Not cumulative, since concurrent rejections usually carry the
+            # same hint
+            self.tokens = min(self.tokens, -(retry_after or 0) * self.rate)
+
+    def succeeded(self):
+        """ Called after a successful request; slowly recovers the rate. """
+
+        with self._lock:
+            if self.rate < self.max_rate:
+                self._refill()
+                self.rate = min(self.max_rate, self.rate + self.increase)
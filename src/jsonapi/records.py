@@ -0,0 +1,196 @@
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+from six.moves import intern
+
+from .utils import has_data, is_dict, is_list
+
+
+class _Shape(object):
+    """ The field names shared by all records with the same type, attribute
+        names and relationship names. Only one instance exists per distinct
+        shape, so records only need to store their values.
+
+        Shapes are kept for the lifetime of the process. This assumes they
+        come from the fixed set of types and fields an API sends, so that
+        there are only a few of them; don't make records out of objects with
+        arbitrary attribute names.
+    """
+
+    __slots__ = ('attribute_names', 'relationship_names', 'index')
+
+    _registry = {}
+    _lock = threading.Lock()
+
+    def __init__(self, attribute_names, relationship_names):
+        self.attribute_names = attribute_names
+        self.relationship_names = relationship_names
+        self.index = {name: i
+                      for i, name in enumerate(attribute_names +
+                                               relationship_names)}
+
+    @classmethod
+    def get(cls, attribute_names, relationship_names):
+        key = (attribute_names, relationship_names)
+        try:
+            return cls._registry[key]
+        except KeyError:
+            pass
+        with cls._lock:
+            return cls._registry.setdefault(
+                key,
+                cls(tuple(intern(str(name)) for name in attribute_names),
+                    tuple(intern(str(name)) for name in relationship_names)),
+            )
+
+
+class _Links(object):
+    """ A relationship that was sent without data, only with links (eg its
+        'related' URL), as opposed to one with `'data': null`
+    """
+
+    __slots__ = ('links', )
+
+    def __init__(self, links):
+        self.links = links
+
+
+def _compact_relationship(relationship):
+    """ Keep only the resource identifier(s) of a relationship, as
+        `(type, id)` tuples, or its links if it has no data
+    """
+
+    if not has_data(relationship):
+        if is_dict(relationship) and 'links' in relationship:
+            return _Links(relationship['links'])
+        return None
+    data = relationship['data']
+    if is_dict(data):
+        return (intern(str(data['type'])), data['id'])
+    elif is_list(data):
+        return tuple((intern(str(item['type'])), item['id'])
+                     for item in data)
+    return None
+
+
+class Record(object):
+    """ Compact, read-only representation of an API resource object, for
+        when you need to keep a lot of them in memory. Use
+        `Collection.compact()` to get records instead of Resource instances:
+
+            >>> strings = list(api.ResourceString.filter(resource=resource).
+            ...                compact().
+            ...                all())
+            >>> strings[0].key
+            <<< 'hello_world'
+            >>> strings[0].resource
+            <<< {'type': "resources", 'id': "o:org:p:proj:r:res"}
+
+        Attributes are accessible the same way as on Resource instances.
+        Relationships only hold resource identifiers (related objects are not
+        kept). `links` and `included` objects are discarded, except for the
+        links of relationships sent without data: like with Resource
+        instances, these are kept in `relationships` and accessing them as
+        attributes raises `AttributeError`, while relationships with
+        `'data': null` are None. A record can be turned back into a Resource
+        instance with `to_resource()`.
+    """
+
+    __slots__ = ('type', 'id', '_shape', '_values', 'API')
+
+    def __init__(self, API, data):
+        attributes = data.get('attributes') or {}
+        relationships = data.get('relationships') or {}
+        shape = _Shape.get(tuple(attributes), tuple(relationships))
+
+        set_ = super(Record, self).__setattr__
+        set_('API', API)
+        set_('type', intern(str(data['type'])))
+        set_('id', data.get('id'))
+        set_('_shape', shape)
+        set_('_values', tuple(
+            [attributes[name] for name in shape.attribute_names] +
+            [_compact_relationship(relationships[name])
+             for name in shape.relationship_names]
+        ))
+
+    def __getattr__(self, attr):
+        # Only called if 'attr' is not a slot or a method
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        shape = self._shape
+        try:
+            index = shape.index[attr]
+        except KeyError:
+            raise AttributeError(attr)
+        value = self._values[index]
+        if index < len(shape.attribute_names):
+            return value
+        if isinstance(value, _Links):
+            raise AttributeError("Relationship '{}' has no data, only links: "
+                                 "{}".format(attr, value.links))
+        return self._as_identifier(value)
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Records are read-only")
+
+    @staticmethod
+    def _as_identifier(value):
+        if value is None:
+            return None
+        elif value and isinstance(value[0], tuple):
+            return [{'type': type, 'id': id} for type, id in value]
+        elif value:
+            return {'type': value[0], 'id': value[1]}
+        return []
+
+    @property
+    def attributes(self):
+        return dict(zip(self._shape.attribute_names, self._values))
+
+    @property
+    def relationships(self):
+        offset = len(self._shape.attribute_names)
+        result = {}
+        for name, value in zip(self._shape.relationship_names,
+                               self._values[offset:]):
+            if isinstance(value, _Links):
+                result[name] = {'links': value.links}
+                continue
+            identifier = self._as_identifier(value)
+            result[name] = None if identifier is None else {'data': identifier}
+        return result
+
+    def as_resource_identifier(self):
+        return {'type': self.type, 'id': self.id}
+
+    def to_dict(self):
+        result = self.as_resource_identifier()
+        attributes, relationships = self.attributes, self.relationships
+        if attributes:
+            result['attributes'] = attributes
+        if relationships:
+            result['relationships'] = relationships
+        return result
+
+    def to_resource(self):
+        """ Return a (full) Resource instance with the same data """
+
+        return self.API.from_response(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_resource_identifier()
+        elif hasattr(other, 'as_resource_identifier'):
+            other = other.as_resource_identifier()
+        return self.as_resource_identifier() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.type, self.id))
+
+    def __repr__(self):
+        return repr("<Record {}: {}>".format(self.type, self.id))
@@ -1,10 +1,11 @@
 from __future__ import absolute_import, unicode_literals
 
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 
 import requests
 
-from .collections import Collection
+from .exceptions import BulkError
 from .utils import (has_data, has_links, is_collection, is_dict, is_fetched,
                     is_list, is_null, is_related, is_related_list, is_resource,
                     is_resource_identifier)
@@ -22,6 +23,9 @@ class Resource(object):
 
     TYPE = None
     EDITABLE = None
+    # Default `chunk_size` for bulk operations; None sends everything in one
+    # request
+    BULK_CHUNK_SIZE = None
 
     # Creation
     def __init__(self, data=None, **kwargs):
@@ -46,6 +50,24 @@ class Resource(object):
         else:
             self._overwrite(**kwargs)
 
+    @classmethod
+    def from_response(cls, data, included=None):
+        """ Initialize an API resource instance from an item of a freshly
+            parsed API response.
+
+            Unlike the constructor, which copies the dicts it receives so that
+            the caller can keep modifying them, this takes ownership of `data`
+            and uses its dicts as they are. Only use this if nothing else
+            holds a reference to `data`.
+        """
+
+        if 'type' in data and data['type'] != cls.TYPE:
+            raise ValueError("Invalid type")
+
+        instance = cls.__new__(cls)
+        instance._overwrite(included=included, _copy=False, **data)
+        return instance
+
     def _overwrite(self,
                    # Copied from response to the instance
                    id=None, attributes=None, relationships=None, links=None,
@@ -55,10 +77,13 @@ class Resource(object):
                    redirect=None,
                    # Ignored
                    type=None,
+                   # Whether the dicts need to be copied; False if they come
+                   # from a response that nobody else holds (`from_response`)
+                   _copy=True,
                    # Magic
                    **kwargs):
         """ Write to the basic attributes of Resource. Used by '__init__',
-            'reload', '__copy__' and 'save'
+            'from_response', 'reload', '__copy__' and 'save'
         """
 
         # Handle "magic" kwargs
@@ -75,19 +100,23 @@ class Resource(object):
         # Copy from response
         self.id = id
 
-        self.attributes = deepcopy(attributes)
+        if _copy:
+            attributes = deepcopy(attributes)
+        self.attributes = attributes
 
-        if links is not None:
+        if links is None:
+            self.links = {}
+        elif _copy:
             self.links = deepcopy(links)
         else:
-            self.links = {}
+            self.links = links
 
         self.redirect = redirect
 
         # Relationships
         self.relationships, self.related = {}, {}
         for key, value in relationships.items():
-            self._set_relationship(key, value)
+            self._set_relationship(key, value, copy=_copy)
             relationship = self.relationships[key]
             if is_null(relationship) or has_data(relationship):
                 self.set_related(key, value)
@@ -98,19 +127,28 @@ class Resource(object):
                 if is_null(relationship) or not has_data(relationship):
                     continue
                 if is_list(relationship['data']):  # Plural with data
-                    new_items = [
-                        included.get((r['type'], r['id']),
-                                     self.related[relationship_name][i])
-                        for i, r in enumerate(relationship['data'])
-                    ]
+                    new_items = []
+                    for i, r in enumerate(relationship['data']):
+                        key = (r['type'], r['id'])
+                        if key in included:
+                            new_items.append(
+                                self.API.resolve_included(included[key])
+                            )
+                        else:
+                            new_items.append(
+                                self.related[relationship_name][i]
+                            )
                     self.set_related(relationship_name, new_items)
                 else:  # Singular
                     key = (relationship['data']['type'],
                            relationship['data']['id'])
                     if key in included:
-                        self.set_related(relationship_name, included[key])
+                        self.set_related(
+                            relationship_name,
+                            self.API.resolve_included(included[key]),
+                        )
 
-    def _set_relationship(self, key, value):
+    def _set_relationship(self, key, value, copy=True):
         """ Set 'value' as 'key' relationship. For value we accept:
 
             - A Resource object
@@ -139,7 +177,8 @@ class Resource(object):
         elif is_resource(value):
             self.relationships[key] = value.as_relationship()
         else:
-            value = deepcopy(value)
+            if copy:
+                value = deepcopy(value)
             if not is_null(value) and is_resource_identifier(value):
                 value = {'data': value}
             if is_null(value) or has_data(value) or has_links(value):
@@ -176,7 +215,9 @@ class Resource(object):
             # Plural
             if has_data(value):
                 value = value['data']
-            self.related[key] = Collection.from_data(self.API, {'data': []})
+            self.related[key] = self.API.collection_class.from_data(
+                self.API, {'data': []}
+            )
             for item in value:
                 self.related[key].append(self.API.as_resource(item))
             new_relationship = [item.as_resource_identifier()
@@ -260,11 +301,15 @@ class Resource(object):
             params = {'include': ','.join(include)}
         url = self.links.get('self', self.get_item_url())
         response_body = self.API.request('get', url, params=params)
+        self._post_reload(response_body)
+
+    def _post_reload(self, response_body):
         if (isinstance(response_body, requests.Response) and
                 response_body.status_code == 303):
             self._overwrite(redirect=response_body.headers['Location'])
         else:
             self._overwrite(included=response_body.get('included'),
+                            _copy=False,
                             **response_body['data'])
 
     @classmethod
@@ -314,11 +359,25 @@ class Resource(object):
 
         force = kwargs.pop('force', False)
 
+        for related in self._prepare_fetch(relationship_names, force):
+            related.reload()
+
+        if len(relationship_names) == 1:
+            # This way you can do `project.fetch('languages').filter(...)`
+            return self.related[relationship_names[0]]
+
+    def _prepare_fetch(self, relationship_names, force=False):
+        """ Set up plural relationships as (lazy) collections and return the
+            related objects of singular relationships that need to be
+            reloaded.
+        """
+
         for relationship_name in relationship_names:
             if relationship_name not in self.relationships:
                 raise ValueError("{} doesn't have relationship '{}'".
                                  format(repr(self), relationship_name))
 
+        to_reload = []
         for relationship_name in relationship_names:
             relationship = self.relationships[relationship_name]
 
@@ -328,6 +387,7 @@ class Resource(object):
             related = self.related.get(relationship_name)
             is_singular_fetched = is_fetched(related)
             is_plural_fetched = (is_collection(related) and
+                                 related.is_evaluated() and
                                  all((is_fetched(item) for item in related)))
             if (is_singular_fetched or is_plural_fetched) and not force:
                 # Has been fetched already
@@ -335,22 +395,21 @@ class Resource(object):
 
             if has_data(relationship) and not is_list(relationship['data']):
                 # Singular relationship
-                self.related[relationship_name].reload()
+                to_reload.append(self.related[relationship_name])
             else:
                 # Plural relationship
                 url = relationship.\
                     get('links', {}).\
                     get('related', "/{}/{}/{}".format(self.TYPE, self.id,
                                                       relationship_name))
-                self.related[relationship_name] = Collection(self.API, url)
-
-        if len(relationship_names) == 1:
-            # This way you can do `project.fetch('languages').filter(...)`
-            return self.related[relationship_names[0]]
+                self.related[relationship_name] = self.API.collection_class(
+                    self.API, url
+                )
+        return to_reload
 
     @classmethod
     def list(cls):
-        return Collection(cls.API, "/{}".format(cls.TYPE))
+        return cls.API.collection_class(cls.API, "/{}".format(cls.TYPE))
 
     def _collection_method(method):
         def _method(cls, *args, **kwargs):
@@ -363,8 +422,11 @@ class Resource(object):
     sort = _collection_method('sort')
     fields = _collection_method('fields')
     extra = _collection_method('extra')
+    compact = _collection_method('compact')
+    prefetch_related = _collection_method('prefetch_related')
     all_pages = _collection_method('all_pages')
     all = _collection_method('all')
+    iterator = _collection_method('iterator')
 
     # Editing
     def save(self, *fields, **kwargs):
@@ -472,6 +534,7 @@ class Resource(object):
 
         self._overwrite(relationships=relationships,
                         included=response_body.get('included'),
+                        _copy=False,
                         **data)
 
     @classmethod
@@ -498,8 +561,12 @@ class Resource(object):
         if self.redirect is None:
             raise ValueError("Cannot follow a non-redirect response")
         response_body = self.API.request('get', self.redirect)
+        return self._process_followed(response_body)
+
+    def _process_followed(self, response_body):
         if is_list(response_body['data']):
-            return Collection.from_data(self.API, response_body)
+            return self.API.collection_class.from_data(self.API,
+                                                       response_body)
         elif is_dict(response_body['data']):
             return self.API.new(response_body)
         else:  # Unreachable code
@@ -647,7 +714,7 @@ class Resource(object):
 
     # Bulk actions
     @classmethod
-    def bulk_delete(cls, items):
+    def bulk_delete(cls, items, chunk_size=None, concurrency=1):
         """ Delete API resource instances in bulk. The server needs to support
             this using the 'bulk' profile with the
             'application/vnd.api+json;profile="bulk"' Content-Type header.
@@ -667,24 +734,31 @@ class Resource(object):
 
                 >>> foos = Foo.list(...)
                 >>> Foo.bulk_delete(foos)
+
+            Supports `chunk_size` and `concurrency`, see `bulk_create`.
         """
 
-        payload = []
+        payload = cls._bulk_delete_payload(items)
+        chunks = cls._bulk_chunks(payload, chunk_size)
+        if chunks is None:
+            cls._bulk_request('delete', payload)
+            return len(payload)
+
+        results, errors = cls._bulk_dispatch('delete', chunks, concurrency)
+        return cls._bulk_delete_result(chunks, results, errors)
 
+    @classmethod
+    def _bulk_delete_payload(cls, items):
+        payload = []
         for item in items:
             item = cls.as_resource(item)
             if not is_resource(item):
                 item = cls(id=item)
             payload.append(item.as_resource_identifier())
-
-        cls.API.request('delete',
-                        cls.get_collection_url(),
-                        json={'data': payload},
-                        bulk=True)
-        return len(payload)
+        return payload
 
     @classmethod
-    def bulk_create(cls, items):
+    def bulk_create(cls, items, chunk_size=None, concurrency=1):
         """ Create API resource instances in bulk. The server needs to support
             this using the 'bulk' profile with the
             'application/vnd.api+json;profile="bulk"' Content-Type header.
@@ -714,8 +788,27 @@ class Resource(object):
                 >>> result = Child.bulk_create([({'username': "username1"},
                 ...                              {'parent': parent}),
                 ...                             ...])
+
+            If `chunk_size` (or the class's `BULK_CHUNK_SIZE`) is set, the
+            items will be sent in chunks of that size, `concurrency` chunks at
+            a time. The results are merged back in input order. If some chunks
+            fail, the rest are still sent and a `BulkError` is raised at the
+            end, with the merged results of the successful chunks and the
+            errors of the failed ones:
+
+                >>> try:
+                ...     Foo.bulk_create(items, chunk_size=150, concurrency=4)
+                ... except BulkError as exc:
+                ...     exc.result  # Created instances
+                ...     for start, stop, error in exc.errors:
+                ...         retry_later(items[start:stop])
         """
 
+        payload = cls._bulk_create_payload(items)
+        return cls._bulk_save('post', payload, chunk_size, concurrency)
+
+    @classmethod
+    def _bulk_create_payload(cls, items):
         payload = []
         for item in items:
             if is_list(item):
@@ -733,15 +826,11 @@ class Resource(object):
                 payload[-1]['relationships'] = item.relationships
             if item.id:
                 payload[-1]['id'] = item.id
-
-        response_body = cls.API.request('post',
-                                        cls.get_collection_url(),
-                                        json={'data': payload},
-                                        bulk=True)
-        return Collection.from_data(cls.API, response_body)
+        return payload
 
     @classmethod
-    def bulk_update(cls, items, fields=None):
+    def bulk_update(cls, items, fields=None, chunk_size=None,
+                    concurrency=1):
         """ Update API resource instances in bulk. The server needs to support
             this using the 'bulk' profile with the
             'application/vnd.api+json;profile="bulk"' Content-Type header.
@@ -762,8 +851,15 @@ class Resource(object):
                 >>> for foo in foos:
                 ...     foo.attributes['approved'] = True
                 >>> foos = Foo.bulk_update(foos, ['approved'])
+
+            Supports `chunk_size` and `concurrency`, see `bulk_create`.
         """
 
+        payload = cls._bulk_update_payload(items, fields)
+        return cls._bulk_save('patch', payload, chunk_size, concurrency)
+
+    @classmethod
+    def _bulk_update_payload(cls, items, fields=None):
         if fields is None:
             fields = cls.EDITABLE
 
@@ -807,12 +903,93 @@ class Resource(object):
                     key: cls.API.as_resource(value).as_relationship()
                     for key, value in relationships.items()
                 }
+        return payload
 
-        response_body = cls.API.request('patch',
-                                        cls.get_collection_url(),
-                                        json={'data': payload},
-                                        bulk=True)
-        return Collection.from_data(cls.API, response_body)
+    @classmethod
+    def _bulk_save(cls, method, payload, chunk_size=None, concurrency=1):
+        chunks = cls._bulk_chunks(payload, chunk_size)
+        if chunks is None:
+            response_body = cls._bulk_request(method, payload)
+            return cls.API.collection_class.from_data(cls.API, response_body)
+
+        results, errors = cls._bulk_dispatch(method, chunks, concurrency)
+        return cls._bulk_save_result(results, errors)
+
+    @classmethod
+    def _bulk_request(cls, method, payload):
+        return cls.API.request(method,
+                               cls.get_collection_url(),
+                               json={'data': payload},
+                               bulk=True)
+
+    @classmethod
+    def _bulk_chunks(cls, payload, chunk_size=None):
+        """ Split `payload` into `(start, chunk)` pairs, or return None if it
+            should be sent in one request
+        """
+
+        if chunk_size is None:
+            chunk_size = cls.BULK_CHUNK_SIZE
+        if not chunk_size:
+            return None
+        return [(start, payload[start:start + chunk_size])
+                for start in range(0, len(payload), chunk_size)]
+
+    @classmethod
+    def _bulk_dispatch(cls, method, chunks, concurrency=1):
+        """ Send every chunk, `concurrency` at a time. Returns the response
+            bodies (None for failed chunks) and the `(start, stop, exception)`
+            triplets of the failed chunks, both in input order
+        """
+
+        def send(chunk):
+            try:
+                return cls._bulk_request(method, chunk), None
+            except Exception as exc:
+                return None, exc
+
+        if concurrency > 1 and len(chunks) > 1:
+            with ThreadPoolExecutor(min(concurrency, len(chunks))) as pool:
+                outcomes = list(pool.map(send,
+                                         [chunk for _, chunk in chunks]))
+        else:
+            outcomes = [send(chunk) for _, chunk in chunks]
+        return cls._bulk_outcomes(chunks, outcomes)
+
+    @staticmethod
+    def _bulk_outcomes(chunks, outcomes):
+        """ Split `(result, exception)` pairs into results and errors """
+
+        results, errors = [], []
+        for (start, chunk), (result, exc) in zip(chunks, outcomes):
+            results.append(result)
+            if exc is not None:
+                errors.append((start, start + len(chunk), exc))
+        return results, errors
+
+    @classmethod
+    def _bulk_save_result(cls, results, errors):
+        data, included = [], []
+        for response_body in results:
+            if response_body is None:
+                continue
+            data.extend(response_body['data'])
+            included.extend(response_body.get('included', ()))
+        response_body = {'data': data}
+        if included:
+            response_body['included'] = included
+        result = cls.API.collection_class.from_data(cls.API, response_body)
+        if errors:
+            raise BulkError(result, errors)
+        return result
+
+    @staticmethod
+    def _bulk_delete_result(chunks, results, errors):
+        failed = sum(stop - start for start, stop, _ in errors)
+        result = sum(len(chunk) for _, chunk in chunks) - failed
+        if errors:
+            raise BulkError(result, errors)
+        return result
 
     # Utils
     def __eq__(self, other):
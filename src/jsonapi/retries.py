@@ -0,0 +1,143 @@
+from __future__ import absolute_import, unicode_literals
+
+import email.utils
+import random
+import threading
+import time
+
+
+def parse_retry_after(value, now=None):
+    """ `Retry-After` can either be a number of seconds or an HTTP date.
+        Returns the number of seconds to wait or None.
+    """
+
+    if not value:
+        return None
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(0, email.utils.mktime_tz(parsed) - now)
+
+
+class RetryPolicy(object):
+    """ Decides whether and when a failed request to the API should be
+        retried. Usage:
+
+            >>> api.setup(retry=RetryPolicy(max_attempts=5,
+            ...                             backoff_factor=1,
+            ...                             max_backoff=60))
+
+        - max_attempts: How many times a request will be sent in total before
+                        giving up
+        - backoff_factor, max_backoff: The delay before the n-th retry will be
+                                       `backoff_factor * 2 ** (n - 1)` seconds,
+                                       but never more than `max_backoff`
+        - jitter: If True, the delay will be a random number between 0 and the
+                  value described above ("full jitter"), so that many clients
+                  that failed at the same time will not retry at the same time
+        - statuses: The HTTP status codes that will be retried
+        - methods: The HTTP methods that are safe to retry. POST and PATCH are
+                   not included by default because retrying them may apply
+                   the same change twice; pass `retry=True` to
+                   `JsonApi.request` to retry a single unsafe request anyway
+        - respect_retry_after: Honour the `Retry-After` header of the
+                               response, waiting at most `max_retry_after`
+                               seconds
+
+        Connection errors and timeouts are also retried for safe methods.
+
+        The `stats` attribute keeps count of the requests that went through
+        the policy, the retries that were performed and the requests that gave
+        up after exhausting all attempts:
+
+            >>> policy.stats
+            <<< {'requests': 120, 'retries': 7, 'gave_up': 1}
+    """
+
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+    SAFE_METHODS = ('get', 'head', 'options', 'delete', 'put')
+
+    def __init__(self, max_attempts=3, backoff_factor=0.5, max_backoff=30,
+                 jitter=True, statuses=None, methods=None,
+                 respect_retry_after=True, max_retry_after=300,
+                 sleep=None, get_now=None):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+
+        if statuses is None:
+            statuses = self.RETRY_STATUSES
+        self.statuses = set(statuses)
+
+        if methods is None:
+            methods = self.SAFE_METHODS
+        self.methods = {method.lower() for method in methods}
+
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+        # Dependency injection for sleeping and getting the current timestamp,
+        # mostly useful for testing
+        if sleep is None:
+            sleep = time.sleep
+        self.sleep = sleep
+        if get_now is None:
+            get_now = time.time
+        self.get_now = get_now
+
+        self.stats = {'requests': 0, 'retries': 0, 'gave_up': 0}
+        self._lock = threading.Lock()
+
+    def is_retryable(self, method, retry=None):
+        """ Whether requests with this method may be retried at all. `retry`
+            is the per-request override passed to `JsonApi.request`.
+        """
+
+        if retry is not None:
+            return retry
+        return method.lower() in self.methods
+
+    def should_retry(self, attempt, response=None):
+        """ Whether the outcome of the `attempt`-th (1-based) attempt warrants
+            another try. `response` is None if a connection error occurred.
+        """
+
+        if attempt >= self.max_attempts:
+            return False
+        return response is None or response.status_code in self.statuses
+
+    def get_delay(self, attempt, response=None):
+        """ Seconds to wait before the attempt following the `attempt`-th
+            one.
+        """
+
+        delay = min(self.max_backoff,
+                    self.backoff_factor * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+
+        if self.respect_retry_after and response is not None:
+            retry_after = self.parse_retry_after(
+                response.headers.get('Retry-After')
+            )
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_retry_after))
+
+        return delay
+
+    def parse_retry_after(self, value):
+        return parse_retry_after(value, self.get_now())
+
+    def record(self, retries, gave_up=False):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['retries'] += retries
+            if gave_up:
+                self.stats['gave_up'] += 1
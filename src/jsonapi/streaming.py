@@ -0,0 +1,115 @@
+from __future__ import absolute_import, unicode_literals
+
+import codecs
+import json
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _Reader(object):
+    """ Decodes JSON values one at a time from an iterable of byte chunks,
+        only keeping the part of the body that has not been consumed yet in
+        memory.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _read(self):
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            text = self._text_decoder.decode(b'', final=True)
+        else:
+            text = self._text_decoder.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+
+    def peek(self):
+        """ Skip whitespace and return the next character, or '' at the end
+            of the body
+        """
+
+        while True:
+            while (self.pos < len(self.buffer) and
+                   self.buffer[self.pos] in _WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                return ''
+            self._read()
+
+    def expect(self, *chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError("Expected {} at position {} of the streamed "
+                             "body, got {!r}".format(' or '.join(chars),
+                                                     self.pos, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self.buffer,
+                                                           self.pos)
+            except ValueError:
+                if self.eof:
+                    raise
+                end = None
+            # A number at the very end of the buffer may continue in the next
+            # chunk
+            if end is not None and (end < len(self.buffer) or self.eof):
+                self.pos = end
+                return value
+
+            # Read at least as much as we already have before trying again,
+            # so that big values are not re-parsed once per chunk
+            target = 2 * (len(self.buffer) - self.pos) or 1
+            self._read()
+            while len(self.buffer) - self.pos < target and not self.eof:
+                self._read()
+
+
+def iter_object(chunks, stream_keys=('data', 'included')):
+    """ Incrementally parse a JSON object from an iterable of byte chunks
+        (eg `response.iter_content()`) and yield its `(key, value)` pairs as
+        they are decoded. If the value of one of `stream_keys` is an array,
+        its items are yielded one by one, as `(key, item)` pairs, instead of
+        the whole array:
+
+            >>> list(iter_object([b'{"data": [{"id": "1"}, {"id"', b': "2"}],'
+            ...                   b' "links": {}}']))
+            <<< [('data', {'id': "1"}), ('data', {'id': "2"}), ('links', {})]
+
+        Only the item being decoded is held in memory, not the whole body.
+    """
+
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key in stream_keys and reader.peek() == '[':
+            reader.expect('[')
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    yield key, reader.value()
+                    if reader.expect(',', ']') == ']':
+                        break
+        else:
+            yield key, reader.value()
+        if reader.expect(',', '}') == '}':
+            return
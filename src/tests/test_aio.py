@@ -0,0 +1,309 @@
+from __future__ import absolute_import, unicode_literals
+
+import asyncio
+import json
+
+import pytest
+
+import jsonapi
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestServer  # noqa: E402
+
+from jsonapi.aio import AsyncCollection, AsyncJsonApi  # noqa: E402
+
+from .payloads import Payloads  # noqa: E402
+
+
+class ATestApi(jsonapi.JsonApi):
+    HOST = "https://example.com"
+
+
+@ATestApi.register
+class Item(jsonapi.Resource):
+    TYPE = "items"
+
+
+@ATestApi.register
+class Tag(jsonapi.Resource):
+    TYPE = "tags"
+
+
+class AsyncTestApi(AsyncJsonApi, ATestApi):
+    pass
+
+
+payloads = Payloads('items')
+
+
+def run(handlers, test, **kwargs):
+    """ Start a local server with `handlers` ({(method, path): handler}) and
+        run `test(api, calls)` against it
+    """
+
+    calls = []
+
+    async def main():
+        app = web.Application()
+        for (method, path), handler in handlers.items():
+            async def wrapped(request, handler=handler):
+                body = await request.read()
+                calls.append((request.method, request.path_qs, body,
+                              request.headers))
+                return await handler(request)
+            app.router.add_route(method, path, wrapped)
+        server = TestServer(app)
+        await server.start_server()
+        try:
+            async with AsyncTestApi(host=str(server.make_url('')),
+                                    auth="test_api_key", **kwargs) as api:
+                await test(api, calls)
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+    return calls
+
+
+def respond(payload=None, status=200):
+    async def handler(request):
+        if payload is None:
+            return web.Response(status=status)
+        return web.json_response(payload, status=status,
+                                 content_type="application/vnd.api+json")
+    return handler
+
+
+def test_registry_is_shared():
+    api = AsyncTestApi()
+    assert issubclass(api.Item, Item)
+    assert api.Item.API is api
+    assert isinstance(api.Item.list(), AsyncCollection)
+
+
+def test_get():
+    async def test(api, calls):
+        item = await api.Item.get("1")
+        assert isinstance(item, Item)
+        assert item.name == "item 1"
+
+    calls = run({('GET', '/items/1'): respond({'data': payloads[1]})}, test)
+    assert calls[0][3]['Authorization'] == "Bearer test_api_key"
+    assert calls[0][3]['Content-Type'] == "application/vnd.api+json"
+
+
+def test_iterate_all_pages():
+    async def test(api, calls):
+        names = [item.name async for item in api.Item.all()]
+        assert names == ["item {}".format(i) for i in range(1, 7)]
+
+        page = await api.Item.list()
+        assert len(page) == 3
+
+        with pytest.raises(RuntimeError):
+            len(api.Item.list())
+
+    async def list_items(request):
+        if request.query.get('page') == "2":
+            return web.json_response({'data': payloads[4:7]})
+        return web.json_response({'data': payloads[1:4],
+                                  'links': {'next': "/items?page=2"}})
+
+    calls = run({('GET', '/items'): list_items}, test)
+    assert [call[1] for call in calls] == ["/items", "/items?page=2",
+                                           "/items"]
+
+
+def test_get_with_filters_and_include():
+    async def test(api, calls):
+        item = await api.Item.get(name="item 1", include=['tag'])
+        assert item.tag.name == "tag 1"
+
+    response = {'data': [dict(payloads[1], relationships={
+        'tag': {'data': {'type': "tags", 'id': "1"}},
+    })], 'included': [{'type': "tags", 'id': "1",
+                       'attributes': {'name': "tag 1"}}]}
+    calls = run({('GET', '/items'): respond(response)}, test)
+    assert calls[0][1] in ("/items?include=tag&filter%5Bname%5D=item+1",
+                           "/items?filter%5Bname%5D=item+1&include=tag")
+
+
+def test_save_and_delete():
+    async def test(api, calls):
+        item = await api.Item.create(name="item 1")
+        assert item.id == "1"
+        item.name = "changed"
+        await item.save('name')
+        await item.delete()
+        assert item.id is None
+
+    calls = run({('POST', '/items'): respond({'data': payloads[1]}),
+                 ('PATCH', '/items/1'): respond({'data': payloads[1]}),
+                 ('DELETE', '/items/1'): respond(status=204)}, test)
+    assert json.loads(calls[0][2].decode()) == {
+        'data': {'type': "items", 'attributes': {'name': "item 1"}},
+    }
+    assert json.loads(calls[1][2].decode()) == {
+        'data': {'type': "items", 'id': "1",
+                 'attributes': {'name': "changed"}},
+    }
+    assert calls[2][0] == "DELETE"
+
+
+def test_fetch():
+    async def test(api, calls):
+        item = api.Item(id="1", relationships={
+            'tag': {'data': {'type': "tags", 'id': "1"}},
+        })
+        tag = await item.fetch('tag')
+        assert tag.name == "tag 1"
+
+    run({('GET', '/tags/1'): respond({'data': {
+        'type': "tags", 'id': "1", 'attributes': {'name': "tag 1"},
+    }})}, test)
+
+
+def test_bulk():
+    async def test(api, calls):
+        result = await api.Item.bulk_create([{'name': "item 1"},
+                                             {'name': "item 2"}])
+        assert [item.id for item in result] == ["1", "2"]
+        assert await api.Item.bulk_delete(["1", "2"]) == 2
+
+    calls = run({('POST', '/items'): respond({'data': payloads[1:3]}),
+                 ('DELETE', '/items'): respond(status=204)}, test)
+    assert (calls[0][3]['Content-Type'] ==
+            'application/vnd.api+json;profile="bulk"')
+    assert json.loads(calls[1][2].decode()) == {
+        'data': [{'type': "items", 'id': "1"}, {'type': "items", 'id': "2"}],
+    }
+
+
+def test_bulk_in_chunks():
+    async def handler(request):
+        data = (await request.json())['data']
+        if data[0]['attributes']['name'] == "item 3":
+            return web.json_response({'errors': [{'status': "400",
+                                                  'code': "invalid",
+                                                  'title': "Invalid",
+                                                  'detail': "Invalid"}]},
+                                     status=400)
+        for item in data:
+            item['id'] = item['attributes']['name'].split()[-1]
+        return web.json_response({'data': data})
+
+    async def test(api, calls):
+        with pytest.raises(jsonapi.BulkError) as exc_info:
+            await api.Item.bulk_create(
+                [{'name': "item {}".format(i)} for i in range(1, 6)],
+                chunk_size=2, concurrency=2,
+            )
+        assert [item.id for item in exc_info.value.result] == ["1", "2", "5"]
+        assert [error[:2] for error in exc_info.value.errors] == [(2, 4)]
+
+    calls = run({('POST', '/items'): handler}, test)
+    assert len(calls) == 3
+
+
+def test_errors():
+    async def test(api, calls):
+        with pytest.raises(jsonapi.JsonApiException) as exc_info:
+            await api.Item.get("1")
+        assert exc_info.value.status_code == 404
+        assert exc_info.value.code == "not_found"
+
+    run({('GET', '/items/1'): respond({'errors': [{
+        'status': "404", 'code': "not_found", 'title': "Not found",
+        'detail': "Not found",
+    }]}, status=404)}, test)
+
+
+def test_retry():
+    responses = [respond(status=503), respond({'data': payloads[1]})]
+
+    async def handler(request):
+        return await responses.pop(0)(request)
+
+    async def test(api, calls):
+        item = await api.Item.get("1")
+        assert item.id == "1"
+
+    retry = jsonapi.RetryPolicy(backoff_factor=0)
+    calls = run({('GET', '/items/1'): handler}, test, retry=retry)
+    assert len(calls) == 2
+
+
+def test_bounded_concurrency():
+    state = {'current': 0, 'max': 0}
+
+    async def handler(request):
+        state['current'] += 1
+        state['max'] = max(state['max'], state['current'])
+        await asyncio.sleep(0.01)
+        state['current'] -= 1
+        return web.json_response({'data': payloads[1]})
+
+    async def test(api, calls):
+        items = await asyncio.gather(*(api.Item.get("1")
+                                       for _ in range(10)))
+        assert len(items) == 10
+
+    run({('GET', '/items/1'): handler}, test, concurrency=3)
+    assert state['max'] == 3
+
+
+def test_coalescing():
+    async def handler(request):
+        await asyncio.sleep(0.01)
+        return web.json_response({'data': payloads[1]})
+
+    async def test(api, calls):
+        items = await asyncio.gather(*(api.Item.get("1") for _ in range(10)))
+        assert [item.name for item in items] == ["item 1"] * 10
+        # Every caller gets its own objects
+        assert items[0].attributes is not items[1].attributes
+        assert api.coalesce.stats == {'requests': 10, 'coalesced': 9}
+        assert api._in_flight == {}
+
+    calls = run({('GET', '/items/1'): handler}, test, coalesce=True)
+    assert len(calls) == 1
+
+
+def test_prefetch_related():
+    def item(i, tag_id):
+        return {'type': "items",
+                'id': str(i),
+                'relationships': {'tag': {'data': {'type': "tags",
+                                                   'id': tag_id}}}}
+
+    async def tags(request):
+        ids = request.query['filter[id]'].split(',')
+        return web.json_response({'data': [
+            {'type': "tags", 'id': id, 'attributes': {'name': "tag" + id}}
+            for id in ids
+        ]})
+
+    async def test(api, calls):
+        items = await api.Item.prefetch_related('tag')
+        assert [item.tag.name for item in items] == ["tag1", "tag2", "tag1"]
+
+    calls = run({('GET', '/items'): respond({'data': [item(1, "1"),
+                                                      item(2, "2"),
+                                                      item(3, "1")]}),
+                 ('GET', '/tags'): tags},
+                test)
+    assert [call[1] for call in calls] == ["/items",
+                                           "/tags?filter%5Bid%5D=1,2"]
+
+
+def test_iterator_not_supported():
+    async def test(api, calls):
+        with pytest.raises(TypeError):
+            api.Item.list().iterator()
+        with pytest.raises(TypeError):
+            api.stream('get', "/items")
+
+    calls = run({}, test)
+    assert calls == []
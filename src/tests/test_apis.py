@@ -1,7 +1,13 @@
 from __future__ import absolute_import, unicode_literals
 
+import json
+
+import pytest
+import responses
+
 import jsonapi
 from jsonapi.auth import ULFAuthentication
+from jsonapi.codecs import JsonCodec, get_codec
 
 from .constants import host
 
@@ -55,3 +61,97 @@ def test_setup_any_callable():
     assert test_api.make_auth_headers() == {'Authorization': "Another key2"}
     assert test_api.host == "http://some.host2"
     reset_setup()
+
+
+def test_session_reused():
+    api = ATestApi(host=host, auth="test_api_key")
+    session = api.session
+    assert api.session is session
+    api.close()
+    assert api.session is not session
+    api.close()
+
+
+def test_setup_pool():
+    api = ATestApi(host=host, auth="test_api_key")
+    session = api.session
+    api.setup(pool_connections=3, pool_maxsize=20, pool_block=True)
+    assert api.session is not session
+
+    adapter = api.session.get_adapter(host)
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 20
+    assert adapter._pool_block is True
+    api.close()
+
+
+@responses.activate
+def test_context_manager():
+    responses.add(responses.GET, "{}/globaltests/1".format(host),
+                  json={'data': {'type': "globaltests", 'id': "1"}})
+
+    with ATestApi(host=host, auth="test_api_key") as api:
+        api.GlobalTest.get("1")
+        session = api.session
+        assert api._session is not None
+    assert api._session is None
+    assert len(responses.calls) == 1
+    assert session is not None
+
+
+def test_get_codec():
+    assert isinstance(get_codec('json'), JsonCodec)
+    assert get_codec(json) is json
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+
+    try:
+        import orjson  # noqa
+    except ImportError:
+        assert type(get_codec()) is JsonCodec
+    else:
+        assert get_codec().name == 'orjson'
+
+
+class RecordingCodec(object):
+    def __init__(self):
+        self.calls = []
+
+    def dumps(self, obj):
+        self.calls.append('dumps')
+        return json.dumps(obj)  # Text is also accepted
+
+    def loads(self, content):
+        self.calls.append('loads')
+        return json.loads(content.decode('utf-8'))
+
+
+@responses.activate
+def test_custom_codec():
+    responses.add(responses.POST, "{}/globaltests".format(host),
+                  json={'data': {'type': "globaltests", 'id': "1",
+                                 'attributes': {'name': "n\u00e1me"}}},
+                  status=201)
+    responses.add(responses.GET, "{}/globaltests/2".format(host),
+                  json={'errors': [{'status': "404",
+                                    'code': "not_found",
+                                    'title': "Not found",
+                                    'detail': "Not found"}]},
+                  status=404)
+
+    codec = RecordingCodec()
+    api = ATestApi(host=host, auth="test_api_key", codec=codec)
+    assert api.codec is codec
+
+    obj = api.GlobalTest.create(name="n\u00e1me")
+    assert obj.name == "n\u00e1me"
+    request = responses.calls[0].request
+    assert isinstance(request.body, bytes)
+    assert json.loads(request.body.decode('utf-8')) == \
+        {'data': {'type': "globaltests", 'attributes': {'name': "n\u00e1me"}}}
+    assert request.headers['Content-Type'] == "application/vnd.api+json"
+
+    with pytest.raises(jsonapi.JsonApiException) as exc_info:
+        api.GlobalTest.get("2")
+    assert exc_info.value.code == "not_found"
+    assert codec.calls == ['dumps', 'loads', 'loads']
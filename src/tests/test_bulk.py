@@ -2,6 +2,7 @@ from __future__ import absolute_import, unicode_literals
 
 import json
 
+import pytest
 import responses
 
 import jsonapi
@@ -122,3 +123,79 @@ def test_bulk_update():
         assert (result[i].last_update ==
                 result[i].attributes['last_update'] ==
                 "now + {}".format(i + 1))
+
+
+def _bulk_callback(fail_on=()):
+    """ Echo the created/updated items, failing for chunks that contain any
+        of the IDs in `fail_on`
+    """
+
+    def callback(request):
+        data = json.loads(request.body.decode())['data']
+        if any(item.get('id') in fail_on for item in data):
+            return 400, {}, json.dumps({'errors': [{'status': "400",
+                                                    'code': "invalid",
+                                                    'title': "Invalid",
+                                                    'detail': "Invalid"}]})
+        for item in data:
+            item.setdefault('id', item['attributes']['name'])
+        return 200, {}, json.dumps({'data': data})
+    return callback
+
+
+@responses.activate
+def test_bulk_create_in_chunks():
+    responses.add_callback(responses.POST, "{}/bulk_items".format(host),
+                           callback=_bulk_callback())
+
+    result = test_api.BulkItem.bulk_create(
+        [{'name': str(i)} for i in range(10)], chunk_size=3, concurrency=3,
+    )
+
+    assert len(responses.calls) == 4
+    assert sorted(len(json.loads(call.request.body.decode())['data'])
+                  for call in responses.calls) == [1, 3, 3, 3]
+    assert [item.id for item in result] == [str(i) for i in range(10)]
+
+
+@responses.activate
+def test_bulk_update_chunk_errors():
+    responses.add_callback(responses.PATCH, "{}/bulk_items".format(host),
+                           callback=_bulk_callback(fail_on=("4", )))
+
+    items = [test_api.BulkItem(id=str(i), name="name {}".format(i))
+             for i in range(8)]
+    with pytest.raises(jsonapi.BulkError) as exc_info:
+        test_api.BulkItem.bulk_update(items, chunk_size=3)
+
+    error = exc_info.value
+    assert len(responses.calls) == 3
+    assert [item.id for item in error.result] == ["0", "1", "2", "6", "7"]
+    [(start, stop, chunk_error)] = error.errors
+    assert (start, stop) == (3, 6)
+    assert isinstance(chunk_error, jsonapi.JsonApiException)
+    assert chunk_error.code == "invalid"
+    assert "3-6" in str(error)
+
+
+@responses.activate
+def test_bulk_delete_chunk_errors():
+    def callback(request):
+        data = json.loads(request.body.decode())['data']
+        if data[0]['id'] == "0":
+            return 500, {}, ""
+        return 204, {}, ""
+    responses.add_callback(responses.DELETE, "{}/bulk_items".format(host),
+                           callback=callback)
+
+    api = ATestApi(host=host, auth="test_api_key")
+    # Resource classes are bound to each API connection instance, so this
+    # doesn't affect `test_api`
+    api.BulkItem.BULK_CHUNK_SIZE = 2
+    with pytest.raises(jsonapi.BulkError) as exc_info:
+        api.BulkItem.bulk_delete([str(i) for i in range(5)], concurrency=2)
+
+    assert exc_info.value.result == 3
+    assert ([(start, stop) for start, stop, _ in exc_info.value.errors] ==
+            [(0, 2)])
+    assert len(responses.calls) == 3
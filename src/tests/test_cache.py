@@ -0,0 +1,200 @@
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+import responses
+
+import jsonapi
+from jsonapi.cache import (CacheBackend, MemoryCache, ResponseCache,
+                           ValidatorStore)
+
+from .constants import host
+
+
+class ATestApi(jsonapi.JsonApi):
+    HOST = host
+
+
+@ATestApi.register
+class Foo(jsonapi.Resource):
+    TYPE = "foos"
+
+
+@ATestApi.register
+class Bar(jsonapi.Resource):
+    TYPE = "bars"
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def get_now(self):
+        return self.now
+
+
+def test_memory_cache_ttl():
+    clock = FakeClock()
+    cache = MemoryCache(get_now=clock.get_now)
+    cache.set('a', b"1", ttl=10, type="foos")
+    assert cache.get('a') == b"1"
+    clock.now += 10
+    assert cache.get('a') is None
+    assert len(cache) == 0
+
+
+def test_memory_cache_lru():
+    cache = MemoryCache(max_size=2)
+    cache.set('a', b"1", ttl=10)
+    cache.set('b', b"2", ttl=10)
+    cache.get('a')
+    cache.set('c', b"3", ttl=10)
+    assert cache.get('b') is None
+    assert cache.get('a') == b"1"
+    assert cache.get('c') == b"3"
+
+
+def test_memory_cache_invalidate():
+    cache = MemoryCache()
+    cache.set('a', b"1", ttl=10, type="foos")
+    cache.set('b', b"2", ttl=10, type="foos")
+    cache.set('c', b"3", ttl=10, type="bars")
+    cache.invalidate("foos")
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == \
+        (None, None, b"3")
+    cache.clear()
+    assert len(cache) == 0
+
+
+def _add_foo(name="foo"):
+    responses.add(responses.GET, "{}/foos/1".format(host),
+                  json={'data': {'type': "foos",
+                                 'id': "1",
+                                 'attributes': {'name': name}}})
+
+
+@responses.activate
+def test_cached_get():
+    _add_foo()
+    cache = ResponseCache(ttls={'foos': 60})
+    api = ATestApi(host=host, auth="test_api_key", cache=cache)
+
+    first = api.Foo.get("1")
+    second = api.Foo.get("1")
+    assert first.name == second.name == "foo"
+    # Responses are decoded on every hit so that they are not shared
+    assert first.attributes is not second.attributes
+    assert len(responses.calls) == 1
+    assert cache.stats == {'hits': 1, 'misses': 1, 'invalidations': 0}
+
+    # Other query parameters and auth identities have their own entries
+    api.request('get', "/foos/1", params={'include': "bar"})
+    api.setup(auth="another_key")
+    api.Foo.get("1")
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_uncached_types():
+    responses.add(responses.GET, "{}/bars/1".format(host),
+                  json={'data': {'type': "bars", 'id': "1"}})
+    api = ATestApi(host=host, auth="test_api_key",
+                   cache=ResponseCache(ttls={'foos': 60}))
+
+    api.Bar.get("1")
+    api.Bar.get("1")
+    assert len(responses.calls) == 2
+
+    # A default TTL applies to all types
+    api.setup(cache=60)
+    api.Bar.get("1")
+    api.Bar.get("1")
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_cache_invalidation():
+    _add_foo()
+    responses.add(responses.PATCH, "{}/foos/1".format(host),
+                  json={'data': {'type': "foos",
+                                 'id': "1",
+                                 'attributes': {'name': "new"}}})
+    responses.add(responses.GET, "{}/bars/1".format(host),
+                  json={'data': {'type': "bars", 'id': "1"}})
+    cache = ResponseCache(ttl=60)
+    api = ATestApi(host=host, auth="test_api_key", cache=cache)
+
+    foo = api.Foo.get("1")
+    api.Bar.get("1")
+    foo.save(name="new")
+    api.Foo.get("1")
+    api.Bar.get("1")
+
+    assert [call.request.method for call in responses.calls] == \
+        ['GET', 'GET', 'PATCH', 'GET']
+    assert cache.stats == {'hits': 1, 'misses': 3, 'invalidations': 1}
+
+
+@responses.activate
+def test_errors_are_not_cached():
+    responses.add(responses.GET, "{}/foos/1".format(host),
+                  json={'errors': [{'status': "500",
+                                    'code': "error",
+                                    'title': "Error",
+                                    'detail': "Error"}]},
+                  status=500)
+    api = ATestApi(host=host, auth="test_api_key", cache=60)
+
+    for _ in range(2):
+        try:
+            api.Foo.get("1")
+        except jsonapi.JsonApiException:
+            pass
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_conditional_requests():
+    body = {'data': {'type': "foos", 'id': "1", 'attributes': {'name': "foo"}}}
+    responses.add(responses.GET, "{}/foos/1".format(host), json=body,
+                  headers={'ETag': '"v1"',
+                           'Last-Modified': "Wed, 21 Oct 2015 07:28:00 GMT"})
+    responses.add(responses.GET, "{}/foos/1".format(host), status=304)
+    responses.add(responses.GET, "{}/foos/1".format(host),
+                  json={'data': {'type': "foos",
+                                 'id': "1",
+                                 'attributes': {'name': "new"}}},
+                  headers={'ETag': '"v2"'})
+
+    store = ValidatorStore()
+    api = ATestApi(host=host, auth="test_api_key", conditional=store)
+
+    foo = api.Foo.get("1")
+    assert 'If-None-Match' not in responses.calls[0].request.headers
+
+    foo.name = "local change"
+    foo.reload()
+    request = responses.calls[1].request
+    assert request.headers['If-None-Match'] == '"v1"'
+    assert (request.headers['If-Modified-Since'] ==
+            "Wed, 21 Oct 2015 07:28:00 GMT")
+    assert foo.name == "foo"
+
+    foo.reload()
+    assert responses.calls[2].request.headers['If-None-Match'] == '"v1"'
+    assert foo.name == "new"
+
+    assert store.stats['not_modified'] == 1
+    assert store.stats['modified'] == 1
+    assert store.stats['bytes_saved'] > 0
+
+    api.setup(conditional=False)
+    assert api.conditional is None
+
+
+def test_cache_backend_is_abstract():
+    class IncompleteBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteBackend()
@@ -0,0 +1,111 @@
+from __future__ import absolute_import, unicode_literals
+
+import json
+import threading
+import time
+
+import pytest
+import responses
+
+import jsonapi
+from jsonapi.coalescing import RequestCoalescer
+
+from .constants import host
+
+
+class ATestApi(jsonapi.JsonApi):
+    HOST = host
+
+
+@ATestApi.register
+class Foo(jsonapi.Resource):
+    TYPE = "foos"
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.001)
+
+
+def _run_concurrently(func, count):
+    results = [None] * count
+
+    def target(i):
+        try:
+            results[i] = func()
+        except Exception as exc:
+            results[i] = exc
+
+    threads = [threading.Thread(target=target, args=(i, ))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+@responses.activate
+def test_coalesce_concurrent_gets():
+    release = threading.Event()
+
+    def callback(request):
+        release.wait(5)
+        return 200, {}, json.dumps({'data': {'type': "foos",
+                                             'id': "1",
+                                             'attributes': {'name': "foo"}}})
+    responses.add_callback(responses.GET, "{}/foos/1".format(host),
+                           callback=callback)
+
+    coalescer = RequestCoalescer()
+    api = ATestApi(host=host, auth="test_api_key", coalesce=coalescer)
+
+    threads, results = _run_concurrently(lambda: api.Foo.get("1"), 5)
+    # Let the first request through once all of them are waiting for it
+    _wait_for(lambda: coalescer.stats['requests'] == 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses.calls) == 1
+    assert [foo.name for foo in results] == ["foo"] * 5
+    assert len({id(foo.attributes) for foo in results}) == 5
+    assert coalescer.stats == {'requests': 5, 'coalesced': 4}
+
+    # Once the request is done, the next one is sent normally
+    api.Foo.get("1")
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_coalesce_errors():
+    release = threading.Event()
+
+    def callback(request):
+        release.wait(5)
+        return 404, {}, json.dumps({'errors': [{'status': "404",
+                                                'code': "not_found",
+                                                'title': "Not found",
+                                                'detail': "Not found"}]})
+    responses.add_callback(responses.GET, "{}/foos/1".format(host),
+                           callback=callback)
+
+    api = ATestApi(host=host, auth="test_api_key", coalesce=True)
+    threads, results = _run_concurrently(lambda: api.Foo.get("1"), 3)
+    _wait_for(lambda: api.coalesce.stats['requests'] == 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses.calls) == 1
+    assert all(isinstance(result, jsonapi.JsonApiException)
+               for result in results)
+
+
+def test_coalescer_does_not_share_different_keys():
+    coalescer = RequestCoalescer()
+    assert coalescer.do('a', lambda: 1) == 1
+    assert coalescer.do('b', lambda: 2) == 2
+    with pytest.raises(ValueError):
+        coalescer.do('a', lambda: int("x"))
+    assert coalescer.stats == {'requests': 3, 'coalesced': 0}
@@ -1,5 +1,9 @@
 from __future__ import absolute_import, unicode_literals
 
+import json
+import threading
+
+import pytest
 import responses
 
 import jsonapi
@@ -62,6 +66,25 @@ def test_from_data():
     assert list(collection) == list(collection.all())
 
 
+def test_lazy_hydration():
+    from jsonapi.collections import _Raw
+
+    collection = Collection.from_data(test_api, {'data': payloads[1:4]})
+    assert len(collection) == 3
+    assert all(isinstance(item, _Raw) for item in collection._data)
+
+    assert collection[1].name == "item 2"
+    assert collection[1] is collection[1]
+    assert [isinstance(item, _Raw) for item in collection._data] == \
+        [True, False, True]
+
+    assert [item.id for item in collection[:2]] == ["1", "2"]
+    assert isinstance(collection._data[2], _Raw)
+
+    collection.data
+    assert all(isinstance(item, Item) for item in collection._data)
+
+
 @responses.activate
 def test_pagination():
     responses.add(responses.GET, "{}/items?page=2".format(host),
@@ -181,3 +204,391 @@ def test_include():
     item1, item2 = test_api.Item.list()
     assert item1.tag.name == "tag1"
     assert item2.tag.name == "tag2"
+
+
+def _paginated_callback(pages, on_request=None):
+    """ Serve `pages` lists of payloads, linking them with 'next' links """
+
+    def callback(request):
+        page = int(request.params.get('page', 1))
+        if on_request is not None:
+            on_request(page)
+        body = {'data': pages[page - 1]}
+        if page < len(pages):
+            body['links'] = {'next': "/items?page={}".format(page + 1)}
+        return 200, {}, json.dumps(body)
+    return callback
+
+
+@responses.activate
+def test_all_with_prefetch():
+    pages = [payloads[1:4], payloads[4:7], payloads[7:10], payloads[10:12]]
+    second_page_requested = threading.Event()
+
+    def on_request(page):
+        if page == 2:
+            second_page_requested.set()
+
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=_paginated_callback(pages, on_request))
+
+    result = []
+    for item in test_api.Item.all(prefetch=2):
+        if item.id == "1":
+            # The next page is being fetched while we process this one
+            assert second_page_requested.wait(5)
+        result.append(item.id)
+
+    assert result == [str(i) for i in range(1, 12)]
+    assert len(responses.calls) == 4
+
+
+@responses.activate
+def test_all_pages_with_prefetch_max_items():
+    pages = [payloads[1:4], payloads[4:7], payloads[7:10], payloads[10:12]]
+    requested = []
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=_paginated_callback(pages,
+                                                        requested.append))
+
+    iterator = test_api.Item.all_pages(prefetch=3, prefetch_max_items=3)
+    next(iterator)
+    next(iterator)
+    # The buffered third page (3 items) blocks the fourth one
+    for _ in range(100):
+        if len(requested) >= 3:
+            break
+        threading.Event().wait(0.01)
+    assert requested == [1, 2, 3]
+    assert [len(page) for page in iterator] == [3, 2]
+    assert requested == [1, 2, 3, 4]
+
+
+@responses.activate
+def test_all_with_prefetch_error():
+    responses.add(responses.GET, "{}/items".format(host),
+                  json={'data': payloads[1:4],
+                        'links': {'next': "/items?page=2"}},
+                  match_querystring=True)
+    responses.add(responses.GET, "{}/items?page=2".format(host), status=500,
+                  match_querystring=True)
+
+    result = []
+    with pytest.raises(Exception):
+        for item in test_api.Item.all(prefetch=1):
+            result.append(item.id)
+    assert result == ["1", "2", "3"]
+
+
+def _numbered_callback(pages, last_link=True, state=None):
+    """ Serve `pages` using 'page[number]' pagination """
+
+    lock = threading.Lock()
+
+    def callback(request):
+        number = int(request.params.get('page[number]', 1))
+        if state is not None:
+            with lock:
+                state['current'] += 1
+                state['max'] = max(state['max'], state['current'])
+            threading.Event().wait(0.02)
+            with lock:
+                state['current'] -= 1
+        body = {'data': pages[number - 1], 'links': {}}
+        if number < len(pages):
+            body['links']['next'] = "/items?page[number]={}".format(number + 1)
+        if last_link:
+            body['links']['last'] = "/items?page[number]={}".format(len(pages))
+        else:
+            body['meta'] = {'count': sum(len(page) for page in pages)}
+        return 200, {}, json.dumps(body)
+    return callback
+
+
+@responses.activate
+def test_all_parallel_with_last_link():
+    pages = [payloads[i:i + 2] for i in range(1, 11, 2)]
+    state = {'current': 0, 'max': 0}
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=_numbered_callback(pages, state=state))
+
+    result = [item.id for item in test_api.Item.all(parallel=3)]
+
+    assert result == [str(i) for i in range(1, 11)]
+    assert len(responses.calls) == 5
+    assert 1 < state['max'] <= 3
+
+
+@responses.activate
+def test_all_parallel_with_meta_count_unordered():
+    pages = [payloads[i:i + 2] for i in range(1, 11, 2)]
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=_numbered_callback(pages,
+                                                       last_link=False))
+
+    result = [item.id for item in
+              test_api.Item.page(size=2).all(parallel=4, ordered=False)]
+
+    assert sorted(result, key=int) == [str(i) for i in range(1, 11)]
+    assert len(responses.calls) == 5
+    assert all('page%5Bsize%5D=2' in call.request.url
+               for call in responses.calls)
+
+
+@responses.activate
+def test_all_parallel_falls_back_to_following_links():
+    pages = [payloads[1:4], payloads[4:7], payloads[7:10]]
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=_paginated_callback(pages))
+
+    result = [item.id for item in test_api.Item.all(parallel=2)]
+    assert result == [str(i) for i in range(1, 10)]
+
+
+@responses.activate
+def test_all_parallel_with_meta_count_and_cursor_links():
+    pages = {None: (payloads[1:3], "abc"),
+             "abc": (payloads[3:5], "def"),
+             "def": (payloads[5:7], None)}
+
+    def callback(request):
+        data, next_cursor = pages[request.params.get('page[cursor]')]
+        body = {'data': data, 'meta': {'count': 6}, 'links': {}}
+        if next_cursor:
+            body['links']['next'] = "/items?page[cursor]={}".format(
+                next_cursor
+            )
+        return 200, {}, json.dumps(body)
+
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=callback)
+
+    result = [item.id for item in test_api.Item.all(parallel=2)]
+
+    assert result == [str(i) for i in range(1, 7)]
+    assert not any('page%5Bnumber%5D' in call.request.url
+                   for call in responses.calls)
+
+
+@responses.activate
+def test_identity_map():
+    responses.add(responses.GET, "{}/items".format(host), json={
+        'data': [{'type': "items",
+                  'id': str(i),
+                  'relationships': {'tag': {'data': {'type': "tags",
+                                                     'id': "1"}}}}
+                 for i in range(1, 4)],
+        'included': [{'type': "tags",
+                      'id': "1",
+                      'attributes': {'name': "tag1"}}],
+    })
+
+    item1, item2, item3 = test_api.Item.list()
+    assert item1.tag == item2.tag
+    assert item1.tag is not item2.tag
+
+    with test_api.identity_map() as identity_map:
+        item1, item2, item3 = test_api.Item.list()
+        with test_api.identity_map():
+            # Nested uses share the outer map
+            item4 = test_api.Item.list()[0]
+        assert item1.tag is item2.tag is item3.tag is item4.tag
+        assert item1.tag.name == "tag1"
+        assert list(identity_map.keys()) == [("tags", "1")]
+
+    assert test_api._identity_map is None
+    item1 = test_api.Item.list()[0]
+    assert item1.tag is not item2.tag
+
+
+@responses.activate
+def test_identity_map_is_per_thread():
+    def callback(request):
+        body = {'data': [{'type': "items",
+                          'id': str(i),
+                          'relationships': {'tag': {'data': {'type': "tags",
+                                                             'id': "1"}}}}
+                         for i in range(1, 3)],
+                'included': [{'type': "tags", 'id': "1"}],
+                'links': {}}
+        if 'page' not in request.params:
+            body['links']['next'] = "/items?page=2"
+        return 200, {}, json.dumps(body)
+
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=callback)
+    entered, done = threading.Event(), threading.Event()
+    result = {}
+
+    def other_thread():
+        entered.wait(5)
+        try:
+            result['active'] = test_api._identity_map is not None
+            item1, item2 = test_api.Item.list()
+            result['shared'] = item1.tag is item2.tag
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    with test_api.identity_map():
+        entered.set()
+        done.wait(5)
+        # Pages fetched by a background thread use the caller's map
+        items = list(test_api.Item.all(prefetch=1))
+    thread.join()
+
+    assert result == {'active': False, 'shared': False}
+    assert len(items) == 4
+    assert all(item.tag is items[0].tag for item in items)
+
+
+@responses.activate
+def test_compact():
+    responses.add(
+        responses.GET, "{}/items".format(host),
+        json={'data': [dict(payload,
+                            relationships={'tag': {'data': {'type': "tags",
+                                                            'id': "1"}}})
+                       for payload in payloads[1:4]],
+              'links': {'next': "/items?page=2"}},
+        match_querystring=True,
+    )
+    responses.add(responses.GET,
+                  "{}/items?filter[name]=x&page=2".format(host),
+                  json={'data': payloads[4:5]},
+                  match_querystring=True)
+    responses.add(responses.GET, "{}/items?filter[name]=x".format(host),
+                  json={'data': payloads[1:2],
+                        'links': {'next': "/items?page=2"}},
+                  match_querystring=True)
+
+    first, second, third = test_api.Item.compact()
+    assert isinstance(first, jsonapi.Record)
+    assert first.id == "1"
+    assert first.name == "item 1"
+    assert first.tag == {'type': "tags", 'id': "1"}
+    assert first.attributes == {'name': "item 1"}
+    assert first.relationships == {'tag': {'data': {'type': "tags",
+                                                    'id': "1"}}}
+    assert first == {'type': "items", 'id': "1"}
+    # Records with the same fields share their field names
+    assert first._shape is second._shape
+
+    with pytest.raises(AttributeError):
+        first.missing
+    with pytest.raises(AttributeError):
+        first.name = "something else"
+
+    item = first.to_resource()
+    assert isinstance(item, Item)
+    assert item.name == "item 1"
+    assert item.tag == test_api.Tag(id="1")
+
+    # The compact flag survives filtering and pagination
+    records = list(test_api.Item.compact().filter(name="x").all())
+    assert [record.id for record in records] == ["1", "4"]
+    assert all(isinstance(record, jsonapi.Record) for record in records)
+
+
+@responses.activate
+def test_compact_relationship_links():
+    links = {'related': "/items/1/tag"}
+    responses.add(responses.GET, "{}/items".format(host), json={'data': [
+        {'type': "items", 'id': "1",
+         'relationships': {'tag': {'links': links}}},
+        {'type': "items", 'id': "2",
+         'relationships': {'tag': {'data': None}}},
+    ]})
+
+    first, second = test_api.Item.compact()
+
+    # Not included vs empty
+    with pytest.raises(AttributeError):
+        first.tag
+    assert first.relationships == {'tag': {'links': links}}
+    assert first.to_resource().relationships['tag'] == {'links': links}
+    assert second.tag is None
+    assert second.relationships == {'tag': None}
+
+
+def test_compact_memory():
+    tracemalloc = pytest.importorskip('tracemalloc')
+
+    def measure(compact):
+        tracemalloc.start()
+        try:
+            response_body = {'data': [
+                {'type': "items",
+                 'id': str(i),
+                 'attributes': {'name': "item {}".format(i),
+                                'description': None,
+                                'count': i},
+                 'relationships': {'tag': {'data': {'type': "tags",
+                                                    'id': "1"}}}}
+                for i in range(2000)
+            ]}
+            collection = Collection(test_api, '/items')
+            collection._compact = compact
+            collection._evaluate(response_body)
+            del response_body
+            collection.data  # Hydrate all items
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    assert measure(compact=True) * 2 < measure(compact=False)
+
+
+@responses.activate
+def test_iterator():
+    responses.add(responses.GET, "{}/items".format(host),
+                  json={'data': payloads[1:4],
+                        'links': {'next': "/items?page=2"}},
+                  match_querystring=True)
+    responses.add(responses.GET, "{}/items?page=2".format(host),
+                  json={'data': payloads[4:6], 'links': {'next': None}},
+                  match_querystring=True)
+
+    items = list(test_api.Item.iterator(chunk_size=16))
+    assert [item.id for item in items] == ["1", "2", "3", "4", "5"]
+    assert all(isinstance(item, Item) for item in items)
+    assert items[1].name == "item 2"
+
+    # Already evaluated pages are not fetched again
+    collection = test_api.Item.list()
+    list(collection)
+    assert len(list(collection.iterator())) == 5
+    assert len(responses.calls) == 4
+
+
+@responses.activate
+def test_iterator_with_included_after_data():
+    def callback(request):
+        # The order of the keys is preserved
+        body = ('{"data": ' + json.dumps([
+            {'type': "items",
+             'id': str(i),
+             'relationships': {'tag': {'data': {'type': "tags", 'id': "1"}}}}
+            for i in range(1, 4)
+        ]) + ', "included": [{"type": "tags", "id": "1", '
+             '"attributes": {"name": "tag1"}}]}')
+        return 200, {}, body
+    responses.add_callback(responses.GET, "{}/items".format(host),
+                           callback=callback)
+
+    items = list(test_api.Item.include('tag').iterator(chunk_size=10))
+    assert [item.tag.name for item in items] == ["tag1"] * 3
+
+
+@responses.activate
+def test_iterator_error():
+    responses.add(responses.GET, "{}/items".format(host),
+                  json={'errors': [{'status': "404",
+                                    'code': "not_found",
+                                    'title': "Not found",
+                                    'detail': "Not found"}]},
+                  status=404)
+
+    with pytest.raises(jsonapi.JsonApiException):
+        list(test_api.Item.iterator())
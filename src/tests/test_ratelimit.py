@@ -0,0 +1,142 @@
+from __future__ import absolute_import, unicode_literals
+
+import threading
+
+import responses
+
+import jsonapi
+
+from .constants import host
+
+
+class ATestApi(jsonapi.JsonApi):
+    HOST = host
+
+
+@ATestApi.register
+class Foo(jsonapi.Resource):
+    TYPE = "foos"
+
+
+SIMPLE_PAYLOAD = {'type': "foos", 'id': "1", 'attributes': {'hello': "world"}}
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def get_now(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_limiter(**kwargs):
+    clock = FakeClock()
+    limiter = jsonapi.RateLimiter(sleep=clock.sleep, get_now=clock.get_now,
+                                  **kwargs)
+    return limiter, clock
+
+
+def test_burst_then_rate():
+    limiter, clock = make_limiter(rate=2, burst=3)
+    for _ in range(3):
+        assert limiter.acquire() == 0
+    assert limiter.acquire() == 0.5
+    assert limiter.acquire() == 0.5
+    assert clock.sleeps == [0.5, 0.5]
+
+
+def test_throttled_slows_down_and_recovers():
+    limiter, clock = make_limiter(rate=10, burst=1, increase=1)
+    limiter.acquire()
+    limiter.throttled()
+    assert limiter.rate == 5
+
+    clock.now += limiter.cooldown
+    limiter.throttled(retry_after=2)
+    assert limiter.rate == 2.5
+    # Holds back requests for the 'Retry-After' period
+    assert limiter.acquire() >= 2
+
+    for _ in range(20):
+        limiter.succeeded()
+    assert limiter.rate == limiter.max_rate == 10
+
+
+def test_min_rate():
+    limiter, clock = make_limiter(rate=10, min_rate=4)
+    for _ in range(5):
+        limiter.throttled()
+        clock.now += limiter.cooldown
+    assert limiter.rate == 4
+
+
+def test_concurrent_throttles_decrease_once():
+    limiter, clock = make_limiter(rate=10, cooldown=1)
+    threads = [threading.Thread(target=limiter.throttled, args=(1, ))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert limiter.rate == 5
+    # Held back for 'Retry-After' once, not once per rejection
+    assert limiter.tokens == -5
+
+    # The next window can decrease the rate again
+    clock.now += 1
+    limiter.throttled()
+    assert limiter.rate == 2.5
+
+
+def test_threads_share_budget():
+    limiter, clock = make_limiter(rate=100, burst=10)
+    lock = threading.Lock()
+    delays = []
+
+    def worker():
+        for _ in range(10):
+            delay = limiter.acquire()
+            with lock:
+                delays.append(delay)
+
+    threads = [threading.Thread(target=worker) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(delays) == 50
+    assert len([delay for delay in delays if delay == 0]) >= 10
+    assert limiter.tokens <= 0
+
+
+@responses.activate
+def test_api_rate_limit():
+    url = "{}/foos/1".format(host)
+    responses.add(responses.GET, url, status=429,
+                  headers={'Retry-After': "1"})
+    responses.add(responses.GET, url, json={'data': SIMPLE_PAYLOAD})
+
+    limiter, clock = make_limiter(rate=10)
+    retry = jsonapi.RetryPolicy(sleep=lambda seconds: None)
+    test_api = ATestApi(host=host, auth="test_api_key", rate_limit=limiter,
+                        retry=retry)
+
+    # Shared by all resource classes bound to the API connection instance
+    assert test_api.Foo.API.rate_limit is limiter
+
+    assert test_api.Foo.get("1").hello == "world"
+    assert len(responses.calls) == 2
+    assert limiter.rate == 5 + limiter.increase
+
+
+def test_setup_rate_limit_with_number():
+    test_api = ATestApi(host=host, auth="test_api_key", rate_limit=5)
+    assert isinstance(test_api.rate_limit, jsonapi.RateLimiter)
+    assert test_api.rate_limit.rate == 5
@@ -120,6 +120,65 @@ def test_fetch_plural():
     assert len(list(parent.children.all())) == 6
 
 
+def _child_of(i, parent_id):
+    return {'type': "children",
+            'id': str(i),
+            'relationships': {'parent': {'data': {'type': "parents",
+                                                  'id': parent_id}}}}
+
+
+def _parents_callback(request):
+    ids = request.params['filter[id]'].split(',')
+    # The server doesn't know about parent "4"
+    return 200, {}, json.dumps({'data': [parent_payloads[int(id)]
+                                         for id in ids if id != "4"]})
+
+
+@responses.activate
+def test_fetch_many():
+    responses.add_callback(responses.GET, "{}/parents".format(host),
+                           callback=_parents_callback)
+    responses.add(responses.GET, "{}/parents/4".format(host),
+                  json={'data': parent_payloads[4]})
+
+    children = [test_api.Child(_child_of(i, parent_id))
+                for i, parent_id in enumerate(["1", "2", "2", "3", "4"])]
+    test_api.fetch_many(children, 'parent', batch_size=2)
+
+    assert [call.request.url.split('?')[0] for call in responses.calls] == \
+        ["{}/parents".format(host)] * 2 + ["{}/parents/4".format(host)]
+    assert [call.request.params.get('filter[id]')
+            for call in responses.calls] == ["1,2", "3,4", None]
+    assert [child.parent.name for child in children] == \
+        ["parent 1", "parent 2", "parent 2", "parent 3", "parent 4"]
+    # Each child has its own related object
+    assert children[1].parent is not children[2].parent
+    assert children[1].parent.attributes is not children[2].parent.attributes
+
+    # Already fetched
+    test_api.fetch_many(children, 'parent')
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_prefetch_related():
+    responses.add(responses.GET, "{}/children".format(host),
+                  json={'data': [_child_of(1, "1"), _child_of(2, "2")],
+                        'links': {'next': "/children?page=2"}},
+                  match_querystring=True)
+    responses.add(responses.GET, "{}/children?page=2".format(host),
+                  json={'data': [_child_of(3, "1")]},
+                  match_querystring=True)
+    responses.add_callback(responses.GET, "{}/parents".format(host),
+                           callback=_parents_callback)
+
+    children = list(test_api.Child.prefetch_related('parent').all())
+    assert len(responses.calls) == 4
+    assert [child.parent.name for child in children] == \
+        ["parent 1", "parent 2", "parent 1"]
+    assert len(responses.calls) == 4
+
+
 @responses.activate
 def test_change_parent_with_save():
     response_body = deepcopy(child_payloads[1])
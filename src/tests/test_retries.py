@@ -0,0 +1,120 @@
+from __future__ import absolute_import, unicode_literals
+
+import pytest
+import requests
+import responses
+
+import jsonapi
+
+from .constants import host
+
+
+class ATestApi(jsonapi.JsonApi):
+    HOST = host
+
+
+@ATestApi.register
+class Foo(jsonapi.Resource):
+    TYPE = "foos"
+
+
+SIMPLE_PAYLOAD = {'type': "foos", 'id': "1", 'attributes': {'hello': "world"}}
+ERRORS = [{'status': "503", 'code': "unavailable", 'title': "Unavailable",
+           'detail': "Try again later"}]
+
+
+def make_api(**kwargs):
+    sleeps = []
+    policy = jsonapi.RetryPolicy(sleep=sleeps.append, jitter=False, **kwargs)
+    return ATestApi(host=host, auth="test_api_key", retry=policy), sleeps
+
+
+@responses.activate
+def test_retry_then_succeed():
+    url = "{}/foos/1".format(host)
+    responses.add(responses.GET, url, status=503, json={'errors': ERRORS})
+    responses.add(responses.GET, url, status=502)
+    responses.add(responses.GET, url, json={'data': SIMPLE_PAYLOAD})
+
+    test_api, sleeps = make_api(backoff_factor=1)
+    foo = test_api.Foo.get("1")
+
+    assert foo.hello == "world"
+    assert len(responses.calls) == 3
+    assert sleeps == [1, 2]
+    assert test_api.retry.stats == {'requests': 1, 'retries': 2,
+                                    'gave_up': 0}
+
+
+@responses.activate
+def test_retry_gives_up():
+    url = "{}/foos/1".format(host)
+    for _ in range(3):
+        responses.add(responses.GET, url, status=503, json={'errors': ERRORS})
+
+    test_api, sleeps = make_api()
+    with pytest.raises(jsonapi.JsonApiException) as exc_info:
+        test_api.Foo.get("1")
+
+    assert exc_info.value.status_code == 503
+    assert exc_info.value.retries == 2
+    assert len(responses.calls) == 3
+    assert test_api.retry.stats == {'requests': 1, 'retries': 2,
+                                    'gave_up': 1}
+
+
+@responses.activate
+def test_retry_after():
+    url = "{}/foos/1".format(host)
+    responses.add(responses.GET, url, status=429,
+                  headers={'Retry-After': "7"})
+    responses.add(responses.GET, url, json={'data': SIMPLE_PAYLOAD})
+
+    test_api, sleeps = make_api()
+    test_api.Foo.get("1")
+
+    assert sleeps == [7]
+
+
+def test_retry_after_date():
+    policy = jsonapi.RetryPolicy(get_now=lambda: 784111767)
+    assert (policy.parse_retry_after("Sun, 06 Nov 1994 08:49:37 GMT") ==
+            10)
+    assert policy.parse_retry_after("garbage") is None
+
+
+@responses.activate
+def test_no_retry_for_unsafe_methods():
+    url = "{}/foos".format(host)
+    responses.add(responses.POST, url, status=503)
+    responses.add(responses.POST, url, json={'data': SIMPLE_PAYLOAD})
+
+    test_api, sleeps = make_api()
+    with pytest.raises(requests.HTTPError) as exc_info:
+        test_api.Foo.create(hello="world")
+    assert exc_info.value.retries == 0
+    assert len(responses.calls) == 1
+
+    # Unless explicitly asked to
+    foo = test_api.new(test_api.request('post', "/foos", retry=True,
+                                        json={'data': {'type': "foos"}}))
+    assert foo.id == "1"
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_retry_connection_error():
+    url = "{}/foos/1".format(host)
+    responses.add(responses.GET, url,
+                  body=requests.ConnectionError("connection reset"))
+    responses.add(responses.GET, url, json={'data': SIMPLE_PAYLOAD})
+
+    test_api, sleeps = make_api()
+    assert test_api.Foo.get("1").hello == "world"
+    assert len(sleeps) == 1
+
+
+def test_setup_retry_with_integer():
+    test_api = ATestApi(host=host, auth="test_api_key", retry=5)
+    assert isinstance(test_api.retry, jsonapi.RetryPolicy)
+    assert test_api.retry.max_attempts == 5
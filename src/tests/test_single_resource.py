@@ -3,6 +3,7 @@ from __future__ import absolute_import, unicode_literals
 import json
 from copy import deepcopy
 
+import pytest
 import responses
 
 import jsonapi
@@ -254,3 +255,38 @@ def test_as_resource_identifier():
 def test_as_relationship():
     foo = test_api.Foo(SIMPLE_PAYLOAD)
     assert foo.as_relationship() == {'data': {'type': "foos", 'id': "1"}}
+
+
+def test_from_response_takes_ownership():
+    payload = deepcopy(SIMPLE_PAYLOAD)
+    foo = test_api.Foo.from_response(payload)
+    make_simple_assertions(foo)
+    assert foo.attributes is payload['attributes']
+
+    foo = test_api.from_response(deepcopy(SIMPLE_PAYLOAD))
+    make_simple_assertions(foo)
+
+
+def test_init_copies():
+    payload = deepcopy(SIMPLE_PAYLOAD)
+    foo = test_api.Foo(payload)
+    assert foo.attributes == payload['attributes']
+    assert foo.attributes is not payload['attributes']
+
+    payload['attributes']['hello'] = "WORLD"
+    assert foo.hello == "world"
+
+
+def test_from_response_with_relationships():
+    payload = deepcopy(SIMPLE_PAYLOAD)
+    payload['relationships'] = {'sibling': {'data': {'type': "foos",
+                                                     'id': "2"}}}
+    foo = test_api.Foo.from_response(
+        payload,
+        included=[{'type': "foos", 'id': "2", 'attributes': {'hello': "2"}}],
+    )
+    assert foo.relationships['sibling'] is payload['relationships']['sibling']
+    assert foo.sibling.hello == "2"
+
+    with pytest.raises(ValueError):
+        test_api.Foo.from_response({'type': "bars", 'id': "1"})
@@ -0,0 +1,54 @@
+from __future__ import absolute_import, unicode_literals
+
+import json
+
+import pytest
+
+from jsonapi.streaming import iter_object
+
+
+def _chunked(body, size):
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 100000])
+def test_iter_object(chunk_size):
+    body = {'data': [{'type': "items",
+                      'id': str(i),
+                      'attributes': {'name': "\u00edtem {}".format(i),
+                                     'weight': i * 1.5,
+                                     'count': i * 1000}}
+                     for i in range(20)],
+            'included': [{'type': "tags", 'id': "1"}],
+            'links': {'next': None},
+            'meta': {'count': 12345}}
+    chunks = _chunked(json.dumps(body).encode('utf-8'), chunk_size)
+
+    assert list(iter_object(chunks)) == (
+        [('data', item) for item in body['data']] +
+        [('included', {'type': "tags", 'id': "1"}),
+         ('links', {'next': None}),
+         ('meta', {'count': 12345})]
+    )
+
+
+def test_iter_object_non_array_and_empty_values():
+    chunks = [b'{"data": {"id": "1"}, "included": [], "links": {}}']
+    assert list(iter_object(chunks)) == [('data', {'id': "1"}),
+                                         ('links', {})]
+    assert list(iter_object([b' { } '])) == []
+
+
+def test_iter_object_stream_keys():
+    chunks = [b'{"data": [1, 2], "errors": [3, 4]}']
+    assert list(iter_object(chunks, stream_keys=('errors', ))) == \
+        [('data', [1, 2]), ('errors', 3), ('errors', 4)]
+
+
+def test_iter_object_invalid():
+    with pytest.raises(ValueError):
+        list(iter_object([b'[1, 2]']))
+    with pytest.raises(ValueError):
+        list(iter_object([b'{"data": [1, 2}']))
+    with pytest.raises(ValueError):
+        list(iter_object([b'{"data": [{"id": ']))
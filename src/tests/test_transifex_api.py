@@ -0,0 +1,889 @@
+from __future__ import absolute_import, unicode_literals
+
+import email
+import hashlib
+import io
+import json
+import mmap
+import re
+import time
+
+import pytest
+import requests
+import responses
+import six
+
+import jsonapi
+from jsonapi.exceptions import JsonApiException
+from transifex_api import TransifexApi, downloads, manifests, uploads
+from transifex_api.mirror import StringMirror
+from transifex_api.jobs import (PENDING, JobPoller, Pending, PollingStrategy,
+                                PollingTimeout)
+
+from .constants import host
+from .payloads import Payloads
+
+resource_strings = Payloads('resource_strings')
+
+
+def _make_api():
+    return TransifexApi(host=host, auth="test_api_key")
+
+
+def _add_string_pages(count, per_page):
+    url = "{}/resource_strings".format(host)
+    for start in range(1, count + 1, per_page):
+        stop = min(start + per_page, count + 1)
+        body = {'data': resource_strings[start:stop], 'links': {}}
+        if stop <= count:
+            body['links']['next'] = "{}?page[cursor]={}".format(url, stop)
+        responses.add(responses.GET, url, json=body)
+    # Listed again after everything is deleted
+    responses.add(responses.GET, url, json={'data': [], 'links': {}})
+
+
+@responses.activate
+def test_purge():
+    api = _make_api()
+    _add_string_pages(5, 2)
+    responses.add(responses.DELETE, "{}/resource_strings".format(host))
+    progress = []
+
+    resource = api.Resource(id="o:org:p:proj:r:res")
+    count = resource.purge(concurrency=2,
+                           progress=lambda *args: progress.append(args))
+
+    assert count == 5
+    gets = [call for call in responses.calls
+            if call.request.method == "GET"]
+    assert len(gets) == 4
+    assert gets[0].request.params == {
+        'filter[resource]': "o:org:p:proj:r:res",
+        'fields[resource_strings]': "key",
+    }
+    deleted = sorted(
+        item['id']
+        for call in responses.calls if call.request.method == "DELETE"
+        for item in json.loads(call.request.body)['data']
+    )
+    assert deleted == ["1", "2", "3", "4", "5"]
+    assert sorted(deleted for deleted, _ in progress) == [2, 4, 5]
+
+
+@responses.activate
+def test_purge_keeps_going_after_errors():
+    api = _make_api()
+    _add_string_pages(4, 2)
+    responses.add(responses.DELETE, "{}/resource_strings".format(host),
+                  status=500, json={'errors': [{'status': "500"}]})
+    responses.add(responses.DELETE, "{}/resource_strings".format(host))
+
+    resource = api.Resource(id="o:org:p:proj:r:res")
+    with pytest.raises(jsonapi.BulkError) as exc_info:
+        resource.purge(concurrency=1)
+
+    assert exc_info.value.result == 2
+    [(start, stop, exc)] = exc_info.value.errors
+    assert (start, stop) == (0, 2)
+    assert exc.response.status_code == 500
+
+
+@responses.activate
+def test_purge_with_offset_pagination():
+    url = "{}/resource_strings".format(host)
+    ids = [str(i) for i in range(1, 8)]
+
+    def list_strings(request):
+        offset = int(request.params.get('page[offset]', 0))
+        body = {'data': [{'type': "resource_strings", 'id': id}
+                         for id in ids[offset:offset + 2]],
+                'links': {}}
+        if offset + 2 < len(ids):
+            body['links']['next'] = "{}?page[offset]={}".format(
+                url, offset + 2,
+            )
+        return (200, {}, json.dumps(body))
+
+    def delete_strings(request):
+        for item in json.loads(request.body)['data']:
+            ids.remove(item['id'])
+        return (204, {}, "")
+
+    responses.add_callback(responses.GET, url, callback=list_strings)
+    responses.add_callback(responses.DELETE, url, callback=delete_strings)
+
+    count = _make_api().Resource(id="o:o:p:p:r:r").purge(concurrency=1)
+
+    # Deleting a page shifts the next ones, so the first listing skips some
+    assert count == 7
+    assert ids == []
+
+
+def test_job_poller():
+    poller = JobPoller(PollingStrategy(initial=0.001, max_interval=0.01))
+    remaining = {'a': 3, 'b': 1}
+
+    def make_poll(name):
+        def poll():
+            remaining[name] -= 1
+            if remaining[name]:
+                return PENDING
+            return name.upper()
+        return poll
+
+    def fail():
+        raise ValueError("failed")
+
+    futures = [poller.submit(make_poll('a')),
+               poller.submit(make_poll('b')),
+               poller.submit(fail)]
+
+    assert futures[0].result(timeout=5) == "A"
+    assert futures[1].result(timeout=5) == "B"
+    with pytest.raises(ValueError):
+        futures[2].result(timeout=5)
+    assert poller.stats == {'jobs': 3, 'polls': 5, 'pending': 0,
+                            'timeouts': 0}
+    assert poller.polls_per_job == {1: 2, 3: 1}
+
+
+def test_job_poller_cancel():
+    poller = JobPoller(PollingStrategy.fixed(0.001))
+    polls = []
+
+    def poll():
+        polls.append(1)
+        return PENDING
+
+    future = poller.submit(poll)
+    while not polls:
+        time.sleep(0.001)
+    future.cancel()
+    while poller.stats['pending']:
+        time.sleep(0.001)
+    assert future.cancelled()
+
+
+@responses.activate
+def test_download_without_waiting():
+    api = TransifexApi(host=host, auth="test_api_key",
+                       polling=PollingStrategy.fixed(0.001))
+    url = "{}/resource_translations_async_downloads".format(host)
+    pending = {'data': {'type': "resource_translations_async_downloads",
+                        'id': "1",
+                        'attributes': {'status': "pending"},
+                        'links': {'self': url + "/1"}}}
+    responses.add(responses.POST, url, json=pending, status=202)
+    responses.add(responses.GET, url + "/1", json=pending)
+    responses.add(responses.GET, url + "/1", json=pending,
+                  headers={'Retry-After': "0.002"})
+    responses.add(responses.GET, url + "/1", status=303,
+                  headers={'Location': "https://some.where/file"})
+
+    future = api.ResourceTranslationsAsyncDownload.download(
+        resource=api.Resource(id="r"), language=api.Language(id="l"),
+        wait=False,
+    )
+
+    assert future.result(timeout=5) == "https://some.where/file"
+    assert api.poller.stats == {'jobs': 1, 'polls': 3, 'pending': 0,
+                                'timeouts': 0}
+
+
+@responses.activate
+def test_polling_bypasses_cache():
+    api = TransifexApi(host=host, auth="test_api_key",
+                       cache=jsonapi.ResponseCache(ttl=60), conditional=True,
+                       polling=PollingStrategy.fixed(0.001, deadline=1))
+    url = "{}/resource_translations_async_downloads".format(host)
+    pending = {'data': {'type': "resource_translations_async_downloads",
+                        'id': "1",
+                        'attributes': {'status': "pending"},
+                        'links': {'self': url + "/1"}}}
+    responses.add(responses.POST, url, json=pending, status=202)
+    responses.add(responses.GET, url + "/1", json=pending,
+                  headers={'ETag': '"1"'})
+    responses.add(responses.GET, url + "/1", status=303,
+                  headers={'Location': "https://some.where/file"})
+
+    result = api.ResourceTranslationsAsyncDownload.download(
+        resource=api.Resource(id="r"), language=api.Language(id="l"),
+    )
+
+    assert result == "https://some.where/file"
+    assert len(responses.calls) == 3
+    assert 'If-None-Match' not in responses.calls[2].request.headers
+    assert api.cache.stats['hits'] == 0
+
+
+def test_polling_strategy():
+    strategy = PollingStrategy(initial=0.5, factor=2, max_interval=10)
+    assert ([strategy.get_delay(polls) for polls in range(7)] ==
+            [0.5, 1, 2, 4, 8, 10, 10])
+    assert strategy.get_delay(3, retry_after=30) == 30
+
+    strategy = PollingStrategy(use_hints=False)
+    assert strategy.get_delay(0, retry_after=30) == 0.5
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0
+        self.sleeps = []
+
+    def get_now(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def test_job_poller_wait():
+    clock = FakeClock()
+    poller = JobPoller(sleep=clock.sleep, get_now=clock.get_now)
+    results = [PENDING, Pending(retry_after=7), PENDING, "done"]
+
+    assert poller.wait(lambda: results.pop(0)) == "done"
+    assert clock.sleeps == [0.5, 1, 7, 4]
+    assert poller.stats == {'jobs': 1, 'polls': 4, 'pending': 0,
+                            'timeouts': 0}
+
+
+def test_job_poller_deadline():
+    clock = FakeClock()
+    poller = JobPoller(sleep=clock.sleep, get_now=clock.get_now)
+    strategy = PollingStrategy(initial=1, factor=2, deadline=5)
+
+    with pytest.raises(PollingTimeout) as exc_info:
+        poller.wait(lambda: PENDING, strategy)
+
+    assert clock.sleeps == [1, 2, 2]
+    assert exc_info.value.polls == 3
+    assert poller.stats['timeouts'] == 1
+    assert poller.polls_per_job == {3: 1}
+
+
+def _add_download_job(url):
+    pending = {'data': {'type': "resource_translations_async_downloads",
+                        'id': "1",
+                        'attributes': {'status': "pending"},
+                        'links': {'self': url + "/1"}}}
+    responses.add(responses.POST, url, json=pending, status=202)
+    responses.add(responses.GET, url + "/1", status=303,
+                  headers={'Location': "https://some.where/file"})
+
+
+@responses.activate
+def test_download_to(tmpdir):
+    api = TransifexApi(host=host, auth="test_api_key",
+                       polling=PollingStrategy.fixed(0))
+    _add_download_job("{}/resource_translations_async_downloads".format(host))
+    content = b"msgid ..." * 10000
+    responses.add(responses.GET, "https://some.where/file", body=content)
+    path = str(tmpdir.join("el.po"))
+
+    result = api.ResourceTranslationsAsyncDownload.download_to(
+        path, checksum="sha256:" + hashlib.sha256(content).hexdigest(),
+        chunk_size=1024,
+        resource=api.Resource(id="r"), language=api.Language(id="l"),
+    )
+
+    assert result == (
+        "https://some.where/file", len(content),
+        hashlib.sha256(content).hexdigest(),
+    )
+    with open(path, 'rb') as f:
+        assert f.read() == content
+    assert 'Authorization' not in responses.calls[-1].request.headers
+
+
+@responses.activate
+def test_download_to_resumes(tmpdir):
+    content = b"0123456789" * 100
+    path = tmpdir.join("el.po")
+    tmpdir.join("el.po.part").write_binary(content[:300])
+    tmpdir.join("el.po.part.validator").write('"v1"')
+
+    def callback(request):
+        assert request.headers['Range'] == "bytes=300-"
+        assert request.headers['If-Range'] == '"v1"'
+        return (206, {'Content-Range': "bytes 300-999/1000"}, content[300:])
+
+    responses.add_callback(responses.GET, "https://some.where/file",
+                           callback=callback)
+
+    result = downloads.download_to(requests.Session(),
+                                   "https://some.where/file", str(path),
+                                   checksum="md5", resume=True)
+
+    assert path.read_binary() == content
+    assert not tmpdir.join("el.po.part").exists()
+    assert not tmpdir.join("el.po.part.validator").exists()
+    assert result.size == len(content)
+    assert result.checksum == hashlib.md5(content).hexdigest()
+
+
+@responses.activate
+def test_download_to_starts_over_if_range_is_ignored(tmpdir):
+    content = b"0123456789" * 100
+    path = tmpdir.join("el.po")
+    tmpdir.join("el.po.part").write_binary(b"stale")
+    tmpdir.join("el.po.part.validator").write('"v1"')
+    # Also what happens if the file has changed and `If-Range` doesn't match
+    responses.add(responses.GET, "https://some.where/file", body=content)
+
+    downloads.download_to(requests.Session(), "https://some.where/file",
+                          str(path), resume=True)
+
+    assert path.read_binary() == content
+    assert responses.calls[0].request.headers['Range'] == "bytes=5-"
+
+
+@responses.activate
+def test_download_to_discards_part_without_validator(tmpdir):
+    path = tmpdir.join("el.po")
+    tmpdir.join("el.po.part").write_binary(b"stale")
+    responses.add(responses.GET, "https://some.where/file", body=b"content",
+                  headers={'ETag': '"v2"'})
+
+    class Session(requests.Session):
+        def get(self, *args, **kwargs):
+            response = super(Session, self).get(*args, **kwargs)
+            iter_content = response.iter_content
+
+            def check_validator(*args, **kwargs):
+                # Saved before the body is downloaded, for the next resume
+                assert tmpdir.join("el.po.part.validator").read() == '"v2"'
+                return iter_content(*args, **kwargs)
+
+            response.iter_content = check_validator
+            return response
+
+    downloads.download_to(Session(), "https://some.where/file", str(path),
+                          resume=True)
+
+    assert path.read_binary() == b"content"
+    assert 'Range' not in responses.calls[0].request.headers
+    assert not tmpdir.join("el.po.part.validator").exists()
+
+
+@pytest.mark.parametrize('status, headers', [
+    # The part is longer than the file
+    (416, {}),
+    # The part doesn't match what the server continues from
+    (206, {'Content-Range': "bytes 0-6/7"}),
+])
+@responses.activate
+def test_download_to_starts_over_if_part_does_not_match(tmpdir, status,
+                                                        headers):
+    path = tmpdir.join("el.po")
+    tmpdir.join("el.po.part").write_binary(b"content and more")
+    tmpdir.join("el.po.part.validator").write('"v1"')
+    responses.add(responses.GET, "https://some.where/file", status=status,
+                  headers=headers, body=b"content")
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+
+    result = downloads.download_to(requests.Session(),
+                                   "https://some.where/file", str(path),
+                                   checksum="md5", resume=True)
+
+    assert path.read_binary() == b"content"
+    assert result.size == 7
+    assert result.checksum == hashlib.md5(b"content").hexdigest()
+    assert 'Range' not in responses.calls[1].request.headers
+
+
+@responses.activate
+def test_download_to_reconnects():
+    responses.add(responses.GET, "https://some.where/file",
+                  body=requests.ConnectionError())
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    f = io.BytesIO()
+
+    downloads.download_to(requests.Session(), "https://some.where/file", f,
+                          resume=True)
+
+    assert f.getvalue() == b"content"
+    assert len(responses.calls) == 2
+
+
+class BreakingSession(requests.Session):
+    """ The body of the first response breaks after its first 4 bytes """
+
+    broken = False
+
+    def get(self, *args, **kwargs):
+        response = super(BreakingSession, self).get(*args, **kwargs)
+        if not self.broken:
+            self.broken = True
+            iter_content = response.iter_content
+
+            def break_after_first_chunk(*args, **kwargs):
+                yield next(iter_content(4))
+                raise requests.ConnectionError()
+
+            response.iter_content = break_after_first_chunk
+        return response
+
+
+@responses.activate
+def test_download_to_file_object_starts_over():
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    # Doesn't continue from byte 4
+    responses.add(responses.GET, "https://some.where/file", status=206,
+                  headers={'Content-Range': "bytes 0-6/7"}, body=b"content")
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    f = io.BytesIO()
+    f.write(b"prefix ")
+
+    result = downloads.download_to(BreakingSession(),
+                                   "https://some.where/file", f,
+                                   checksum="md5", resume=True)
+
+    assert f.getvalue() == b"prefix content"
+    assert result.size == 7
+    assert result.checksum == hashlib.md5(b"content").hexdigest()
+    assert responses.calls[1].request.headers['Range'] == "bytes=4-"
+    assert 'Range' not in responses.calls[2].request.headers
+
+
+class Pipe(io.RawIOBase):
+    def __init__(self):
+        self.written = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        return len(data)
+
+
+@responses.activate
+def test_download_to_unseekable_stream_cannot_start_over():
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    f = Pipe()
+
+    with pytest.raises(downloads.CannotRestart):
+        downloads.download_to(BreakingSession(), "https://some.where/file",
+                              f, resume=True)
+
+    assert f.written == [b"cont"]
+
+
+@responses.activate
+def test_download_to_checksum_mismatch(tmpdir):
+    responses.add(responses.GET, "https://some.where/file", body=b"content")
+    path = tmpdir.join("el.po")
+
+    with pytest.raises(downloads.ChecksumMismatch):
+        downloads.download_to(requests.Session(), "https://some.where/file",
+                              str(path), checksum="md5:0123")
+
+    assert not path.exists()
+    assert not tmpdir.join("el.po.part").exists()
+
+
+def _add_export_responses(fail=()):
+    jobs_url = "{}/resource_translations_async_downloads".format(host)
+    jobs = []
+
+    def create_job(request):
+        relationships = json.loads(request.body)['data']['relationships']
+        jobs.append((relationships['resource']['data']['id'],
+                     relationships['language']['data']['id']))
+        job_id = str(len(jobs) - 1)
+        return (202, {}, json.dumps({'data': {
+            'type': "resource_translations_async_downloads",
+            'id': job_id,
+            'attributes': {'status': "pending"},
+            'links': {'self': "{}/{}".format(jobs_url, job_id)},
+        }}))
+
+    def get_job(request):
+        job_id = request.url.rsplit('/', 1)[-1]
+        resource_id, language_id = jobs[int(job_id)]
+        if (resource_id, language_id) in fail:
+            return (200, {}, json.dumps({'data': {
+                'type': "resource_translations_async_downloads",
+                'id': job_id,
+                'attributes': {'status': "failed", 'errors': [
+                    {'code': "invalid", 'detail': "Invalid"},
+                ]},
+            }}))
+        location = "https://some.where/{}/{}".format(resource_id, language_id)
+        return (303, {'Location': location}, "")
+
+    def get_file(request):
+        return (200, {}, "content of {}".format(request.url))
+
+    responses.add_callback(responses.POST, jobs_url, callback=create_job)
+    responses.add_callback(responses.GET,
+                           re.compile(re.escape(jobs_url) + "/.*"),
+                           callback=get_job)
+    responses.add_callback(responses.GET,
+                           re.compile(r"https://some\.where/.*"),
+                           callback=get_file)
+
+
+@responses.activate
+def test_export_project(tmpdir):
+    api = TransifexApi(host=host, auth="test_api_key",
+                       polling=PollingStrategy.fixed(0))
+    responses.add(responses.GET, "{}/resources".format(host), json={
+        'data': [{'type': "resources", 'id': "o:o:p:p:r:r1"},
+                 {'type': "resources", 'id': "o:o:p:p:r:r2"}],
+        'links': {},
+    })
+    _add_export_responses(fail=[("o:o:p:p:r:r2", "l:fr")])
+
+    report = api.export(str(tmpdir), ['el', api.Language(id="l:fr")],
+                        project="o:o:p:p",
+                        path_template="{resource}/{language}.po",
+                        concurrency=2, file_type="default")
+
+    assert sorted(exported.path for exported in report.files) == [
+        str(tmpdir.join(path))
+        for path in ("r1/el.po", "r1/fr.po", "r2/el.po")
+    ]
+    assert (tmpdir.join("r1", "el.po").read() ==
+            "content of https://some.where/o:o:p:p:r:r1/l:el")
+    assert list(report.failures) == [("o:o:p:p:r:r2", "l:fr")]
+    assert isinstance(report.failures[("o:o:p:p:r:r2", "l:fr")],
+                      JsonApiException)
+    assert report.size == sum(tmpdir.join(path).size()
+                              for path in ("r1/el.po", "r1/fr.po", "r2/el.po"))
+    assert "Exported 3 files" in str(report)
+    assert "1 failed" in str(report)
+
+
+@responses.activate
+def test_export_resource(tmpdir):
+    api = TransifexApi(host=host, auth="test_api_key",
+                       polling=PollingStrategy.fixed(0))
+    _add_export_responses()
+
+    report = api.export(str(tmpdir), ['el', 'fr'],
+                        resource=api.Resource(id="o:o:p:p:r:r1"))
+
+    assert (sorted(tmpdir.join("r1").listdir()) ==
+            [tmpdir.join("r1", "el"), tmpdir.join("r1", "fr")])
+    assert not report.failures
+    assert all(exported.download_seconds >= 0 for exported in report.files)
+
+
+def _parse_multipart(content_type, body):
+    # `email.message_from_bytes` is missing from python 2, where
+    # `message_from_string` accepts bytes
+    if six.PY3:
+        message_from_bytes = email.message_from_bytes
+    else:
+        message_from_bytes = email.message_from_string
+    message = message_from_bytes(
+        b"Content-Type: " + content_type.encode('ascii') + b"\r\n\r\n" + body
+    )
+    return {part.get_param('name', header='content-disposition'):
+            (part.get_filename(), part.get_payload(decode=True))
+            for part in message.get_payload()}
+
+
+def test_multipart_encoder_with_file(tmpdir):
+    path = tmpdir.join("strings.po")
+    path.write_binary(b"msgid" * 1000)
+    progress = []
+
+    with open(str(path), 'rb') as f:
+        encoder = uploads.MultipartEncoder(
+            {'resource': "o:o:p:p:r:r"}, {'content': f}, chunk_size=1024,
+            progress=lambda *args: progress.append(args),
+        )
+        assert encoder.len == encoder.total
+        assert _parse_multipart(encoder.content_type, encoder.read()) == {
+            'resource': (None, b"o:o:p:p:r:r"),
+            'content': ("strings.po", b"msgid" * 1000),
+        }
+
+    assert encoder.sent == encoder.len
+    assert progress[-1] == (encoder.len, encoder.len)
+    # Headers, 5 chunks of content and the closing boundary
+    assert len(progress) > 5
+
+
+def test_multipart_encoder_with_mmap(tmpdir):
+    path = tmpdir.join("strings.po")
+    path.write_binary(b"msgid" * 1000)
+
+    with open(str(path), 'rb') as f:
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        encoder = uploads.MultipartEncoder(files={'content': content})
+        assert encoder.len > 5000
+        assert _parse_multipart(encoder.content_type, encoder.read()) == {
+            'content': ("content", b"msgid" * 1000),
+        }
+
+
+def test_multipart_encoder_with_generator():
+    def generate():
+        yield b"msgid "
+        yield "\"\u03b1\u03b2\u03b3\"\n"
+
+    encoder = uploads.MultipartEncoder(files={'content': generate()})
+
+    assert not hasattr(encoder, 'len')
+    assert b"".join(encoder).count(b"msgid \"\xce\xb1\xce\xb2\xce\xb3\"") == 1
+
+
+@responses.activate
+def test_upload_streams_content():
+    api = _make_api()
+    responses.add(
+        responses.POST,
+        "{}/resource_strings_async_uploads".format(host),
+        status=202,
+        json={'data': {'type': "resource_strings_async_uploads", 'id': "1",
+                       'attributes': {'status': "succeeded",
+                                      'details': {'strings_created': 1}}}},
+    )
+
+    result = api.ResourceStringsAsyncUpload.upload(
+        api.Resource(id="o:o:p:p:r:r"), io.BytesIO(b"msgid"),
+    )
+
+    assert result == {'strings_created': 1}
+    request = responses.calls[0].request
+    assert request.headers['Content-Type'].startswith("multipart/form-data")
+    assert _parse_multipart(request.headers['Content-Type'],
+                            request.body) == {
+        'resource': (None, b"o:o:p:p:r:r"),
+        'content': ("content", b"msgid"),
+    }
+
+
+def _add_upload_response():
+    responses.add(
+        responses.POST,
+        "{}/resource_strings_async_uploads".format(host),
+        status=202,
+        json={'data': {'type': "resource_strings_async_uploads", 'id': "1",
+                       'attributes': {'status': "succeeded",
+                                      'details': {'strings_created': 1}}}},
+    )
+
+
+@pytest.mark.parametrize('filename', ["manifest.json", "manifest.sqlite"])
+@responses.activate
+def test_upload_manifest(tmpdir, filename):
+    path = str(tmpdir.join(filename))
+    api = TransifexApi(host=host, auth="test_api_key", manifest=path)
+    _add_upload_response()
+    upload = api.ResourceStringsAsyncUpload.upload
+
+    assert upload("o:o:p:p:r:r", io.BytesIO(b"msgid")) is not None
+    assert upload("o:o:p:p:r:r", io.BytesIO(b"msgid")) is None
+    assert len(responses.calls) == 1
+
+    # Different content, resource or forced
+    assert upload("o:o:p:p:r:r", b"msgid 2") is not None
+    assert upload("o:o:p:p:r:r2", b"msgid 2") is not None
+    assert upload("o:o:p:p:r:r", b"msgid 2", force=True) is not None
+    assert len(responses.calls) == 4
+
+    # Persisted
+    api = TransifexApi(host=host, auth="test_api_key", manifest=path)
+    upload = api.ResourceStringsAsyncUpload.upload
+    assert upload("o:o:p:p:r:r", b"msgid 2") is None
+    assert upload("o:o:p:p:r:r", b"msgid 2", wait=False).result() is None
+    assert len(responses.calls) == 4
+
+    api.manifest.invalidate("o:o:p:p:r:r")
+    assert upload("o:o:p:p:r:r", b"msgid 2") is not None
+    assert len(responses.calls) == 5
+
+
+class RecordingManifest(manifests.UploadManifest):
+    def __init__(self):
+        self.hashes = {}
+
+    def get(self, resource_id):
+        return self.hashes.get(resource_id)
+
+    def set(self, resource_id, content_hash):
+        self.hashes[resource_id] = content_hash
+
+    def invalidate(self, resource_id):
+        self.hashes.pop(resource_id, None)
+
+    def clear(self):
+        self.hashes.clear()
+
+
+def test_upload_manifest_is_abstract():
+    class IncompleteManifest(manifests.UploadManifest):
+        def get(self, resource_id):
+            return None
+
+    with pytest.raises(TypeError):
+        IncompleteManifest()
+
+
+@responses.activate
+def test_upload_manifest_without_hash():
+    api = TransifexApi(host=host, auth="test_api_key",
+                       manifest=RecordingManifest())
+    _add_upload_response()
+
+    def generate():
+        yield b"msgid"
+
+    api.ResourceStringsAsyncUpload.upload("o:o:p:p:r:r", generate())
+    api.ResourceStringsAsyncUpload.upload("o:o:p:p:r:r", generate())
+
+    assert len(responses.calls) == 2
+    assert api.manifest.hashes == {}
+
+
+@responses.activate
+def test_upload_manifest_without_waiting():
+    api = TransifexApi(host=host, auth="test_api_key",
+                       manifest=RecordingManifest())
+    _add_upload_response()
+
+    future = api.ResourceStringsAsyncUpload.upload("o:o:p:p:r:r", b"msgid",
+                                                   wait=False)
+
+    assert future.result() == {'strings_created': 1}
+    assert api.manifest.hashes == {
+        "o:o:p:p:r:r": hashlib.sha256(b"msgid").hexdigest(),
+    }
+
+
+@responses.activate
+def test_purge_invalidates_manifest():
+    api = TransifexApi(host=host, auth="test_api_key",
+                       manifest=RecordingManifest())
+    api.manifest.set("o:org:p:proj:r:res", "abc")
+    _add_string_pages(1, 1)
+    responses.add(responses.DELETE, "{}/resource_strings".format(host))
+
+    api.Resource(id="o:org:p:proj:r:res").purge()
+
+    assert api.manifest.hashes == {}
+
+
+class FakeStringServer(object):
+    """ Serves resource strings and translations, filtering them by
+        modification date like the API does
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.translations = {}
+        self.requests = []
+        responses.add_callback(responses.GET,
+                               "{}/resource_strings".format(host),
+                               callback=self.list_strings)
+        responses.add_callback(responses.GET,
+                               "{}/resource_translations".format(host),
+                               callback=self.list_translations)
+
+    def set_string(self, id, key, modified):
+        self.strings[id] = {'type': "resource_strings", 'id': id,
+                            'attributes': {'key': key,
+                                           'datetime_modified': modified}}
+
+    def set_translation(self, string_id, language_id, text, modified):
+        id = "{}:{}".format(string_id, language_id)
+        self.translations[id] = {
+            'type': "resource_translations", 'id': id,
+            'attributes': {'strings': {'other': text},
+                           'datetime_translated': modified},
+            'relationships': {
+                'resource_string': {'data': {'type': "resource_strings",
+                                             'id': string_id}},
+                'language': {'data': {'type': "languages",
+                                      'id': language_id}},
+            },
+        }
+
+    def _respond(self, request, items, date_filter, date_attribute):
+        params = dict(request.params)
+        self.requests.append(params)
+        since = params.get(date_filter)
+        data = [item for _, item in sorted(items.items())
+                if since is None or
+                item['attributes'][date_attribute] >= since]
+        if 'fields[resource_strings]' in params:
+            data = [{'type': item['type'], 'id': item['id']}
+                    for item in data]
+        return (200, {}, json.dumps({'data': data, 'links': {}}))
+
+    def list_strings(self, request):
+        return self._respond(request, self.strings,
+                             'filter[date_modified][gte]', 'datetime_modified')
+
+    def list_translations(self, request):
+        return self._respond(request, self.translations,
+                             'filter[date_translated][gte]',
+                             'datetime_translated')
+
+
+@responses.activate
+def test_string_mirror(tmpdir):
+    api = _make_api()
+    server = FakeStringServer()
+    server.set_string("s1", "one", "2021-01-01T00:00:01Z")
+    server.set_string("s2", "two", "2021-01-01T00:00:02Z")
+    server.set_string("s3", "three", "2021-01-01T00:00:03Z")
+    server.set_translation("s1", "l:el", "\u03ad\u03bd\u03b1",
+                           "2021-01-02T00:00:01Z")
+    clock = FakeClock()
+    mirror = StringMirror(api, str(tmpdir.join("mirror.sqlite")),
+                          get_now=clock.get_now)
+
+    result = mirror.sync("r", languages=['l:el'])
+
+    assert result == ("r", 3, 1, 0, True, False)
+    assert ([string.key for string in mirror.strings("r")] ==
+            ["one", "two", "three"])
+    assert mirror.get_string("s2").key == "two"
+    [translation] = mirror.translations("r", "l:el")
+    assert translation.strings == {'other': "\u03ad\u03bd\u03b1"}
+    assert translation.relationships['resource_string']['data']['id'] == "s1"
+    assert server.requests[0] == {'filter[resource]': "r",
+                                  'sort': "date_modified"}
+
+    # Incremental
+    server.set_string("s2", "two!", "2021-01-01T00:00:04Z")
+    server.set_string("s4", "four", "2021-01-01T00:00:05Z")
+    del server.strings["s3"]
+    del server.requests[:]
+
+    result = mirror.sync("r", languages=['l:el'])
+
+    assert result == ("r", 2, 1, 0, False, False)
+    assert server.requests[0]['filter[date_modified][gte]'] == \
+        "2021-01-01T00:00:03Z"
+    assert server.requests[1]['filter[date_translated][gte]'] == \
+        "2021-01-02T00:00:01Z"
+    assert mirror.strings("r", key="two!")[0].id == "s2"
+    assert mirror.count("r") == 4
+
+    # Deletions are picked up by the periodic reconciliation
+    clock.now += mirror.reconcile_every
+    del server.translations["s1:l:el"]
+    server.set_translation("s3", "l:el", "\u03c4\u03c1\u03af\u03b1",
+                           "2021-01-02T00:00:02Z")
+
+    result = mirror.sync("r", languages=['l:el'])
+
+    assert result.deleted == 1
+    assert result.reconciled
+    assert mirror.get_string("s3") is None
+    assert [t.id for t in mirror.translations("r", "l:el")] == ["s1:l:el"]
+    assert server.requests[-1]['fields[resource_strings]'] == "key"
+
+    mirror.reset("r")
+    assert mirror.count() == 0
+    mirror.close()
@@ -1,13 +1,194 @@
-import time
+import threading
+from concurrent.futures import (FIRST_COMPLETED, Future, ThreadPoolExecutor,
+                                wait)
 
 import jsonapi
 
-from jsonapi.exceptions import JsonApiException
+from jsonapi.exceptions import BulkError, JsonApiException
+from jsonapi.retries import parse_retry_after
+
+from . import downloads, exports, manifests, uploads
+from .jobs import PENDING, JobPoller, Pending, PollingStrategy
 
 
 class TransifexApi(jsonapi.JsonApi):
+    """ Adds to `jsonapi.JsonApi`:
+
+        - polling: The default `PollingStrategy` of asynchronous uploads and
+                   downloads
+        - poller: The `JobPoller` that waits for asynchronous uploads and
+                  downloads and keeps metrics about them. Every API connection
+                  instance has its own by default; pass the same one to
+                  several instances to share its threads
+        - manifest: An `UploadManifest` (or the path of one) that makes
+                    source uploads skip content that has already been
+                    uploaded. `False` turns it off again
+    """
+
     HOST = "https://rest.api.transifex.com"
 
+    def __init__(self, **kwargs):
+        self.polling = PollingStrategy()
+        self.poller = JobPoller()
+        self.manifest = None
+        super(TransifexApi, self).__init__(**kwargs)
+
+    def setup(self, polling=None, poller=None, manifest=None, **kwargs):
+        super(TransifexApi, self).setup(**kwargs)
+        if polling is not None:
+            self.polling = polling
+        if poller is not None:
+            self.poller = poller
+        if manifest is not None:
+            if manifest is False:
+                self.manifest = None
+            else:
+                self.manifest = manifests.get_manifest(manifest)
+
+    def export(self, target, languages, resource=None, project=None,
+               path_template=exports.DEFAULT_PATH_TEMPLATE, concurrency=8,
+               polling=None, checksum=None, **attributes):
+        """ Download the translations of a resource, or of all the resources
+            of a project, in several languages into the `target` directory
+            and return an `ExportReport`:
+
+                >>> report = transifex_api.export(
+                ...     "locale", ['el', 'fr', 'de'], project=project,
+                ...     path_template="{resource}/{language}.po",
+                ... )
+                >>> print(report)
+                <<< Exported 3 files (1.2 MB) in 4.1s (0.29 MB/s), 0 failed
+
+            - languages: Language objects, IDs ('l:el') or codes ('el')
+            - path_template: Where to save each file, relative to `target`.
+                             `{resource}` is the resource's slug and
+                             `{language}` the language's code
+            - concurrency: How many files can be in progress (from the
+                           creation of their download job until they are
+                           written to disk) at the same time
+            - polling: The `PollingStrategy` of the download jobs, which are
+                       all polled by the `poller`
+            - checksum: The checksum algorithm of the downloaded files, see
+                        `transifex_api.downloads.download_to`
+            - attributes: Extra attributes for the download jobs, eg
+                          `file_type` or `mode`
+
+            A file that cannot be exported does not stop the others; its
+            exception ends up in the report's `failures`.
+        """
+
+        return exports.export(self, target, languages, resource=resource,
+                              project=project, path_template=path_template,
+                              concurrency=concurrency, polling=polling,
+                              checksum=checksum, **attributes)
+
+
+class AsyncJob(object):
+    """ Common functionality of the resources that represent asynchronous
+        jobs, like uploads and downloads. Subclasses can override
+        `get_redirect_result` (or `get_result` altogether).
+
+        `wait` and `as_future` accept either a `PollingStrategy` as `polling`
+        or, for a fixed delay between polls, an `interval` in seconds. If
+        neither is set, the API connection instance's `polling` is used.
+    """
+
+    def raise_for_errors(self):
+        if hasattr(self, 'errors') and len(self.errors) > 0:
+            errors = [{'code': e['code'],
+                       'detail': e['detail'],
+                       'title': e['detail'],
+                       'status': '409'}
+                      for e in self.errors]
+            raise JsonApiException(409, errors)
+
+    def get_result(self):
+        """ Return the result of the job as it was last fetched, `PENDING`
+            if it's not finished yet, or raise its errors. The result is the
+            job's 'details' attribute or, if the server redirected us
+            somewhere, whatever `get_redirect_result` returns.
+        """
+
+        self.raise_for_errors()
+        if self.redirect:
+            return self.get_redirect_result()
+        if hasattr(self, 'attributes') and self.attributes.get("details"):
+            return self.attributes.get("details")
+        return PENDING
+
+    def get_redirect_result(self):
+        """ Return the result of a finished job that redirected us to
+            `self.redirect`; by default, the object we were redirected to
+        """
+
+        return self.follow()
+
+    def poll(self):
+        """ Reload the job and return its result. If it's still pending, the
+            returned `Pending` carries the server's `Retry-After` hint
+        """
+
+        retry_after = []
+
+        def capture_retry_after(response, *args, **kwargs):
+            retry_after.append(
+                parse_retry_after(response.headers.get('Retry-After'))
+            )
+
+        # A cached (or revalidated) response would report the job as pending
+        # until it expires
+        url = self.links.get('self', self.get_item_url())
+        response_body = self.API.request(
+            'get', url, cache=False, hooks={'response': capture_retry_after},
+        )
+        self._post_reload(response_body)
+        result = self.get_result()
+        if isinstance(result, Pending) and retry_after:
+            return Pending(retry_after[-1])
+        return result
+
+    def wait(self, interval=None, polling=None):
+        """ Block until the job is finished and return its result """
+
+        result = self.get_result()
+        if not isinstance(result, Pending):
+            return result
+        return self.API.poller.wait(self.poll,
+                                    self._get_polling(interval, polling))
+
+    def as_future(self, interval=None, polling=None):
+        """ Return a `concurrent.futures.Future` for the result of the job,
+            resolved by the API connection instance's `poller`
+        """
+
+        try:
+            result = self.get_result()
+        except Exception as exc:
+            future = Future()
+            future.set_exception(exc)
+            return future
+        if not isinstance(result, Pending):
+            future = Future()
+            future.set_result(result)
+            return future
+        return self.API.poller.submit(self.poll,
+                                      self._get_polling(interval, polling))
+
+    def _get_polling(self, interval, polling):
+        if polling is not None:
+            return polling
+        if interval is not None:
+            return PollingStrategy.fixed(interval)
+        return self.API.polling
+
+    @classmethod
+    def _create_upload(cls, fields, content, progress=None):
+        encoder = uploads.MultipartEncoder(fields, {'content': content},
+                                           progress=progress)
+        return cls.create_with_form(
+            data=encoder, headers={'Content-Type': encoder.content_type},
+        )
+
 
 @TransifexApi.register
 class Organization(jsonapi.Resource):
@@ -33,14 +214,82 @@ class Language(jsonapi.Resource):
 class Resource(jsonapi.Resource):
     TYPE = "resources"
 
-    def purge(self):
-        count = 0
-        # Instead of filter, if Resource had a plural relationship to
-        # ResourceString, we could do `self.fetch('resource_strings')`
-        for page in list(ResourceString.filter(resource=self).all_pages()):
-            count += len(page)
-            ResourceString.bulk_delete(page)
-        return count
+    def purge(self, concurrency=4, chunk_size=None, progress=None):
+        """ Delete all the source strings of the resource and return how many
+            were deleted.
+
+            The IDs of the strings are listed page by page (as compact records
+            with a sparse fieldset) and each page is deleted with a bulk
+            request while the next pages are being listed, so at most about
+            `concurrency` pages are held in memory at any time. Unless the
+            server uses cursor pagination, deleting a page shifts the ones
+            after it and some strings are skipped; so the strings are listed
+            again, until none are left.
+
+            :param concurrency: How many bulk deletions can be in flight
+            :param chunk_size: Forwarded to `ResourceString.bulk_delete`
+            :param progress: Called with `(deleted, listed)` after each
+                             deletion, from a worker thread
+
+            If some deletions fail, the rest of the strings of that listing
+            are still deleted and a `jsonapi.BulkError` is raised at the end,
+            with the number of deleted strings as `result`.
+        """
+
+        ResourceString = self.API.ResourceString
+
+        state = {'deleted': 0, 'listed': 0}
+        errors = []
+        lock = threading.Lock()
+
+        def delete(start, ids):
+            try:
+                count = ResourceString.bulk_delete(ids, chunk_size=chunk_size)
+            except BulkError as exc:
+                count = exc.result
+                chunk_errors = [(start + chunk_start, start + chunk_stop, e)
+                                for chunk_start, chunk_stop, e in exc.errors]
+            except Exception as exc:
+                count = 0
+                chunk_errors = [(start, start + len(ids), exc)]
+            else:
+                chunk_errors = []
+            with lock:
+                state['deleted'] += count
+                errors.extend(chunk_errors)
+                deleted, listed = state['deleted'], state['listed']
+            if progress is not None:
+                progress(deleted, listed)
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            listed = None
+            while listed != 0 and not errors:
+                listed = 0
+                in_flight = set()
+                pages = (ResourceString.filter(resource=self).
+                         extra(**{'fields[resource_strings]': "key"}).
+                         compact().
+                         all_pages())
+                for page in pages:
+                    ids = [record.id for record in page]
+                    listed += len(ids)
+                    with lock:
+                        start = state['listed']
+                        state['listed'] += len(ids)
+                    in_flight.add(pool.submit(delete, start, ids))
+                    if len(in_flight) >= concurrency:
+                        _, in_flight = wait(in_flight,
+                                            return_when=FIRST_COMPLETED)
+                wait(in_flight)
+
+        # The next upload of the same content is not a no-op anymore
+        if self.API.manifest is not None:
+            self.API.manifest.invalidate(self.id)
+
+        if errors:
+            raise BulkError(state['deleted'], sorted(errors,
+                                                     key=lambda e: e[0]))
+        return state['deleted']
 
 
 @TransifexApi.register
@@ -55,86 +304,101 @@ class ResourceTranslation(jsonapi.Resource):
 
 
 @TransifexApi.register
-class ResourceStringsAsyncUpload(jsonapi.Resource):
+class ResourceStringsAsyncUpload(AsyncJob, jsonapi.Resource):
     TYPE = "resource_strings_async_uploads"
 
     @classmethod
-    def upload(cls, resource, content, interval=5):
+    def upload(cls, resource, content, interval=None, wait=True,
+               polling=None, progress=None, force=False):
         """ Upload source content with multipart/form-data.
 
             :param resource: A (transifex) Resource instance or ID
-            :param content: A string or file-like object
+            :param content: A string, a file-like object, a memory-mapped
+                            file or an iterable of bytes. It is streamed, see
+                            `transifex_api.uploads.MultipartEncoder`
             :param interval: How often (in seconds) to poll for the completion
-                             of the upload job
+                             of the upload job, instead of the API connection
+                             instance's polling strategy
+            :param wait: If False, return a `concurrent.futures.Future`
+                         instead of blocking until the upload is finished
+            :param polling: A `PollingStrategy` for this upload
+            :param progress: Called with `(sent, total)` bytes while the
+                             content is being uploaded
+            :param force: Upload even if the API connection instance's
+                          `manifest` says that this content has already been
+                          uploaded to the resource
+
+            Returns None (or a Future resolved with None) if the upload was
+            skipped because of the manifest.
         """
 
         if isinstance(resource, Resource):
             resource = resource.id
 
-        upload = cls.create_with_form(data={'resource': resource},
-                                      files={'content': content})
-
-        while True:
-            if hasattr(upload, 'errors') and len(upload.errors) > 0:
-                errors = [{
-                    'code': e['code'],
-                    'detail': e['detail'],
-                    'title': e['detail'],
-                    'status': '409'} for e in upload.errors]
-                raise JsonApiException(409, errors)
-
-            if upload.redirect:
-                return upload.follow()
-            if (hasattr(upload, 'attributes')
-                    and upload.attributes.get("details")):
-                return upload.attributes.get("details")
-
-            time.sleep(interval)
-            upload.reload()
+        manifest = cls.API.manifest
+        content_hash = None
+        if manifest is not None:
+            content_hash = manifests.hash_content(content)
+        if (content_hash is not None and not force and
+                manifest.get(resource) == content_hash):
+            if wait:
+                return None
+            future = Future()
+            future.set_result(None)
+            return future
+
+        upload = cls._create_upload({'resource': resource}, content,
+                                    progress)
+
+        def record(future=None):
+            if content_hash is not None and (future is None or
+                                             future.exception() is None):
+                manifest.set(resource, content_hash)
+
+        if wait:
+            result = upload.wait(interval, polling)
+            record()
+            return result
+        future = upload.as_future(interval, polling)
+        future.add_done_callback(record)
+        return future
 
 
 @TransifexApi.register
-class ResourceTranslationsAsyncUpload(Resource):
+class ResourceTranslationsAsyncUpload(AsyncJob, Resource):
     TYPE = "resource_translations_async_uploads"
 
     @classmethod
-    def upload(cls, resource, content, language, interval=5,
-               file_type='default'):
+    def upload(cls, resource, content, language, interval=None,
+               file_type='default', wait=True, polling=None, progress=None):
         """ Upload translation content with multipart/form-data.
 
             :param resource: A (transifex) Resource instance or ID
-            :param content: A string or file-like object
+            :param content: A string, a file-like object, a memory-mapped
+                            file or an iterable of bytes. It is streamed, see
+                            `transifex_api.uploads.MultipartEncoder`
             :param language: A (transifex) Language instance or ID
             :param interval: How often (in seconds) to poll for the completion
-                             of the upload job
+                             of the upload job, instead of the API connection
+                             instance's polling strategy
             :param file_type: The content file type
+            :param wait: If False, return a `concurrent.futures.Future`
+                         instead of blocking until the upload is finished
+            :param polling: A `PollingStrategy` for this upload
+            :param progress: Called with `(sent, total)` bytes while the
+                             content is being uploaded
         """
 
         if isinstance(resource, Resource):
             resource = resource.id
 
-        upload = cls.create_with_form(data={'resource': resource,
-                                            'language': language,
-                                            'file_type': file_type},
-                                      files={'content': content})
-
-        while True:
-            if hasattr(upload, 'errors') and len(upload.errors) > 0:
-                errors = [{
-                    'code': e['code'],
-                    'detail': e['detail'],
-                    'title': e['detail'],
-                    'status': '409'} for e in upload.errors]
-                raise JsonApiException(409, errors)
-
-            if upload.redirect:
-                return upload.follow()
-            if (hasattr(upload, 'attributes')
-                    and upload.attributes.get("details")):
-                return upload.attributes.get("details")
-
-            time.sleep(interval)
-            upload.reload()
+        upload = cls._create_upload({'resource': resource,
+                                     'language': language,
+                                     'file_type': file_type},
+                                    content, progress)
+        if wait:
+            return upload.wait(interval, polling)
+        return upload.as_future(interval, polling)
 
 
 @TransifexApi.register
@@ -153,24 +417,43 @@ class ResourceLanguageStats(jsonapi.Resource):
 
 
 @TransifexApi.register
-class ResourceTranslationsAsyncDownload(jsonapi.Resource):
+class ResourceTranslationsAsyncDownload(AsyncJob, jsonapi.Resource):
     TYPE = "resource_translations_async_downloads"
 
     @classmethod
-    def download(cls, interval=5, *args, **kwargs):
+    def download(cls, interval=None, *args, **kwargs):
+        """ Create a download job and return the URL of the downloaded file
+            once it's ready. Pass `wait=False` to get a
+            `concurrent.futures.Future` instead and `polling` to use a
+            `PollingStrategy` other than the API connection instance's.
+        """
+
+        wait = kwargs.pop('wait', True)
+        polling = kwargs.pop('polling', None)
         download = cls.create(*args, **kwargs)
-        while True:
-            if hasattr(download, 'errors') and len(download.errors) > 0:
-                errors = [{'code': e['code'],
-                           'detail': e['detail'],
-                           'title': e['detail'],
-                           'status': '409'}
-                          for e in download.errors]
-                raise JsonApiException(409, errors)
-            if download.redirect:
-                return download.redirect
-            time.sleep(interval)
-            download.reload()
+        if wait:
+            return download.wait(interval, polling)
+        return download.as_future(interval, polling)
+
+    @classmethod
+    def download_to(cls, target, checksum=None, resume=False,
+                    chunk_size=downloads.DEFAULT_CHUNK_SIZE, interval=None,
+                    polling=None, **kwargs):
+        """ Like `download`, but also stream the downloaded file into
+            `target`, a path or a file-like object, without holding it in
+            memory. See `transifex_api.downloads.download_to` for `checksum`
+            and `resume`. Returns a `DownloadedFile` with the URL, size and
+            checksum of the file.
+        """
+
+        url = cls.download(interval, polling=polling, **kwargs)
+        return downloads.download_to(cls.API.session, url, target,
+                                     chunk_size=chunk_size, checksum=checksum,
+                                     resume=resume)
+
+    def get_redirect_result(self):
+        # The URL of the downloaded file
+        return self.redirect
 
 
 # This is our global object
@@ -0,0 +1,255 @@
+from __future__ import absolute_import, unicode_literals
+
+import contextlib
+import hashlib
+import io
+import os
+import re
+from collections import namedtuple
+
+import requests
+import six
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# `os.replace` overwrites the target on all platforms but is missing from
+# python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+DownloadedFile = namedtuple('DownloadedFile', ['url', 'size', 'checksum'])
+
+
+class ChecksumMismatch(Exception):
+    def __init__(self, algorithm, expected, actual):
+        super(ChecksumMismatch, self).__init__(algorithm, expected, actual)
+        self.algorithm = algorithm
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return "Expected {} checksum {}, got {}".format(self.algorithm,
+                                                        self.expected,
+                                                        self.actual)
+
+
+class CannotRestart(Exception):
+    """ A reconnection couldn't continue the download and it can't start
+        over, because the target is a stream that cannot be rewound
+    """
+
+
+def _parse_checksum(checksum):
+    """ 'sha256' => ('sha256', None), 'md5:abc' => ('md5', 'abc') """
+
+    if checksum is None:
+        return None, None
+    algorithm, _, expected = checksum.partition(':')
+    hashlib.new(algorithm)  # Fail early for unknown algorithms
+    return algorithm, expected.lower() or None
+
+
+def download_to(session, url, target, chunk_size=DEFAULT_CHUNK_SIZE,
+                checksum=None, resume=False, max_resumes=3):
+    """ Stream the file at `url` into `target` in chunks of `chunk_size`
+        bytes, so that memory usage doesn't depend on the size of the file.
+        Returns a `DownloadedFile`.
+
+        - target: A path or a writable file-like object. Paths are first
+                  written to '<path>.part', which is renamed to `path` once
+                  the download is complete (and verified). File-like objects
+                  are written to from their current position
+        - checksum: A `hashlib` algorithm name, eg 'sha256', to compute the
+                    checksum of the file while it's being written, or
+                    '<algorithm>:<hexdigest>' to also verify it and raise
+                    `ChecksumMismatch` if it's wrong
+        - resume: If True, continue from an existing '<path>.part' file and,
+                  if the connection breaks during the download, reconnect up
+                  to `max_resumes` times. Both are done with `Range`
+                  requests; if the server ignores them, the download starts
+                  over
+
+        Resumed requests carry an `If-Range` header with the `ETag` (or
+        `Last-Modified`) of the response the existing part came from, which
+        is kept in '<path>.part.validator', so that the server sends the
+        whole file again if it has changed since. A part without a
+        validator, or a `206` response that doesn't continue it, is
+        discarded and the download starts over. For file-like targets,
+        starting over truncates them back to where the download started; if
+        they can't be rewound (eg pipes), `CannotRestart` is raised instead.
+    """
+
+    algorithm, expected = _parse_checksum(checksum)
+
+    if hasattr(target, 'write'):
+        size, actual = _download(session, url, target, chunk_size, algorithm,
+                                 resume, max_resumes, offset=0)
+    else:
+        part_path = "{}.part".format(target)
+        validator_path = "{}.validator".format(part_path)
+        validator = _load_validator(validator_path) if resume else None
+
+        def save_validator(value):
+            _save_validator(validator_path, value)
+
+        # Opened for reading too, so that the checksum of a resumed download
+        # can include the part that was already there
+        mode = 'a+b' if validator is not None else 'w+b'
+        with open(part_path, mode) as f:
+            f.seek(0, os.SEEK_END)
+            size, actual = _download(session, url, f, chunk_size, algorithm,
+                                     resume, max_resumes, offset=f.tell(),
+                                     validator=validator,
+                                     save_validator=save_validator)
+        save_validator(None)
+        if expected is not None and actual != expected:
+            os.remove(part_path)
+        else:
+            _replace(part_path, target)
+
+    if expected is not None and actual != expected:
+        raise ChecksumMismatch(algorithm, expected, actual)
+    return DownloadedFile(url, size, actual)
+
+
+def _download(session, url, f, chunk_size, algorithm, resume, max_resumes,
+              offset, validator=None, save_validator=None):
+    # Where the file starts in `f`, to return to if we need to start over
+    start = _get_start(f, offset)
+    hasher = _make_hasher(f, algorithm, offset, chunk_size)
+    resumes = 0
+    # The size of the whole file, if known
+    total = None
+    while True:
+        headers = {}
+        if offset:
+            headers['Range'] = "bytes={}-".format(offset)
+            if validator is not None:
+                headers['If-Range'] = validator
+        try:
+            response = session.get(url, headers=headers, stream=True)
+            with contextlib.closing(response):
+                if offset and response.status_code == 416:
+                    # What we have is not a prefix of the file (eg it's
+                    # longer), start over
+                    offset, hasher = _start_over(f, start, algorithm,
+                                                 chunk_size)
+                    continue
+                response.raise_for_status()
+                if offset and response.status_code == 206:
+                    range_start, range_total = _parse_content_range(
+                        response.headers.get('Content-Range')
+                    )
+                    if (range_start != offset or
+                            (total is not None and range_total != total)):
+                        # Not the continuation of what we have
+                        offset, hasher = _start_over(f, start,
+                                                     algorithm, chunk_size)
+                        continue
+                    total = range_total
+                elif offset:
+                    # The server ignored the `Range` header or, because of
+                    # `If-Range`, the file has changed: it is sending the
+                    # whole file
+                    offset, hasher = _start_over(f, start, algorithm,
+                                                 chunk_size)
+                if not offset:
+                    validator = _get_validator(response)
+                    if save_validator is not None:
+                        save_validator(validator)
+                    total = _get_content_length(response)
+                for chunk in response.iter_content(chunk_size):
+                    f.write(chunk)
+                    offset += len(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            break
+        except (requests.ConnectionError,
+                requests.exceptions.ChunkedEncodingError):
+            if not resume or resumes >= max_resumes:
+                raise
+            resumes += 1
+
+    return offset, hasher.hexdigest() if hasher is not None else None
+
+
+def _get_start(f, offset):
+    """ Return the position in `f` where the file starts, or None if `f`
+        cannot be rewound
+    """
+
+    seekable = getattr(f, 'seekable', None)
+    if seekable is not None and not seekable():
+        return None
+    try:
+        return f.tell() - offset
+    except (AttributeError, EnvironmentError, ValueError):
+        return None
+
+
+def _start_over(f, start, algorithm, chunk_size):
+    if start is None:
+        raise CannotRestart("Cannot restart the download into a stream "
+                            "that cannot be rewound")
+    f.seek(start)
+    f.truncate()
+    return 0, _make_hasher(f, algorithm, 0, chunk_size)
+
+
+def _get_validator(response):
+    """ Return the response's strong validator, usable with `If-Range`, or
+        None
+    """
+
+    etag = response.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return response.headers.get('Last-Modified')
+
+
+def _get_content_length(response):
+    # With a `Content-Encoding`, the length is not the size of the file
+    if 'Content-Encoding' in response.headers:
+        return None
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+
+def _parse_content_range(value):
+    """ 'bytes 300-999/1000' => (300, 1000); the total is None if unknown """
+
+    match = re.match(r'bytes (\d+)-\d+/(\d+|\*)$', value or '')
+    if match is None:
+        return None, None
+    start, total = match.groups()
+    return int(start), None if total == '*' else int(total)
+
+
+def _load_validator(path):
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            return f.read() or None
+    except EnvironmentError:
+        return None
+
+
+def _save_validator(path, validator):
+    if validator is None:
+        if os.path.exists(path):
+            os.remove(path)
+    else:
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(validator))
+
+
+def _make_hasher(f, algorithm, offset, chunk_size):
+    if algorithm is None:
+        return None
+    hasher = hashlib.new(algorithm)
+    if offset:
+        f.seek(0)
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher
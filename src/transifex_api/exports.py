@@ -0,0 +1,158 @@
+from __future__ import absolute_import, unicode_literals
+
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+
+from . import downloads
+
+DEFAULT_PATH_TEMPLATE = "{resource}/{language}"
+
+
+ExportedFile = namedtuple('ExportedFile', ['resource', 'language', 'path',
+                                           'size', 'checksum', 'job_seconds',
+                                           'download_seconds'])
+
+
+class ExportReport(object):
+    """ The outcome of `TransifexApi.export`:
+
+        - files: An `ExportedFile` for every downloaded file, in the order
+                 they finished, with how long the download job took on the
+                 server's side and how long the file took to download
+        - failures: `{(resource_id, language_id): exception}` for the files
+                    that could not be exported
+        - elapsed: How long the whole export took, in seconds
+
+        `str(report)` is a one-line summary with the throughput.
+    """
+
+    def __init__(self):
+        self.files = []
+        self.failures = {}
+        self.elapsed = 0
+
+    @property
+    def size(self):
+        return sum(exported.size for exported in self.files)
+
+    @property
+    def throughput(self):
+        """ Downloaded bytes per second """
+
+        if not self.elapsed:
+            return 0
+        return self.size / float(self.elapsed)
+
+    def __str__(self):
+        return ("Exported {} files ({:.1f} MB) in {:.1f}s ({:.2f} MB/s), "
+                "{} failed".format(len(self.files), self.size / 1e6,
+                                   self.elapsed, self.throughput / 1e6,
+                                   len(self.failures)))
+
+
+def _get_id(item):
+    if isinstance(item, six.string_types):
+        return item
+    return item.id
+
+
+def _get_language_id(language):
+    language_id = _get_id(language)
+    if not language_id.startswith('l:'):
+        language_id = "l:{}".format(language_id)
+    return language_id
+
+
+def export(api, target, languages, resource=None, project=None,
+           path_template=DEFAULT_PATH_TEMPLATE, concurrency=8, polling=None,
+           checksum=None, get_now=None, **attributes):
+    """ See `TransifexApi.export` """
+
+    if (resource is None) == (project is None):
+        raise ValueError("Exactly one of 'resource' or 'project' is required")
+    if get_now is None:
+        get_now = time.time
+
+    if resource is not None:
+        resource_ids = [_get_id(resource)]
+    else:
+        resource_ids = [item.id
+                        for item in (api.Resource.filter(project=project).
+                                     compact().
+                                     all())]
+    language_ids = [_get_language_id(language) for language in languages]
+
+    tasks = []
+    for resource_id in resource_ids:
+        for language_id in language_ids:
+            path = os.path.join(target, path_template.format(
+                resource=resource_id.rsplit(':', 1)[-1],
+                language=language_id[len('l:'):],
+            ))
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            tasks.append((resource_id, language_id, path))
+
+    report = ExportReport()
+    lock = threading.Lock()
+    # Every file holds a slot from the creation of its download job until
+    # it's written to disk
+    slots = threading.BoundedSemaphore(concurrency)
+    started = get_now()
+
+    with ThreadPoolExecutor(concurrency) as pool:
+
+        def fail(resource_id, language_id, exc):
+            with lock:
+                report.failures[(resource_id, language_id)] = exc
+            slots.release()
+
+        def create_job(resource_id, language_id, path):
+            job_started = get_now()
+            try:
+                job = api.ResourceTranslationsAsyncDownload.create(
+                    resource=api.Resource(id=resource_id),
+                    language=api.Language(id=language_id),
+                    **attributes
+                )
+                future = job.as_future(polling=polling)
+            except Exception as exc:
+                fail(resource_id, language_id, exc)
+                return
+            future.add_done_callback(
+                lambda future: pool.submit(download, resource_id,
+                                           language_id, path, job_started,
+                                           future)
+            )
+
+        def download(resource_id, language_id, path, job_started, future):
+            download_started = get_now()
+            try:
+                result = downloads.download_to(api.session, future.result(),
+                                               path, checksum=checksum)
+            except Exception as exc:
+                fail(resource_id, language_id, exc)
+                return
+            exported = ExportedFile(resource_id, language_id, path,
+                                    result.size, result.checksum,
+                                    download_started - job_started,
+                                    get_now() - download_started)
+            with lock:
+                report.files.append(exported)
+            slots.release()
+
+        for task in tasks:
+            slots.acquire()
+            pool.submit(create_job, *task)
+        # Wait for the last files
+        for _ in range(concurrency):
+            slots.acquire()
+
+    report.elapsed = get_now() - started
+    return report
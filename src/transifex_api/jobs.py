@@ -0,0 +1,277 @@
+from __future__ import absolute_import, unicode_literals
+
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class Pending(object):
+    """ Returned by the `poll` callables passed to `JobPoller` while the job
+        is not finished yet. `retry_after` is an optional hint from the
+        server about when to poll again, in seconds.
+    """
+
+    __slots__ = ('retry_after', )
+
+    def __init__(self, retry_after=None):
+        self.retry_after = retry_after
+
+
+PENDING = Pending()
+
+
+class PollingTimeout(Exception):
+    """ Raised when a job is still pending after the polling strategy's
+        `deadline`
+    """
+
+    def __init__(self, polls, elapsed):
+        super(PollingTimeout, self).__init__(polls, elapsed)
+        self.polls = polls
+        self.elapsed = elapsed
+
+    def __str__(self):
+        return ("Job still pending after {} polls in {:.1f} seconds".
+                format(self.polls, self.elapsed))
+
+
+class PollingStrategy(object):
+    """ Decides when an asynchronous job is polled. Usage:
+
+            >>> api.setup(polling=PollingStrategy(initial=0.5, factor=2,
+            ...                                   max_interval=10,
+            ...                                   deadline=600))
+
+        - initial: The delay before the first poll. Small jobs are usually
+                   finished by then
+        - factor, max_interval: The delay before the n-th poll is
+                                `initial * factor ** (n - 1)` seconds, but
+                                never more than `max_interval`, so big jobs
+                                are not polled hundreds of times for nothing
+        - deadline: If set, a job that is still pending after this many
+                    seconds fails with `PollingTimeout`
+        - use_hints: Honour the server's `Retry-After` header, if any, instead
+                     of the delay described above (always within `deadline`)
+    """
+
+    def __init__(self, initial=0.5, factor=2, max_interval=10, deadline=None,
+                 use_hints=True):
+        self.initial = initial
+        self.factor = factor
+        self.max_interval = max_interval
+        self.deadline = deadline
+        self.use_hints = use_hints
+
+    @classmethod
+    def fixed(cls, interval, deadline=None):
+        """ Poll every `interval` seconds """
+
+        return cls(initial=interval, factor=1, max_interval=interval,
+                   deadline=deadline, use_hints=False)
+
+    def get_delay(self, polls, retry_after=None):
+        """ Return how long to wait after `polls` polls """
+
+        if self.use_hints and retry_after is not None:
+            return retry_after
+        return min(self.initial * self.factor ** polls, self.max_interval)
+
+
+class _Job(object):
+    __slots__ = ('poll', 'future', 'strategy', 'started', 'polls')
+
+    def __init__(self, poll, future, strategy, started):
+        self.poll = poll
+        self.future = future
+        self.strategy = strategy
+        self.started = started
+        self.polls = 0
+
+
+class JobPoller(object):
+    """ Waits for many asynchronous jobs (eg uploads and downloads) at the
+        same time, using one scheduler thread and a few worker threads
+        instead of a blocked thread per job. Usage:
+
+            >>> poller = JobPoller()
+            >>> future = poller.submit(poll)
+            >>> future.result()
+
+        `poll` is a callable that checks the job (usually by reloading it)
+        and returns its result, or a `Pending` instance if it's not finished
+        yet. If `poll` raises an exception, the job's future fails with it.
+
+        - strategy: The default `PollingStrategy` of the submitted jobs
+        - workers: How many polls can be in flight at the same time
+
+        The threads are started with the first job and stop once there are no
+        scheduled jobs left. `wait` polls a job in the calling thread instead,
+        with the same strategy and metrics.
+
+        The `stats` attribute counts the jobs, the polls sent for them, the
+        jobs that are still pending and the ones that timed out.
+        `polls_per_job` maps numbers of polls to how many finished jobs needed
+        that many:
+
+            >>> poller.stats
+            <<< {'jobs': 300, 'polls': 1250, 'pending': 12, 'timeouts': 0}
+            >>> poller.polls_per_job
+            <<< Counter({4: 150, 5: 90, 3: 40, 8: 8})
+    """
+
+    def __init__(self, strategy=None, workers=4, sleep=None, get_now=None):
+        if strategy is None:
+            strategy = PollingStrategy()
+        self.strategy = strategy
+        self.workers = workers
+
+        # Dependency injection for sleeping and getting the current timestamp,
+        # mostly useful for testing
+        if sleep is None:
+            sleep = time.sleep
+        self.sleep = sleep
+        if get_now is None:
+            get_now = time.time
+        self.get_now = get_now
+
+        self.stats = {'jobs': 0, 'polls': 0, 'pending': 0, 'timeouts': 0}
+        self.polls_per_job = Counter()
+
+        # (due, sequence, job) entries, soonest first
+        self._schedule = []
+        self._scheduled = 0
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+
+    def submit(self, poll, strategy=None):
+        """ Start tracking a job and return a `concurrent.futures.Future` that
+            will be resolved with its result. Cancelling the future stops the
+            polling.
+        """
+
+        job = self._start(poll, Future(), strategy)
+        delay = job.strategy.get_delay(0)
+        with self._condition:
+            self._scheduled += 1
+            self._schedule_job(job, delay)
+            if self._thread is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+                self._thread = threading.Thread(target=self._run,
+                                                name="JobPoller")
+                self._thread.daemon = True
+                self._thread.start()
+        return job.future
+
+    def wait(self, poll, strategy=None):
+        """ Poll a job in the calling thread until it's finished and return
+            its result
+        """
+
+        job = self._start(poll, None, strategy)
+        delay = job.strategy.get_delay(0)
+        while True:
+            self.sleep(delay)
+            try:
+                result, delay = self._poll_once(job)
+            except BaseException:
+                self._finish(job)
+                raise
+            if not isinstance(result, Pending):
+                self._finish(job)
+                return result
+
+    def _start(self, poll, future, strategy):
+        if strategy is None:
+            strategy = self.strategy
+        with self._condition:
+            self.stats['jobs'] += 1
+            self.stats['pending'] += 1
+        return _Job(poll, future, strategy, self.get_now())
+
+    def _poll_once(self, job):
+        """ Poll the job once; return its result and, if it's still pending,
+            the delay before the next poll
+        """
+
+        job.polls += 1
+        with self._condition:
+            self.stats['polls'] += 1
+        result = job.poll()
+        if not isinstance(result, Pending):
+            return result, None
+
+        delay = job.strategy.get_delay(job.polls, result.retry_after)
+        deadline = job.strategy.deadline
+        if deadline is not None:
+            elapsed = self.get_now() - job.started
+            if elapsed >= deadline:
+                with self._condition:
+                    self.stats['timeouts'] += 1
+                raise PollingTimeout(job.polls, elapsed)
+            delay = min(delay, deadline - elapsed)
+        return result, delay
+
+    def _finish(self, job):
+        with self._condition:
+            self.stats['pending'] -= 1
+            self.polls_per_job[job.polls] += 1
+
+    def _schedule_job(self, job, delay):
+        heapq.heappush(self._schedule, (self.get_now() + delay,
+                                        next(self._sequence),
+                                        job))
+        self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if not self._scheduled:
+                        # Nothing left to do, `submit` will start a new
+                        # thread when needed
+                        self._executor.shutdown(wait=False)
+                        self._executor = None
+                        self._thread = None
+                        return
+                    if self._schedule:
+                        delay = self._schedule[0][0] - self.get_now()
+                        if delay <= 0:
+                            _, _, job = heapq.heappop(self._schedule)
+                            break
+                    else:
+                        delay = None
+                    self._condition.wait(delay)
+                executor = self._executor
+            executor.submit(self._poll, job)
+
+    def _poll(self, job):
+        if job.future.cancelled():
+            self._unschedule(job)
+            return
+
+        try:
+            result, delay = self._poll_once(job)
+        except BaseException as exc:
+            self._unschedule(job)
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(exc)
+            return
+
+        if isinstance(result, Pending):
+            with self._condition:
+                self._schedule_job(job, delay)
+        else:
+            self._unschedule(job)
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_result(result)
+
+    def _unschedule(self, job):
+        self._finish(job)
+        with self._condition:
+            self._scheduled -= 1
+            self._condition.notify()
@@ -0,0 +1,178 @@
+from __future__ import absolute_import, unicode_literals
+
+import abc
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import threading
+
+import six
+
+# `os.replace` overwrites the target on all platforms but is missing from
+# python 2
+_replace = getattr(os, 'replace', os.rename)
+
+
+def hash_content(content, chunk_size=64 * 1024):
+    """ Return the SHA-256 of upload content, or None if it cannot be read
+        twice (eg generators and unseekable streams). File-like objects are
+        read from their current position and rewound to it afterwards.
+    """
+
+    hasher = hashlib.sha256()
+    if isinstance(content, six.text_type):
+        hasher.update(content.encode('utf-8'))
+    elif isinstance(content, six.binary_type):
+        hasher.update(content)
+    elif hasattr(content, 'read') and hasattr(content, 'seek'):
+        try:
+            position = content.tell()
+        except (EnvironmentError, ValueError):
+            return None
+        text = isinstance(content, io.TextIOBase)
+        for chunk in iter(lambda: content.read(chunk_size),
+                          '' if text else b''):
+            hasher.update(chunk.encode('utf-8') if text else chunk)
+        content.seek(position)
+    else:
+        return None
+    return hasher.hexdigest()
+
+
+@six.add_metaclass(abc.ABCMeta)
+class UploadManifest(object):
+    """ Remembers the content hash of the last successful source upload of
+        every resource, so that uploading the same content again can be
+        skipped. Usage:
+
+            >>> transifex_api.setup(manifest=SqliteManifest(".tx.sqlite"))
+            >>> # or
+            >>> transifex_api.setup(manifest=".tx-manifest.json")
+
+        Subclass this and implement all of its methods to store hashes
+        somewhere else. Implementations must be thread-safe.
+    """
+
+    @abc.abstractmethod
+    def get(self, resource_id):
+        """ Return the stored hash or None """
+
+    @abc.abstractmethod
+    def set(self, resource_id, content_hash):
+        pass
+
+    @abc.abstractmethod
+    def invalidate(self, resource_id):
+        """ Forget the hash of a resource, so that its next upload is not
+            skipped
+        """
+
+    @abc.abstractmethod
+    def clear(self):
+        pass
+
+
+class JsonManifest(UploadManifest):
+    """ Stores hashes in a JSON file, eg one that is cached between CI runs.
+        The file is rewritten (atomically) after every change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._hashes = None
+
+    def _load(self):
+        if self._hashes is None:
+            try:
+                with io.open(self.path, encoding='utf-8') as f:
+                    self._hashes = json.load(f)
+            except (EnvironmentError, ValueError):
+                self._hashes = {}
+        return self._hashes
+
+    def _dump(self):
+        tmp_path = "{}.tmp".format(self.path)
+        with io.open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(six.text_type(json.dumps(self._hashes, indent=2,
+                                             sort_keys=True)))
+        _replace(tmp_path, self.path)
+
+    def get(self, resource_id):
+        with self._lock:
+            return self._load().get(resource_id)
+
+    def set(self, resource_id, content_hash):
+        with self._lock:
+            self._load()[resource_id] = content_hash
+            self._dump()
+
+    def invalidate(self, resource_id):
+        with self._lock:
+            if self._load().pop(resource_id, None) is not None:
+                self._dump()
+
+    def clear(self):
+        with self._lock:
+            self._hashes = {}
+            self._dump()
+
+
+class SqliteManifest(UploadManifest):
+    """ Stores hashes in an SQLite database, which can be shared by several
+        processes
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS upload_manifest "
+                "(resource_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+            )
+
+    def get(self, resource_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT content_hash FROM upload_manifest "
+                "WHERE resource_id = ?", (resource_id, ),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def set(self, resource_id, content_hash):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO upload_manifest "
+                "(resource_id, content_hash) VALUES (?, ?)",
+                (resource_id, content_hash),
+            )
+
+    def invalidate(self, resource_id):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM upload_manifest WHERE resource_id = ?",
+                (resource_id, ),
+            )
+
+    def clear(self):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM upload_manifest")
+
+    def close(self):
+        self._connection.close()
+
+
+def get_manifest(manifest):
+    """ Paths ending in '.json' become a `JsonManifest`, other paths a
+        `SqliteManifest`; anything else is returned as-is
+    """
+
+    if isinstance(manifest, six.string_types):
+        if manifest.endswith('.json'):
+            return JsonManifest(manifest)
+        return SqliteManifest(manifest)
+    return manifest
@@ -0,0 +1,345 @@
+from __future__ import absolute_import, unicode_literals
+
+import json
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+import six
+
+SyncResult = namedtuple('SyncResult', ['resource', 'strings', 'translations',
+                                       'deleted', 'full', 'reconciled'])
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS resource_strings (
+        id TEXT PRIMARY KEY,
+        resource_id TEXT NOT NULL,
+        key TEXT,
+        modified TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS resource_strings_resource
+        ON resource_strings (resource_id, key);
+
+    CREATE TABLE IF NOT EXISTS resource_translations (
+        id TEXT PRIMARY KEY,
+        resource_id TEXT NOT NULL,
+        language_id TEXT NOT NULL,
+        string_id TEXT,
+        modified TEXT,
+        data TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS resource_translations_resource
+        ON resource_translations (resource_id, language_id);
+    CREATE INDEX IF NOT EXISTS resource_translations_string
+        ON resource_translations (string_id);
+
+    CREATE TABLE IF NOT EXISTS sync_checkpoints (
+        resource_id TEXT NOT NULL,
+        language_id TEXT NOT NULL,
+        modified TEXT,
+        reconciled_at REAL,
+        PRIMARY KEY (resource_id, language_id)
+    );
+"""
+
+# `language_id` of the checkpoints of source strings
+_SOURCE = ''
+
+
+def _get_id(item):
+    if isinstance(item, six.string_types):
+        return item
+    return item.id
+
+
+class StringMirror(object):
+    """ Keeps a local SQLite copy of the source strings and translations of
+        resources, so that reading them doesn't need the network. Usage:
+
+            >>> mirror = StringMirror(transifex_api, "strings.sqlite")
+            >>> mirror.sync(resource, languages=['l:el', 'l:fr'])
+            >>> for string in mirror.strings(resource):
+            ...     print(string.key, string.strings)
+
+        The first `sync` of a resource (or language) downloads everything.
+        After that, only the objects modified since the newest modification
+        date seen so far are fetched, by filtering and sorting on it.
+
+        Deletions don't show up in these incremental fetches. So every
+        `reconcile_every` seconds (or when `sync(reconcile=True)` is called),
+        `sync` also lists only the IDs of all the resource's source strings
+        and drops the local strings (and translations) that are gone.
+
+        - api: A `TransifexApi` connection instance
+        - path: Where to keep the SQLite database
+        - reconcile_every: Seconds between reconciliations, one day by default
+
+        The filters and attributes used for the incremental fetches are class
+        attributes, in case the server's names differ.
+    """
+
+    STRING_MODIFIED_FILTER = 'date_modified__gte'
+    STRING_MODIFIED_ATTRIBUTE = 'datetime_modified'
+    STRING_SORT = 'date_modified'
+    TRANSLATION_MODIFIED_FILTER = 'date_translated__gte'
+    TRANSLATION_MODIFIED_ATTRIBUTE = 'datetime_translated'
+    TRANSLATION_SORT = 'date_translated'
+
+    def __init__(self, api, path, reconcile_every=24 * 60 * 60,
+                 get_now=None):
+        self.api = api
+        self.path = path
+        self.reconcile_every = reconcile_every
+
+        # Dependency injection for getting the current timestamp, mostly
+        # useful for testing
+        if get_now is None:
+            get_now = time.time
+        self.get_now = get_now
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    # Syncing
+    def sync(self, resource, languages=(), reconcile=None):
+        """ Bring the mirror of `resource`'s source strings, and of its
+            translations in `languages`, up to date. Returns a `SyncResult`
+            with how many strings and translations were fetched and how many
+            strings were deleted.
+
+            `reconcile` forces (True) or prevents (False) the ID-only pass
+            that detects deleted strings; by default it runs every
+            `reconcile_every` seconds.
+        """
+
+        resource_id = _get_id(resource)
+        checkpoint, reconciled_at = self._get_checkpoint(resource_id, _SOURCE)
+        full = checkpoint is None and reconciled_at is None
+
+        collection = self.api.ResourceString.filter(resource=resource_id)
+        strings = self._fetch(collection, checkpoint,
+                              self.STRING_MODIFIED_FILTER,
+                              self.STRING_SORT,
+                              self.STRING_MODIFIED_ATTRIBUTE,
+                              self._store_strings, resource_id, _SOURCE)
+
+        translations = 0
+        for language in languages:
+            language_id = _get_id(language)
+            checkpoint, _ = self._get_checkpoint(resource_id, language_id)
+            collection = self.api.ResourceTranslation.filter(
+                resource=resource_id, language=language_id,
+            )
+            translations += self._fetch(collection, checkpoint,
+                                        self.TRANSLATION_MODIFIED_FILTER,
+                                        self.TRANSLATION_SORT,
+                                        self.TRANSLATION_MODIFIED_ATTRIBUTE,
+                                        self._store_translations,
+                                        resource_id, language_id)
+
+        if reconcile is None:
+            reconcile = (not full and
+                         (reconciled_at is None or
+                          self.get_now() - reconciled_at >=
+                          self.reconcile_every))
+        deleted = 0
+        if reconcile:
+            deleted = self._reconcile(resource_id)
+        elif full:
+            # A full fetch is as good as a reconciliation
+            self._set_reconciled(resource_id)
+
+        return SyncResult(resource_id, strings, translations, deleted, full,
+                          bool(reconcile))
+
+    def _fetch(self, collection, checkpoint, filter_name, sort, attribute,
+               store, resource_id, language_id):
+        """ Fetch the objects of `collection` modified since `checkpoint`
+            page by page, storing every page and advancing the checkpoint
+            along with it, so that an interrupted sync resumes where it
+            stopped
+        """
+
+        if checkpoint is not None:
+            collection = collection.filter(**{filter_name: checkpoint})
+        collection = collection.sort(sort).compact()
+
+        count = 0
+        for page in collection.all_pages():
+            items = list(page)
+            if not items:
+                continue
+            count += len(items)
+            # ISO 8601 timestamps in the same format sort lexicographically
+            for item in items:
+                modified = item.attributes.get(attribute)
+                if modified and (checkpoint is None or modified > checkpoint):
+                    checkpoint = modified
+            with self._lock, self._connection:
+                store(items, resource_id, language_id)
+                self._update_checkpoint(resource_id, language_id,
+                                        'modified', checkpoint)
+        return count
+
+    def _store_strings(self, items, resource_id, language_id):
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO resource_strings "
+            "(id, resource_id, key, modified, data) VALUES (?, ?, ?, ?, ?)",
+            [(item.id, resource_id, item.attributes.get('key'),
+              item.attributes.get(self.STRING_MODIFIED_ATTRIBUTE),
+              json.dumps(item.to_dict()))
+             for item in items],
+        )
+
+    def _store_translations(self, items, resource_id, language_id):
+        rows = []
+        for item in items:
+            string = item.relationships.get('resource_string')
+            string_id = (string['data']['id']
+                         if string and string.get('data') else None)
+            rows.append((item.id, resource_id, language_id, string_id,
+                         item.attributes.get(
+                             self.TRANSLATION_MODIFIED_ATTRIBUTE
+                         ),
+                         json.dumps(item.to_dict())))
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO resource_translations "
+            "(id, resource_id, language_id, string_id, modified, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+    def _reconcile(self, resource_id):
+        """ Drop the local strings of the resource that don't exist on the
+            server anymore, along with their translations. Returns how many
+            strings were dropped.
+        """
+
+        ids = set()
+        collection = (self.api.ResourceString.filter(resource=resource_id).
+                      extra(**{'fields[resource_strings]': "key"}).
+                      compact())
+        for page in collection.all_pages():
+            ids.update(record.id for record in page)
+
+        with self._lock, self._connection:
+            local_ids = [row[0] for row in self._connection.execute(
+                "SELECT id FROM resource_strings WHERE resource_id = ?",
+                (resource_id, ),
+            )]
+            deleted = [(string_id, ) for string_id in local_ids
+                       if string_id not in ids]
+            self._connection.executemany(
+                "DELETE FROM resource_strings WHERE id = ?", deleted,
+            )
+            self._connection.executemany(
+                "DELETE FROM resource_translations WHERE string_id = ?",
+                deleted,
+            )
+        self._set_reconciled(resource_id)
+        return len(deleted)
+
+    def _get_checkpoint(self, resource_id, language_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT modified, reconciled_at FROM sync_checkpoints "
+                "WHERE resource_id = ? AND language_id = ?",
+                (resource_id, language_id),
+            ).fetchone()
+        if row is None:
+            return None, None
+        return row
+
+    def _set_reconciled(self, resource_id):
+        with self._lock, self._connection:
+            self._update_checkpoint(resource_id, _SOURCE, 'reconciled_at',
+                                    self.get_now())
+
+    def _update_checkpoint(self, resource_id, language_id, column, value):
+        # Not an "upsert", which needs SQLite 3.24
+        self._connection.execute(
+            "INSERT OR IGNORE INTO sync_checkpoints "
+            "(resource_id, language_id) VALUES (?, ?)",
+            (resource_id, language_id),
+        )
+        self._connection.execute(
+            "UPDATE sync_checkpoints SET {} = ? "
+            "WHERE resource_id = ? AND language_id = ?".format(column),
+            (value, resource_id, language_id),
+        )
+
+    def reset(self, resource=None):
+        """ Forget everything about `resource` (or all resources), so that
+            the next `sync` fetches everything again
+        """
+
+        where, params = "", ()
+        if resource is not None:
+            where, params = " WHERE resource_id = ?", (_get_id(resource), )
+        with self._lock, self._connection:
+            for table in ('resource_strings', 'resource_translations',
+                          'sync_checkpoints'):
+                self._connection.execute(
+                    "DELETE FROM {}{}".format(table, where), params,
+                )
+
+    # Queries
+    def _query(self, sql, params):
+        with self._lock:
+            rows = self._connection.execute(sql, params).fetchall()
+        return [self.api.new(json.loads(data)) for (data, ) in rows]
+
+    def strings(self, resource, key=None):
+        """ Return the mirrored source strings of a resource as
+            `ResourceString` objects, optionally only the one(s) with `key`
+        """
+
+        sql = "SELECT data FROM resource_strings WHERE resource_id = ?"
+        params = (_get_id(resource), )
+        if key is not None:
+            sql += " AND key = ?"
+            params += (key, )
+        return self._query(sql + " ORDER BY id", params)
+
+    def get_string(self, string_id):
+        """ Return the mirrored `ResourceString` with this ID or None """
+
+        result = self._query("SELECT data FROM resource_strings WHERE id = ?",
+                             (string_id, ))
+        return result[0] if result else None
+
+    def translations(self, resource, language):
+        """ Return the mirrored translations of a resource in a language as
+            `ResourceTranslation` objects
+        """
+
+        return self._query(
+            "SELECT data FROM resource_translations "
+            "WHERE resource_id = ? AND language_id = ? ORDER BY id",
+            (_get_id(resource), _get_id(language)),
+        )
+
+    def count(self, resource=None):
+        """ Return how many source strings are mirrored, for one resource or
+            in total
+        """
+
+        sql, params = "SELECT COUNT(*) FROM resource_strings", ()
+        if resource is not None:
+            sql += " WHERE resource_id = ?"
+            params = (_get_id(resource), )
+        with self._lock:
+            return self._connection.execute(sql, params).fetchone()[0]
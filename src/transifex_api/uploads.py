@@ -0,0 +1,167 @@
+from __future__ import absolute_import, unicode_literals
+
+import io
+import mmap
+import os
+import uuid
+
+import six
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class MultipartEncoder(object):
+    """ A multipart/form-data request body that is generated while it's being
+        sent, instead of being built in memory like `requests` does with
+        `files=...`. Usage:
+
+            >>> encoder = MultipartEncoder({'resource': resource_id},
+            ...                            {'content': open(path, 'rb')})
+            >>> api.request('post', url, data=encoder,
+            ...             headers={'Content-Type': encoder.content_type})
+
+        - fields: `{name: value}` of plain form fields
+        - files: `{name: content}` or `{name: (filename, content)}` or
+                 `{name: (filename, content, content_type)}`. `content` can
+                 be bytes or text, a file-like object (read in chunks of
+                 `chunk_size`), a memory-mapped file or an iterable of bytes
+                 (eg a generator)
+        - progress: Called with `(sent, total)` after every chunk; `total` is
+                    None if the size of some content is unknown
+
+        If the size of all contents is known (everything except iterables
+        and unseekable streams), the encoder has a `len` attribute and is
+        sent with a `Content-Length` header. Otherwise it is sent with
+        `Transfer-Encoding: chunked`. Since file-like contents are consumed
+        while being sent, the body can only be sent once.
+    """
+
+    def __init__(self, fields=None, files=None, boundary=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        if boundary is None:
+            boundary = uuid.uuid4().hex
+        self.boundary = boundary
+        self.content_type = "multipart/form-data; boundary={}".format(boundary)
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+        # Every part is either bytes or a `(content, size)` tuple, where size
+        # may be None
+        self._parts = []
+        for name, value in (fields or {}).items():
+            self._parts.append(self._make_headers(name))
+            self._parts.append(self._encode(value) + b"\r\n")
+        for name, value in (files or {}).items():
+            if isinstance(value, tuple):
+                filename, content = value[:2]
+                content_type = value[2] if len(value) > 2 else None
+            else:
+                filename = self._guess_filename(value) or name
+                content, content_type = value, None
+            self._parts.append(self._make_headers(name, filename,
+                                                  content_type))
+            if isinstance(content, (six.binary_type, six.text_type)):
+                self._parts.append(self._encode(content))
+            else:
+                self._parts.append((content, self._get_size(content)))
+            self._parts.append(b"\r\n")
+        self._parts.append("--{}--\r\n".format(boundary).encode('ascii'))
+
+        sizes = [len(part) if isinstance(part, bytes) else part[1]
+                 for part in self._parts]
+        if None in sizes:
+            self.total = None
+        else:
+            self.total = self.len = sum(sizes)
+
+        self.sent = 0
+        self._chunks = self._generate()
+        self._buffer = bytearray()
+
+    @staticmethod
+    def _encode(value):
+        if isinstance(value, six.text_type):
+            return value.encode('utf-8')
+        if isinstance(value, six.binary_type):
+            return value
+        return six.text_type(value).encode('utf-8')
+
+    @staticmethod
+    def _guess_filename(content):
+        name = getattr(content, 'name', None)
+        if isinstance(name, six.string_types) and name[:1] != '<':
+            return os.path.basename(name)
+        return None
+
+    def _make_headers(self, name, filename=None, content_type=None):
+        headers = ['--{}'.format(self.boundary)]
+        disposition = 'Content-Disposition: form-data; name="{}"'.format(name)
+        if filename is not None:
+            disposition += '; filename="{}"'.format(filename)
+        headers.append(disposition)
+        if content_type is not None:
+            headers.append('Content-Type: {}'.format(content_type))
+        return ('\r\n'.join(headers) + '\r\n\r\n').encode('utf-8')
+
+    @staticmethod
+    def _get_size(content):
+        if isinstance(content, mmap.mmap):
+            return len(content) - content.tell()
+        if not hasattr(content, 'read') or isinstance(content, io.TextIOBase):
+            # The encoded size of text files is not known in advance
+            return None
+        try:
+            return os.fstat(content.fileno()).st_size - content.tell()
+        except (AttributeError, EnvironmentError, ValueError):
+            pass
+        try:
+            position = content.tell()
+            content.seek(0, os.SEEK_END)
+            size = content.tell() - position
+            content.seek(position)
+            return size
+        except (AttributeError, EnvironmentError, ValueError):
+            return None
+
+    def _iter_content(self, content):
+        if hasattr(content, 'read'):
+            while True:
+                chunk = content.read(self.chunk_size)
+                if not chunk:
+                    return
+                yield self._encode(chunk)
+        else:
+            for chunk in content:
+                if chunk:
+                    yield self._encode(chunk)
+
+    def _generate(self):
+        for part in self._parts:
+            if isinstance(part, bytes):
+                chunks = (part, )
+            else:
+                chunks = self._iter_content(part[0])
+            for chunk in chunks:
+                self.sent += len(chunk)
+                if self.progress is not None:
+                    self.progress(self.sent, self.total)
+                yield chunk
+
+    def __iter__(self):
+        if self._buffer:
+            yield bytes(self._buffer)
+            del self._buffer[:]
+        for chunk in self._chunks:
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return b"".join(self)
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer.extend(chunk)
+        result = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return result